@@ -2,7 +2,14 @@
 Flask RAG Chatbot Application
 Main application file - minimal initialization only
 All routes are in blueprints
+
+Pending migrations run during import; the embedding model and system LLM load in
+the background after it (services/lifecycle.py); /health reports ready once they
+are done.
 """
+import time
+_started = time.perf_counter()
+
 from flask import Flask
 from flask_cors import CORS
 from flask_login import LoginManager
@@ -16,6 +23,11 @@ load_dotenv()
 from models import User
 from models.prompt_preset import PromptPreset
 from blueprints import register_blueprints
+from blueprints.widget import CACHEABLE_ENDPOINTS
+from services import lifecycle
+
+lifecycle.begin_startup(_started)
+lifecycle.startup_timings.record('imports', time.perf_counter() - _started)
 
 # App setup
 app = Flask(__name__)
@@ -51,46 +63,37 @@ os.makedirs('config', exist_ok=True)
 os.makedirs('data', exist_ok=True)
 os.makedirs('logs', exist_ok=True)
 
-# 🔐 LLM Configuration
-# Using unified LLM service (default: OpenAI, fallback: OpenAI)
-from services.llm_service import LLMProvider
-
-# Default system LLM (used for system-level features like AI text cleaning)
-# User-specific LLMs are created dynamically in chatbot_service.py
-# Initialize lazily - only if API key is available (allows tests to run without key)
-llm = None
-try:
-    llm = LLMProvider.get_default_llm(temperature=0.3, max_tokens=2000)
-    print(f"🤖 Using OpenAI model: gpt-4o-mini (unified LLM service)")
-except ValueError as e:
-    # API key not available - LLM will be created lazily when needed
-    print(f"⚠️ System LLM not initialized at startup: {e}")
-    print("   LLM will be created on-demand when API key is available")
-
-# Make llm available globally (needed by chat blueprint)
-app.config['LLM'] = llm
-
-# 🔍 Embeddings setup
-try:
-    from langchain_community.embeddings import HuggingFaceEmbeddings
-    embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-    
-    # Set embeddings in knowledge service
-    from services.knowledge_service import set_embeddings
-    set_embeddings(embeddings)
-    
-    print("✅ Embeddings loaded successfully")
-except Exception as e:
-    print(f"⚠️ Embeddings initialization failed: {e}")
-    embeddings = None
+# 🔐 System LLM: created by a background startup task and stored in app.config['LLM']
+# (User-specific LLMs are created dynamically in chatbot_service.py)
+app.config['LLM'] = None
+
+# 🔍 Embeddings: a pre-forking server loads the model here, before forking, so workers
+# share it; otherwise it loads in the background (chat waits for it if needed)
+if lifecycle.FORKING_SERVER:
+    try:
+        lifecycle.preload_embedding_model()
+        print("✅ Embeddings loaded successfully")
+    except Exception as e:
+        print(f"⚠️ Embeddings initialization failed: {e}")
 
 # Register all blueprints
-register_blueprints(app)
+lifecycle.startup_timings.timed('blueprints', register_blueprints, app)
+
+# 📥 Migrations, then ingestion workers and parallel startup tasks (model, system LLM).
+# A pre-forking server (gunicorn.conf.py) migrates in its master and starts the rest in each worker
+if not lifecycle.FORKING_SERVER:
+    lifecycle.start_background_work(app)
 
 # Cache control - allow caching for static files, no-cache for dynamic content
 @app.after_request
 def set_cache_control(response):
     """Set appropriate cache headers"""
+    from flask import request
+    if request.endpoint in CACHEABLE_ENDPOINTS:
+        # Embed endpoints set their own validators and policy; error responses are not cached
+        if 'ETag' not in response.headers:
+            response.headers['Cache-Control'] = 'no-cache, must-revalidate'
+        return response
     # Allow caching for static files (CSS, JS, images)
     if response.content_type and any(ext in response.content_type for ext in ['text/css', 'application/javascript', 'image/', 'font/']):
         response.headers['Cache-Control'] = 'public, max-age=31536000'  # 1 year for static assets
@@ -105,13 +108,13 @@ def set_cache_control(response):
 def set_llm():
     """Make llm available to request context"""
     from flask import g
-    g.llm = llm
+    g.llm = app.config['LLM']
 
 # Update chat blueprint to use g.llm
 def get_llm():
     """Get LLM instance"""
     from flask import g
-    return getattr(g, 'llm', llm)
+    return getattr(g, 'llm', app.config['LLM'])
 
 # Export llm for chat blueprint
 import sys
@@ -124,10 +127,6 @@ if __name__ == "__main__":
     print(f"📋 Logs will be saved to: ./logs/")
     print(f"Default admin created: admin@example.com (password set during initialization)")
     
-    # Initialize database tables and run migrations
-    print("📦 Initializing database...")
-    from migrations import run_migrations
-    run_migrations()
-    
+    # Database tables and migrations are initialized during import (lifecycle.start_background_work)
     port = int(os.getenv('PORT', 6001))
     app.run(host='0.0.0.0', port=port, debug=True, use_reloader=False)
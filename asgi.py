@@ -0,0 +1,318 @@
+"""
+ASGI entry point - asyncio-native chat for widget traffic
+
+    uvicorn asgi:application --host 0.0.0.0 --port 6001
+
+Widget chats (POST /chat and /chat/stream authenticated by API key) are served
+natively on the event loop: the LLM call is awaited with ainvoke()/astream(), so
+an in-flight conversation holds no thread for the multi-second LLM round-trip.
+Conversation and message database calls stay on the shared thread pools (there
+is no async MySQL driver), and are short compared to the LLM call.
+
+Everything else, including dashboard chats authenticated by a login session, is
+passed to the Flask app unchanged.
+"""
+import asyncio
+import functools
+import json
+
+from asgiref.wsgi import WsgiToAsgi
+
+from app import app
+from services.chatbot_service import (
+    aget_chatbot_response,
+    astream_chatbot_response,
+    format_chat_reply,
+    begin_chat_turn,
+    save_chat_turn,
+    saved_reply_id,
+    new_chat_timings
+)
+from services.conversation_service import get_or_create_conversation
+from utils.api_key import validate_api_key
+
+
+CHAT_PATHS = ('/chat', '/chat/stream')
+# Cookies that make Flask-Login resolve a logged-in user (which takes precedence over an API key)
+LOGIN_COOKIES = (app.config.get('SESSION_COOKIE_NAME', 'session'), 'remember_token')
+
+flask_application = WsgiToAsgi(app)
+
+
+def _replay_body(body, receive):
+    """receive() that hands an already-read request body to the next app"""
+    pending = True
+
+    async def replay():
+        nonlocal pending
+        if pending:
+            pending = False
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+        return await receive()
+
+    return replay
+
+
+async def _read_body(receive, limit):
+    """Read the request body (None if it is larger than limit)"""
+    body = b''
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return body
+        body += message.get('body', b'')
+        if limit and len(body) > limit:
+            return None
+        if not message.get('more_body'):
+            return body
+
+
+def _has_login_cookie(scope):
+    for name, value in scope.get('headers', []):
+        if name == b'cookie':
+            cookies = value.decode('latin-1')
+            if any(f"{cookie}=" in cookies for cookie in LOGIN_COOKIES):
+                return True
+    return False
+
+
+def _header(scope, name):
+    for key, value in scope.get('headers', []):
+        if key == name:
+            return value.decode('latin-1')
+    return None
+
+
+async def _send_json(send, status, payload, headers=None):
+    body = json.dumps(payload).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+            (b'cache-control', b'no-cache, must-revalidate'),
+            (b'pragma', b'no-cache'),
+            (b'access-control-allow-origin', b'*'),
+            *(headers or [])
+        ]
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+def _sse(event, data):
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode('utf-8')
+
+
+async def _start_chat_turn(data, api_key):
+    """Async counterpart of blueprints.chat._start_chat_turn for API key callers
+
+    Returns:
+        tuple: (turn dict, None) on success, or (None, (status, error payload))
+    """
+    loop = asyncio.get_running_loop()
+    user_input = data.get("message")
+
+    user_id = await loop.run_in_executor(None, validate_api_key, api_key)
+    if not user_id:
+        return None, (401, {"error": "Invalid API key"})
+    if not user_input:
+        return None, (400, {"error": "No message provided"})
+
+    timings = new_chat_timings()
+    conversation, is_new = await loop.run_in_executor(None, functools.partial(
+        timings.timed,
+        'conversation',
+        get_or_create_conversation,
+        user_id=user_id,
+        session_id=data.get("session_id"),
+        conversation_id=data.get("conversation_id")
+    ))
+    if not conversation:
+        return None, (500, {"error": "Failed to create or retrieve conversation"})
+
+    # Snapshot earlier messages off the critical path
+    history = begin_chat_turn(conversation, timings)
+    return {
+        "llm": app.config.get('LLM'),
+        "user_id": user_id,
+        "name": "Visitor",
+        "message": user_input,
+        "conversation": conversation,
+        "is_new": is_new,
+        "history": history,
+        "timings": timings
+    }, None
+
+
+def _save_turn(turn, reply):
+    """Save the user message and the reply together (the message alone if reply is None)
+
+    The write runs in the background; the response does not wait for it.
+
+    Returns:
+        Future resolving to the saved Message objects
+    """
+    return save_chat_turn(turn["conversation"].id, turn["message"], reply)
+
+
+async def _chat(turn, send):
+    """POST /chat - same response as the Flask view"""
+    conversation = turn["conversation"]
+    reply, error = await aget_chatbot_response(
+        user_id=turn["user_id"],
+        message=turn["message"],
+        system_llm=turn["llm"],
+        name=turn["name"],
+        conversation_id=conversation.id,
+        history=turn["history"],
+        timings=turn["timings"]
+    )
+    _save_turn(turn, None if error else reply)
+    if error:
+        await _send_json(send, 500, {"error": error})
+        return
+
+    await _send_json(send, 200, {
+        "response": reply,
+        "conversation_id": conversation.id,
+        "session_id": conversation.session_id,
+        "is_new_conversation": turn["is_new"]
+    }, headers=[(b'server-timing', turn["timings"].server_timing().encode())])
+
+
+async def _chat_stream(turn, send, receive):
+    """POST /chat/stream - same Server-Sent Events as the Flask view"""
+    conversation = turn["conversation"]
+    disconnected = asyncio.Event()
+
+    async def watch_disconnect():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+        disconnected.set()
+
+    async def send_event(event, data, more=True):
+        if not disconnected.is_set():
+            await send({'type': 'http.response.body', 'body': _sse(event, data), 'more_body': more})
+
+    watcher = asyncio.ensure_future(watch_disconnect())
+    chunks = []
+    saved = False
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream; charset=utf-8'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),  # Disable proxy buffering (nginx) so tokens flush immediately
+                (b'access-control-allow-origin', b'*')
+            ]
+        })
+        await send_event("meta", {
+            "conversation_id": conversation.id,
+            "session_id": conversation.session_id,
+            "is_new_conversation": turn["is_new"]
+        })
+
+        stream = astream_chatbot_response(
+            user_id=turn["user_id"],
+            message=turn["message"],
+            system_llm=turn["llm"],
+            name=turn["name"],
+            conversation_id=conversation.id,
+            history=turn["history"],
+            timings=turn["timings"]
+        )
+        try:
+            async for text in stream:
+                if disconnected.is_set():
+                    break
+                chunks.append(text)
+                await send_event("token", {"text": text})
+        except Exception as e:
+            import traceback
+            print(f"Chat stream error: {e}")
+            traceback.print_exc()
+            await send_event("error", {"error": f"Sorry, I ran into an error: {str(e)}"}, more=False)
+            return
+        finally:
+            await stream.aclose()
+
+        saved = True
+        reply = format_chat_reply("".join(chunks))
+        turn_saved = _save_turn(turn, reply if chunks else None)
+        await send_event("done", {
+            "response": reply,
+            "message_id": saved_reply_id(turn_saved),
+            "timings": turn["timings"].as_dict()
+        }, more=False)
+    finally:
+        watcher.cancel()
+        # Also runs when generation failed or the client disconnected: keep the question
+        # and whatever was generated
+        if not saved:
+            try:
+                _save_turn(turn, format_chat_reply("".join(chunks)) if chunks else None)
+            except Exception as e:
+                print(f"Chat stream error while saving the turn: {e}")
+
+
+async def _chat_endpoint(scope, receive, send):
+    """Serve a widget chat natively, or hand the request to Flask"""
+    body = await _read_body(receive, app.config.get('MAX_CONTENT_LENGTH'))
+    if body is None:
+        await _send_json(send, 413, {"error": "Request too large"})
+        return
+
+    data = None
+    if not _has_login_cookie(scope):
+        try:
+            data = json.loads(body or b'null')
+        except ValueError:
+            data = None
+    api_key = None
+    if isinstance(data, dict):
+        api_key = data.get("api_key") or _header(scope, b'x-api-key')
+    if not api_key:
+        # Logged-in dashboard chats, unauthenticated and malformed requests: Flask handles them
+        await flask_application(scope, _replay_body(body, receive), send)
+        return
+
+    try:
+        turn, error = await _start_chat_turn(data, api_key)
+        if error:
+            await _send_json(send, *error)
+            return
+        if scope['path'] == '/chat':
+            await _chat(turn, send)
+        else:
+            await _chat_stream(turn, send, receive)
+    except Exception as e:
+        import traceback
+        print(f"Chat error: {e}")
+        traceback.print_exc()
+        await _send_json(send, 500, {"response": f"Sorry, I ran into an error: {str(e)}"})
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            # Migrations already ran at import; the model loads finish in the background
+            # (services/lifecycle.py) and /health reports when this process is ready
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    """ASGI application"""
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+    elif scope['type'] == 'http' and scope['method'] == 'POST' and scope['path'] in CHAT_PATHS:
+        await _chat_endpoint(scope, receive, send)
+    else:
+        await flask_application(scope, receive, send)
@@ -6,6 +6,8 @@ from flask_login import login_required, current_user
 from decorators import admin_required
 from services.admin_service import AdminService
 from models.api_key import AdminAPIKey
+from utils.api_key import invalidate_api_key_cache, get_api_key_cache_stats
+from db_pool import get_pool_stats
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
@@ -61,6 +63,54 @@ def get_stats():
         }), 500
 
 
+@admin_bp.route('/api/runtime-stats')
+@login_required
+@admin_required
+def get_runtime_stats():
+    """Get in-process cache and pool statistics (JSON API)"""
+    try:
+        from services.knowledge_service import get_vectorstore_registry_stats, get_embedding_stats
+        from services.llm_service import LLMProvider
+        from services.ingestion_service import get_ingestion_stats
+        from services.answer_cache import get_answer_cache_stats
+        from services.keyword_index import get_keyword_index_stats
+        from services.chatbot_service import get_chat_pipeline_stats
+        from services.config_service import get_config_cache_stats
+        from services.prompt_service import get_prompt_cache_stats
+        from services.transcript_buffer import get_transcript_buffer_stats
+        from services.conversation_service import get_history_cache_stats
+        from services.conversation_memory import get_memory_stats
+        from services.lifecycle import is_ready, get_startup_report
+        return jsonify({
+            'success': True,
+            'runtime': {
+                'vectorstores': get_vectorstore_registry_stats(),
+                'embeddings': get_embedding_stats(),
+                'llm_clients': LLMProvider.get_cache_stats(),
+                'api_key_cache': get_api_key_cache_stats(),
+                'db_pool': get_pool_stats(),
+                'ingestion': get_ingestion_stats(),
+                'answer_cache': get_answer_cache_stats(),
+                'hybrid_retrieval': get_keyword_index_stats(),
+                'chat_pipeline': get_chat_pipeline_stats(),
+                'tenant_config': get_config_cache_stats(),
+                'prompt_templates': get_prompt_cache_stats(),
+                'transcript_buffer': get_transcript_buffer_stats(),
+                'conversation_history': get_history_cache_stats(),
+                'conversation_memory': get_memory_stats(),
+                'startup': {'ready': is_ready(), 'stages_ms': get_startup_report()}
+            }
+        }), 200
+    except Exception as e:
+        print(f"❌ Error getting runtime stats: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({
+            'success': False,
+            'error': 'Failed to fetch runtime statistics'
+        }), 500
+
+
 @admin_bp.route('/api/user/<int:user_id>/stats')
 @login_required
 @admin_required
@@ -126,6 +176,8 @@ def create_api_key():
         )
         
         if result:
+            # The new token may have been negatively cached
+            invalidate_api_key_cache(api_key=result['token'])
             return jsonify({
                 'success': True,
                 'api_key': {
@@ -173,6 +225,8 @@ def update_api_key(key_id):
         )
         
         if success:
+            # Cached validation results may still accept a deactivated key
+            invalidate_api_key_cache()
             return jsonify({
                 'success': True,
                 'message': 'API key updated successfully'
@@ -201,6 +255,7 @@ def delete_api_key(key_id):
         success = AdminAPIKey.delete(key_id)
         
         if success:
+            invalidate_api_key_cache()
             return jsonify({
                 'success': True,
                 'message': 'API key deleted successfully'
@@ -301,6 +356,10 @@ def save_system_api_key():
         )
         
         if success:
+            # Cached LLM clients and the cached system key for this provider are now stale
+            from services.llm_service import LLMProvider
+            LLMProvider.invalidate_cache(provider=provider)
+            
             # Return masked version for confirmation
             masked = api_key[:8] + '••••••••' + api_key[-4:] if len(api_key) > 12 else '••••••••'
             return jsonify({
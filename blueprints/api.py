@@ -2,8 +2,15 @@
 from flask import Blueprint, request, jsonify
 from flask_login import login_required, current_user
 from services.file_service import save_uploaded_file, list_user_files, delete_user_file, process_file_for_user
-from services.knowledge_service import remove_file_from_vectorstore, get_knowledge_stats
-from services.config_service import load_user_chatbot_config, save_user_chatbot_config_file
+from services.knowledge_service import remove_file_from_vectorstore, get_knowledge_stats, invalidate_user_vectorstore, bump_knowledge_version, warm_query_embeddings
+from services.config_service import (
+    load_user_chatbot_config,
+    save_user_chatbot_config_file,
+    get_user_appearance,
+    invalidate_user_appearance,
+    invalidate_user_config_cache
+)
+from services.ingestion_service import enqueue_ingestion_job
 from utils.api_key import get_user_api_key
 from utils.prompts import get_default_prompt_with_name
 from utils.helpers import allowed_file
@@ -294,22 +301,15 @@ def get_file_preview(file_id):
 @api_bp.route("/api/files/<int:file_id>/ingest", methods=["POST"])
 @login_required
 def ingest_uploaded_file(file_id):
-    """Ingest uploaded file to knowledge base (vectorstore)"""
+    """Queue an uploaded file for ingestion into the knowledge base (vectorstore)"""
     try:
         if not current_user.is_authenticated:
             return jsonify({"error": "Authentication required"}), 401
         
         user_id = current_user.id
-        data = request.json
+        data = request.json or {}
         
         from models.uploaded_file import UploadedFile
-        from services.knowledge_service import get_user_vectorstore, embeddings
-        from langchain.text_splitter import RecursiveCharacterTextSplitter
-        try:
-            from langchain_core.documents import Document
-        except ImportError:
-            from langchain.schema import Document
-        from datetime import datetime
         
         # Get uploaded file
         uploaded_file = UploadedFile.get_by_id(user_id, file_id)
@@ -324,7 +324,7 @@ def ingest_uploaded_file(file_id):
         if not text:
             return jsonify({"error": "No text to ingest"}), 400
         
-        # Update text if edited
+        # Update text if edited - the worker ingests what is stored
         if text != uploaded_file.get('extracted_text'):
             UploadedFile.update_text(file_id, text)
         
@@ -335,83 +335,11 @@ def ingest_uploaded_file(file_id):
         # 4. During queries, the question is also converted to an embedding
         # 5. Similar embeddings are retrieved (semantic search)
         # 6. Cleaner text = better embeddings = better retrieval accuracy
-        
-        # Split into chunks
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
-            length_function=len
+        # Steps 1-3 run on a background ingestion worker (services/ingestion_service.py)
+        return _ingestion_job_response(
+            enqueue_ingestion_job(user_id, 'file', target_id=file_id),
+            f"File '{uploaded_file['filename']}' queued for ingestion."
         )
-        
-        doc = Document(
-            page_content=text,
-            metadata={
-                'source_file': uploaded_file['filename'],
-                'upload_time': datetime.now().isoformat(),
-                'category': uploaded_file['category'],  # ✅ Category is tagged in metadata for filtering/search
-                'user_id': str(user_id),
-                'source_type': 'file_upload',
-                'file_id': file_id
-            }
-        )
-        
-        chunks = text_splitter.split_documents([doc])
-        
-        # Add to vectorstore
-        user_vectorstore = get_user_vectorstore(user_id)
-        if user_vectorstore is None:
-            print(f"❌ Failed to get vectorstore for user {user_id}")
-            return jsonify({"error": "Failed to access knowledge base. Please check embeddings and vectorstore initialization."}), 500
-        
-        try:
-            # Ensure write permissions
-            kb_path = f"./chroma_db/user_{user_id}"
-            if os.path.exists(kb_path):
-                os.chmod(kb_path, 0o777)
-                for root, dirs, files in os.walk(kb_path):
-                    for d in dirs:
-                        os.chmod(os.path.join(root, d), 0o777)
-                    for f in files:
-                        os.chmod(os.path.join(root, f), 0o666)
-            
-            print(f"📝 Adding {len(chunks)} chunks to vectorstore...")
-            user_vectorstore.add_documents(chunks)
-            print(f"✅ Successfully added chunks to vectorstore")
-            
-            # VERIFICATION: Verify documents were actually added
-            verified_count = 0
-            try:
-                retriever = user_vectorstore.as_retriever(search_kwargs={"k": len(chunks) + 5})
-                # Test retrieval with a query that should match the file
-                test_query = uploaded_file['filename'] + " " + (uploaded_file.get('extracted_text', '')[:100] or '')
-                if hasattr(retriever, 'invoke'):
-                    verify_docs = retriever.invoke(test_query)
-                else:
-                    verify_docs = retriever.get_relevant_documents(test_query)
-                
-                # Check if our file is in the results
-                verified_count = sum(1 for doc in verify_docs if doc.metadata.get('source_file') == uploaded_file['filename'])
-                print(f"✅ VERIFICATION: Found {verified_count}/{len(chunks)} chunks from '{uploaded_file['filename']}' in vectorstore")
-                
-                if verified_count == 0:
-                    print(f"⚠️ WARNING: Verification found 0 chunks - ingestion may have failed!")
-            except Exception as verify_error:
-                print(f"⚠️ Verification check failed (but ingestion may have succeeded): {verify_error}")
-            
-            # Update status to 'ingested'
-            UploadedFile.update_status(file_id, 'ingested')
-            
-            return jsonify({
-                "message": f"File '{uploaded_file['filename']}' ingested successfully. Added {len(chunks)} chunks.",
-                "chunks_added": len(chunks),
-                "status": "ingested",
-                "verified": verified_count > 0 if 'verified_count' in locals() else None
-            })
-        except Exception as e:
-            print(f"❌ Error adding documents to vectorstore: {e}")
-            import traceback
-            traceback.print_exc()
-            return jsonify({"error": f"Failed to add documents to knowledge base: {str(e)}"}), 500
             
     except Exception as e:
         print(f"❌ Ingest uploaded file error: {e}")
@@ -516,17 +444,14 @@ def get_user_chatbot_config():
         user_id = current_user.id
         config = load_user_chatbot_config(user_id)
         
-        # Load appearance config from database
-        from models.chatbot_appearance import ChatbotAppearance
-        appearance = ChatbotAppearance.get_by_user(user_id)
-        if appearance:
-            appearance_dict = ChatbotAppearance.to_dict(appearance)
-            if appearance_dict:
-                config['short_info'] = appearance_dict.get('short_info')
-                config['primary_color'] = appearance_dict.get('primary_color')
-                config['avatar'] = appearance_dict.get('avatar')
-                config['suggested_messages'] = appearance_dict.get('suggested_messages')
-                config['welcome_message'] = appearance_dict.get('welcome_message')
+        # Load appearance config (cached, from the database)
+        appearance_dict = get_user_appearance(user_id)
+        if appearance_dict:
+            config['short_info'] = appearance_dict.get('short_info')
+            config['primary_color'] = appearance_dict.get('primary_color')
+            config['avatar'] = appearance_dict.get('avatar')
+            config['suggested_messages'] = appearance_dict.get('suggested_messages')
+            config['welcome_message'] = appearance_dict.get('welcome_message')
         
         # Always ensure welcome_message is in config (even if None)
         if 'welcome_message' not in config:
@@ -565,6 +490,7 @@ def save_user_chatbot_config_endpoint():
         
         # Load existing config
         config = load_user_chatbot_config(user_id)
+        previous_llm_api_key = config.get('llm_api_key')
         
         # Update with new values
         if 'bot_name' in data:
@@ -592,6 +518,8 @@ def save_user_chatbot_config_endpoint():
             config['response_style'] = data['response_style']
         if 'system_instructions' in data:
             config['system_instructions'] = data['system_instructions']
+        if 'answer_cache_enabled' in data:
+            config['answer_cache_enabled'] = bool(data['answer_cache_enabled'])
         
         # LLM Provider settings
         if 'llm_provider' in data:
@@ -609,6 +537,11 @@ def save_user_chatbot_config_endpoint():
         # Save basic config to file
         success = save_user_chatbot_config_file(user_id, config)
         
+        # Drop cached LLM clients built with a key the user just replaced
+        if previous_llm_api_key and previous_llm_api_key != config.get('llm_api_key'):
+            from services.llm_service import LLMProvider
+            LLMProvider.invalidate_cache(api_key=previous_llm_api_key)
+        
         # Save appearance config to database
         from models.chatbot_appearance import ChatbotAppearance
         short_info = data.get('short_info') or data.get('description')
@@ -631,8 +564,12 @@ def save_user_chatbot_config_endpoint():
                 suggested_messages=suggested_messages,
                 welcome_message=welcome_message
             )
+            # Other workers reload the appearance too, even if only part of the update was written
+            invalidate_user_appearance(user_id)
             if not appearance_success:
                 print(f"⚠️ Warning: Failed to save appearance config to database for user {user_id}")
+            elif suggested_messages and isinstance(suggested_messages, list):
+                warm_query_embeddings([msg.get('text', msg) if isinstance(msg, dict) else msg for msg in suggested_messages])
         
         if success:
             return jsonify({
@@ -656,19 +593,15 @@ def knowledge_stats():
         # Get file count with limit
         from models.uploaded_file import UploadedFile
         MAX_FILES_PER_USER = 100
-        uploaded_files = UploadedFile.get_all_by_user(user_id)
-        file_count = len(uploaded_files)
+        file_count = UploadedFile.count_by_user(user_id)
         
         # Get crawled URLs count
         from models.crawled_url import CrawledUrl
-        crawled_urls = CrawledUrl.get_all_by_user(user_id)
-        crawled_count = len(crawled_urls)
+        crawled_count = CrawledUrl.count_by_user(user_id)
         MAX_CRAWLED_URLS = 200  # Set limit for crawled URLs
         
-        # Get FAQ count
-        from models.faq import FAQ
-        faqs = FAQ.get_all_by_user(user_id, status=None)
-        faq_count = len(faqs)
+        # FAQ count comes with the knowledge stats
+        faq_count = stats.get('faq_count', 0)
         MAX_FAQS = 500  # Set limit for FAQs
         
         # Add limits and counts to stats
@@ -948,7 +881,7 @@ def get_website_stats(website_id):
         
         # Get user's knowledge stats
         stats = get_knowledge_stats(user_id)
-        all_files = list_user_files(user_id)
+        all_files = stats.get('uploaded_files', [])
         
         # Return stats in website format for compatibility
         return jsonify({
@@ -977,7 +910,7 @@ def knowledge_stats_detailed():
         
         # Get basic stats
         stats = get_knowledge_stats(user_id)
-        all_files = list_user_files(user_id)
+        all_files = stats.get('uploaded_files', [])
         
         # Organize files by category
         files_by_category = {}
@@ -1205,21 +1138,15 @@ def view_crawled_url(crawled_id):
 @api_bp.route("/api/crawled-urls/<int:crawled_id>/ingest", methods=["POST"])
 @login_required
 def ingest_crawled_url(crawled_id):
-    """Ingest crawled URL to knowledge base (vectorstore)"""
+    """Queue a crawled URL for ingestion into the knowledge base (vectorstore)"""
     try:
         if not current_user.is_authenticated:
             return jsonify({"error": "Authentication required"}), 401
         
         user_id = current_user.id
-        data = request.json
+        data = request.json or {}
         
         from models.crawled_url import CrawledUrl
-        from services.knowledge_service import get_user_vectorstore, embeddings
-        from langchain.text_splitter import RecursiveCharacterTextSplitter
-        try:
-            from langchain_core.documents import Document
-        except ImportError:
-            from langchain.schema import Document
         
         # Get crawled URL
         crawled = CrawledUrl.get_by_id(user_id, crawled_id)
@@ -1234,55 +1161,14 @@ def ingest_crawled_url(crawled_id):
         if not text:
             return jsonify({"error": "No text to ingest"}), 400
         
-        # Update text if edited
+        # Update text if edited - the worker ingests what is stored
         if text != crawled['extracted_text']:
             CrawledUrl.update_text(crawled_id, text)
         
-        # Split into chunks
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
-            length_function=len
+        return _ingestion_job_response(
+            enqueue_ingestion_job(user_id, 'crawled_url', target_id=crawled_id),
+            f"URL {crawled['url']} queued for ingestion."
         )
-        
-        doc = Document(
-            page_content=text,
-            metadata={
-                'source_file': crawled['url'],
-                'upload_time': datetime.now().isoformat(),
-                'category': crawled['category'],
-                'user_id': str(user_id),
-                'source_type': 'web_crawl',
-                'crawled_id': crawled_id
-            }
-        )
-        
-        chunks = text_splitter.split_documents([doc])
-        
-        # Add to vectorstore
-        user_vectorstore = get_user_vectorstore(user_id)
-        if user_vectorstore is None:
-            print(f"❌ Failed to get vectorstore for user {user_id}")
-            return jsonify({"error": "Failed to access knowledge base. Please check embeddings and vectorstore initialization."}), 500
-        
-        try:
-            print(f"📝 Adding {len(chunks)} chunks to vectorstore...")
-            user_vectorstore.add_documents(chunks)
-            print(f"✅ Successfully added chunks to vectorstore")
-            
-            # Update status to 'ingested'
-            CrawledUrl.update_status(crawled_id, 'ingested')
-            
-            return jsonify({
-                "message": f"URL {crawled['url']} ingested successfully. Added {len(chunks)} chunks.",
-                "chunks_added": len(chunks),
-                "status": "ingested"
-            })
-        except Exception as e:
-            print(f"❌ Error adding documents to vectorstore: {e}")
-            import traceback
-            traceback.print_exc()
-            return jsonify({"error": f"Failed to add documents to knowledge base: {str(e)}"}), 500
             
     except Exception as e:
         print(f"❌ Ingest crawled URL error: {e}")
@@ -1538,19 +1424,13 @@ def delete_faq(faq_id):
 @api_bp.route("/api/faqs/<int:faq_id>/ingest", methods=["POST"])
 @login_required
 def ingest_faq(faq_id):
-    """Ingest FAQ to knowledge base (vectorstore)"""
+    """Queue an FAQ for ingestion into the knowledge base (vectorstore)"""
     try:
         if not current_user.is_authenticated:
             return jsonify({"error": "Authentication required"}), 401
         
         user_id = current_user.id
         from models.faq import FAQ
-        from services.knowledge_service import get_user_vectorstore, embeddings
-        from langchain.text_splitter import RecursiveCharacterTextSplitter
-        try:
-            from langchain_core.documents import Document
-        except ImportError:
-            from langchain.schema import Document
         
         # Get FAQ
         faq = FAQ.get_by_id(user_id, faq_id)
@@ -1560,96 +1440,10 @@ def ingest_faq(faq_id):
         if faq['status'] == 'active':
             return jsonify({"error": "FAQ already ingested"}), 400
         
-        # Create document from FAQ
-        # Format: "Q: {question}\nA: {answer}"
-        page_content = f"Q: {faq['question']}\nA: {faq['answer']}"
-        
-        # For FAQs, we'll use a single chunk (preserves Q&A context)
-        # But if the answer is very long, we can split it
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=2000,  # Larger chunks for FAQs
-            chunk_overlap=200,
-            length_function=len
-        )
-        
-        doc = Document(
-            page_content=page_content,
-            metadata={
-                'source_file': f"FAQ_{faq_id}",
-                'upload_time': datetime.now().isoformat(),
-                'category': faq['category'],
-                'user_id': str(user_id),
-                'source_type': 'faq',
-                'faq_id': faq_id,
-                'question': faq['question']
-            }
+        return _ingestion_job_response(
+            enqueue_ingestion_job(user_id, 'faq', target_id=faq_id),
+            "FAQ queued for ingestion."
         )
-        
-        chunks = text_splitter.split_documents([doc])
-        
-        # Add to vectorstore
-        user_vectorstore = get_user_vectorstore(user_id)
-        if user_vectorstore is None:
-            print(f"❌ Failed to get vectorstore for user {user_id}")
-            return jsonify({"error": "Failed to access knowledge base. Please check embeddings and vectorstore initialization."}), 500
-        
-        try:
-            # Ensure directory and all files are writable before adding documents
-            kb_path = f"./chroma_db/user_{user_id}"
-            import os
-            if os.path.exists(kb_path):
-                # Use more permissive permissions to avoid readonly database errors
-                os.chmod(kb_path, 0o777)
-                # Fix permissions on all subdirectories and database files
-                for root, dirs, files in os.walk(kb_path):
-                    for d in dirs:
-                        try:
-                            os.chmod(os.path.join(root, d), 0o777)
-                        except:
-                            pass
-                    for f in files:
-                        try:
-                            os.chmod(os.path.join(root, f), 0o666)
-                        except:
-                            pass
-            
-            print(f"📝 Adding {len(chunks)} FAQ chunks to vectorstore...")
-            user_vectorstore.add_documents(chunks)
-            print(f"✅ Successfully added FAQ chunks to vectorstore")
-            
-            # VERIFICATION: Verify FAQ was actually added
-            verified_count = 0
-            try:
-                retriever = user_vectorstore.as_retriever(search_kwargs={"k": len(chunks) + 5})
-                test_query = faq['question'] + " " + faq['answer'][:100]
-                if hasattr(retriever, 'invoke'):
-                    verify_docs = retriever.invoke(test_query)
-                else:
-                    verify_docs = retriever.get_relevant_documents(test_query)
-                
-                # Check if our FAQ is in the results
-                verified_count = sum(1 for doc in verify_docs if doc.metadata.get('faq_id') == faq_id)
-                print(f"✅ VERIFICATION: Found {verified_count}/{len(chunks)} FAQ chunks in vectorstore")
-                
-                if verified_count == 0:
-                    print(f"⚠️ WARNING: Verification found 0 FAQ chunks - ingestion may have failed!")
-            except Exception as verify_error:
-                print(f"⚠️ Verification check failed (but ingestion may have succeeded): {verify_error}")
-            
-            # Update status to 'active' and set ingested_at
-            FAQ.update_status(faq_id, 'active')
-            
-            return jsonify({
-                "message": f"FAQ ingested successfully. Added {len(chunks)} chunk(s).",
-                "chunks_added": len(chunks),
-                "status": "active",
-                "verified": verified_count > 0
-            })
-        except Exception as e:
-            print(f"❌ Error adding FAQ to vectorstore: {e}")
-            import traceback
-            traceback.print_exc()
-            return jsonify({"error": f"Failed to add FAQ to knowledge base: {str(e)}"}), 500
             
     except Exception as e:
         print(f"❌ Ingest FAQ error: {e}")
@@ -1661,82 +1455,23 @@ def ingest_faq(faq_id):
 @api_bp.route("/api/faqs/bulk-ingest", methods=["POST"])
 @login_required
 def bulk_ingest_faqs():
-    """Bulk ingest multiple FAQs to knowledge base"""
+    """Queue multiple FAQs for ingestion into the knowledge base (one job)"""
     try:
         if not current_user.is_authenticated:
             return jsonify({"error": "Authentication required"}), 401
         
         user_id = current_user.id
-        data = request.json
+        data = request.json or {}
         faq_ids = data.get('faq_ids', [])
         
         if not faq_ids:
             return jsonify({"error": "No FAQ IDs provided"}), 400
         
-        from models.faq import FAQ
-        from services.knowledge_service import get_user_vectorstore, embeddings
-        from langchain.text_splitter import RecursiveCharacterTextSplitter
-        try:
-            from langchain_core.documents import Document
-        except ImportError:
-            from langchain.schema import Document
-        
-        user_vectorstore = get_user_vectorstore(user_id)
-        if user_vectorstore is None:
-            return jsonify({"error": "Failed to access knowledge base."}), 500
-        
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=2000,
-            chunk_overlap=200,
-            length_function=len
+        return _ingestion_job_response(
+            enqueue_ingestion_job(user_id, 'faq_bulk', payload={'faq_ids': faq_ids}),
+            f"{len(faq_ids)} FAQ(s) queued for ingestion."
         )
         
-        total_chunks = 0
-        ingested_count = 0
-        errors = []
-        
-        for faq_id in faq_ids:
-            try:
-                faq = FAQ.get_by_id(user_id, faq_id)
-                if not faq:
-                    errors.append(f"FAQ {faq_id} not found")
-                    continue
-                
-                if faq['status'] == 'active':
-                    errors.append(f"FAQ {faq_id} already ingested")
-                    continue
-                
-                # Create document
-                page_content = f"Q: {faq['question']}\nA: {faq['answer']}"
-                doc = Document(
-                    page_content=page_content,
-                    metadata={
-                        'source_file': f"FAQ_{faq_id}",
-                        'upload_time': datetime.now().isoformat(),
-                        'category': faq['category'],
-                        'user_id': str(user_id),
-                        'source_type': 'faq',
-                        'faq_id': faq_id,
-                        'question': faq['question']
-                    }
-                )
-                
-                chunks = text_splitter.split_documents([doc])
-                user_vectorstore.add_documents(chunks)
-                FAQ.update_status(faq_id, 'active')
-                
-                total_chunks += len(chunks)
-                ingested_count += 1
-            except Exception as e:
-                errors.append(f"FAQ {faq_id}: {str(e)}")
-        
-        return jsonify({
-            "message": f"Bulk ingest completed. {ingested_count} FAQ(s) ingested, {total_chunks} chunk(s) added.",
-            "ingested_count": ingested_count,
-            "total_chunks": total_chunks,
-            "errors": errors if errors else None
-        })
-        
     except Exception as e:
         print(f"❌ Bulk ingest FAQs error: {e}")
         import traceback
@@ -1744,6 +1479,56 @@ def bulk_ingest_faqs():
         return jsonify({"error": str(e)}), 500
 
 
+def _serialize_ingestion_job(job):
+    """Convert job datetimes to ISO strings for JSON"""
+    job = dict(job)
+    for field in ('run_after', 'started_at', 'finished_at', 'created_at', 'updated_at'):
+        if job.get(field) and hasattr(job[field], 'isoformat'):
+            job[field] = job[field].isoformat()
+    return job
+
+
+def _ingestion_job_response(job, message):
+    """202 response for a freshly queued (or already running) ingestion job"""
+    if not job:
+        return jsonify({"error": "Failed to queue ingestion job"}), 500
+    return jsonify({
+        "message": message,
+        "job_id": job['id'],
+        "status": job['status'],
+        "job": _serialize_ingestion_job(job)
+    }), 202
+
+
+@api_bp.route("/api/ingestion-jobs", methods=["GET"])
+@login_required
+def list_ingestion_jobs():
+    """List the current user's recent ingestion jobs"""
+    try:
+        from models.ingestion_job import IngestionJob
+        limit = min(int(request.args.get('limit', 50)), 200)
+        jobs = IngestionJob.get_all_by_user(current_user.id, limit=limit)
+        return jsonify({"jobs": [_serialize_ingestion_job(job) for job in jobs]})
+    except Exception as e:
+        print(f"❌ List ingestion jobs error: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+@api_bp.route("/api/ingestion-jobs/<int:job_id>", methods=["GET"])
+@login_required
+def get_ingestion_job(job_id):
+    """Get status and progress of an ingestion job"""
+    try:
+        from models.ingestion_job import IngestionJob
+        job = IngestionJob.get_by_id(current_user.id, job_id)
+        if not job:
+            return jsonify({"error": "Job not found"}), 404
+        return jsonify(_serialize_ingestion_job(job))
+    except Exception as e:
+        print(f"❌ Get ingestion job error: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
 @api_bp.route("/api/backup-knowledge", methods=["POST"])
 @login_required
 def backup_knowledge():
@@ -1878,6 +1663,8 @@ def restore_knowledge():
             vector_backup = f"{backup_path}/chroma_db"
             if os.path.exists(vector_backup):
                 user_kb_path = f"./chroma_db/user_{user_id}"
+                # Close the cached client before its files are replaced
+                invalidate_user_vectorstore(user_id)
                 if os.path.exists(user_kb_path):
                     shutil.rmtree(user_kb_path)
                 shutil.copytree(vector_backup, user_kb_path)
@@ -1915,6 +1702,10 @@ def restore_knowledge():
         except Exception as e:
             restore_results["config"] = f"❌ Error restoring config: {str(e)}"
         
+        # The restored config directory carries the backup's knowledge version
+        bump_knowledge_version(user_id)
+        invalidate_user_config_cache(user_id)
+
         return jsonify({
             "message": "Knowledge base restored successfully",
             "restore_results": restore_results
@@ -1963,6 +1754,8 @@ def reset_knowledge():
             # Clear vector database
             try:
                 user_kb_path = f"./chroma_db/user_{user_id}"
+                # Close the cached client before its files are deleted
+                invalidate_user_vectorstore(user_id)
                 if os.path.exists(user_kb_path):
                     shutil.rmtree(user_kb_path)
                     os.makedirs(user_kb_path, exist_ok=True)
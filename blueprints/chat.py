@@ -1,10 +1,18 @@
 """Chat endpoint blueprint"""
-from flask import Blueprint, request, jsonify
+import json
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from flask_login import current_user
-from services.chatbot_service import get_chatbot_response
+from services.chatbot_service import (
+    get_chatbot_response,
+    stream_chatbot_response,
+    format_chat_reply,
+    begin_chat_turn,
+    save_chat_turn,
+    saved_reply_id,
+    new_chat_timings
+)
 from services.conversation_service import (
     get_or_create_conversation,
-    add_message,
     generate_session_id
 )
 from utils.api_key import validate_api_key
@@ -12,89 +20,108 @@ from utils.api_key import validate_api_key
 chat_bp = Blueprint('chat', __name__)
 
 
+def _start_chat_turn():
+    """Authenticate the caller, resolve the conversation and start reading its history
+    
+    The user message is saved with the reply at the end of the turn (save_chat_turn()).
+    
+    Returns:
+        tuple: (turn dict, None) on success, or (None, error response)
+    """
+    # Get llm from Flask g or app config
+    from flask import g, current_app
+    llm = getattr(g, 'llm', None) or current_app.config.get('LLM')
+    
+    data = request.json
+    user_input = data.get("message")
+    api_key = data.get("api_key") or request.headers.get("X-API-Key")
+    conversation_id = data.get("conversation_id")
+    session_id = data.get("session_id")
+    
+    # Determine user_id from either login or API key
+    user_id = None
+    name = "User"
+    
+    if current_user.is_authenticated:
+        # Dashboard usage - use logged in user
+        user_id = current_user.id
+        name = current_user.username or "User"
+    elif api_key:
+        # Widget usage - validate API key
+        user_id = validate_api_key(api_key)
+        if not user_id:
+            return None, (jsonify({"error": "Invalid API key"}), 401)
+        name = "Visitor"
+    else:
+        return None, (jsonify({"error": "Authentication required (login or API key)"}), 401)
+
+    if not user_input:
+        return None, (jsonify({"error": "No message provided"}), 400)
+
+    # Get or create conversation
+    timings = new_chat_timings()
+    conversation, is_new = timings.timed(
+        'conversation',
+        get_or_create_conversation,
+        user_id=user_id,
+        session_id=session_id,
+        conversation_id=conversation_id
+    )
+    
+    if not conversation:
+        return None, (jsonify({"error": "Failed to create or retrieve conversation"}), 500)
+    
+    # Snapshot earlier messages off the critical path
+    history = begin_chat_turn(conversation, timings)
+    
+    return {
+        "llm": llm,
+        "user_id": user_id,
+        "name": name,
+        "message": user_input,
+        "conversation": conversation,
+        "is_new": is_new,
+        "history": history,
+        "timings": timings
+    }, None
+
+
 @chat_bp.route("/chat", methods=["POST"])
 def chat():
     """Chat endpoint - accepts login OR API key, uses user-specific RAG"""
     try:
-        # Get llm from Flask g or app config
-        from flask import g, current_app
-        llm = getattr(g, 'llm', None) or current_app.config.get('LLM')
-        
-        data = request.json
-        user_input = data.get("message")
-        api_key = data.get("api_key") or request.headers.get("X-API-Key")
-        conversation_id = data.get("conversation_id")
-        session_id = data.get("session_id")
-        
-        # Determine user_id from either login or API key
-        user_id = None
-        name = "User"
-        
-        if current_user.is_authenticated:
-            # Dashboard usage - use logged in user
-            user_id = current_user.id
-            name = current_user.username or "User"
-        elif api_key:
-            # Widget usage - validate API key
-            user_id = validate_api_key(api_key)
-            if not user_id:
-                return jsonify({"error": "Invalid API key"}), 401
-            name = "Visitor"
-        else:
-            return jsonify({"error": "Authentication required (login or API key)"}), 401
-
-        if not user_input:
-            return jsonify({"error": "No message provided"}), 400
-
-        # Get or create conversation
-        conversation, is_new = get_or_create_conversation(
-            user_id=user_id,
-            session_id=session_id,
-            conversation_id=conversation_id
-        )
-        
-        if not conversation:
-            return jsonify({"error": "Failed to create or retrieve conversation"}), 500
-        
-        # Save user message
-        user_message = add_message(
-            conversation_id=conversation.id,
-            role="user",
-            content=user_input
-        )
-        
-        if not user_message:
-            print(f"⚠️ Warning: Failed to save user message for conversation {conversation.id}")
+        turn, error_response = _start_chat_turn()
+        if error_response:
+            return error_response
+        conversation = turn["conversation"]
 
         # Get chatbot response with conversation context
         reply, error = get_chatbot_response(
-            user_id=user_id,
-            message=user_input,
-            system_llm=llm,
-            name=name,
-            conversation_id=conversation.id
+            user_id=turn["user_id"],
+            message=turn["message"],
+            system_llm=turn["llm"],
+            name=turn["name"],
+            conversation_id=conversation.id,
+            history=turn["history"],
+            timings=turn["timings"]
         )
         
+        # Save the user message and the reply together (the message alone if there is no
+        # reply), in the background: the response does not wait for the write
+        save_chat_turn(conversation.id, turn["message"], None if error else reply)
+        
         if error:
             return jsonify({"error": error}), 500
         
-        # Save assistant message
-        assistant_message = add_message(
-            conversation_id=conversation.id,
-            role="assistant",
-            content=reply
-        )
-        
-        if not assistant_message:
-            print(f"⚠️ Warning: Failed to save assistant message for conversation {conversation.id}")
-        
         # Return response with conversation info
-        return jsonify({
+        response = jsonify({
             "response": reply,
             "conversation_id": conversation.id,
             "session_id": conversation.session_id,
-            "is_new_conversation": is_new
+            "is_new_conversation": turn["is_new"]
         })
+        response.headers["Server-Timing"] = turn["timings"].server_timing()
+        return response
 
     except Exception as e:
         import traceback
@@ -104,6 +131,96 @@ def chat():
         return jsonify({"response": f"Sorry, I ran into an error: {str(e)}"}), 500
 
 
+def _sse(event, data):
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@chat_bp.route("/chat/stream", methods=["POST"])
+def chat_stream():
+    """Streaming chat endpoint - same request as /chat, response as Server-Sent Events
+    
+    Events:
+        meta:  {conversation_id, session_id, is_new_conversation} - sent before generation starts
+        token: {text} - raw text chunk as the LLM produces it
+        done:  {response, message_id, timings} - final formatted reply (same format as /chat)
+               and per-stage durations in ms; message_id is null unless the turn was
+               already stored (the event does not wait for the write)
+        error: {error} - generation failed part way
+    """
+    try:
+        turn, error_response = _start_chat_turn()
+        if error_response:
+            return error_response
+    except Exception as e:
+        import traceback
+        print(f"Chat stream error: {e}")
+        traceback.print_exc()
+        return jsonify({"response": f"Sorry, I ran into an error: {str(e)}"}), 500
+    
+    conversation = turn["conversation"]
+    
+    def generate():
+        chunks = []
+        saved = False
+        
+        def save_reply():
+            nonlocal saved
+            saved = True
+            # The user message and the reply are written together, in the background
+            reply = format_chat_reply("".join(chunks)) if chunks else None
+            return save_chat_turn(conversation.id, turn["message"], reply)
+        
+        try:
+            yield _sse("meta", {
+                "conversation_id": conversation.id,
+                "session_id": conversation.session_id,
+                "is_new_conversation": turn["is_new"]
+            })
+            
+            for text in stream_chatbot_response(
+                user_id=turn["user_id"],
+                message=turn["message"],
+                system_llm=turn["llm"],
+                name=turn["name"],
+                conversation_id=conversation.id,
+                history=turn["history"],
+                timings=turn["timings"]
+            ):
+                chunks.append(text)
+                yield _sse("token", {"text": text})
+            
+            turn_saved = save_reply()
+            yield _sse("done", {
+                "response": format_chat_reply("".join(chunks)),
+                "message_id": saved_reply_id(turn_saved),
+                "timings": turn["timings"].as_dict()
+            })
+        except Exception as e:
+            import traceback
+            print(f"Chat stream error: {e}")
+            traceback.print_exc()
+            yield _sse("error", {"error": f"Sorry, I ran into an error: {str(e)}"})
+        finally:
+            # Also runs on errors and when the client disconnects mid-stream: keep the
+            # question and whatever was generated
+            if not saved:
+                try:
+                    save_reply()
+                except Exception as e:
+                    # An error event may already have been sent; nothing more to tell the client
+                    print(f"Chat stream error while saving the turn: {e}")
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # Disable proxy buffering (nginx) so tokens flush immediately
+        }
+    )
+
+
 @chat_bp.route("/refresh", methods=["POST"])
 def refresh_chat():
     """Refresh chat conversation - clears session but preserves files and knowledge"""
@@ -2,7 +2,7 @@
 from flask import Blueprint, request, jsonify
 from flask_login import current_user, login_required
 from services.conversation_service import (
-    get_user_conversations,
+    get_user_conversations_page,
     get_conversation_with_messages,
     delete_conversation,
     end_conversation,
@@ -13,6 +13,9 @@ from utils.api_key import validate_api_key
 
 conversations_bp = Blueprint('conversations', __name__)
 
+# Largest page of conversations or messages a request may ask for
+MAX_PAGE_SIZE = 100
+
 
 @conversations_bp.route("/conversations/test", methods=["GET"])
 def test_route():
@@ -46,13 +49,19 @@ def list_conversations():
             return jsonify({"error": "Authentication required"}), 401
         
         # Get query parameters
-        limit = request.args.get("limit", 10, type=int)
+        limit = max(1, min(request.args.get("limit", 10, type=int), MAX_PAGE_SIZE))
         active_only = request.args.get("active_only", "false").lower() == "true"
+        cursor = request.args.get("cursor")
         
-        conversations = get_user_conversations(user_id, limit=limit, active_only=active_only)
+        try:
+            conversations, next_cursor = get_user_conversations_page(
+                user_id, limit=limit, active_only=active_only, cursor=cursor)
+        except ValueError:
+            return jsonify({"error": "Invalid cursor"}), 400
         
         return jsonify({
-            "conversations": [conv.to_dict() for conv in conversations]
+            "conversations": [conv.to_dict() for conv in conversations],
+            "next_cursor": next_cursor
         })
     except Exception as e:
         print(f"Error listing conversations: {e}")
@@ -96,9 +105,13 @@ def get_conversation(conversation_id):
         if not user_id:
             return jsonify({"error": "Authentication required"}), 401
         
-        message_limit = request.args.get("message_limit", 20, type=int)
+        message_limit = max(1, min(request.args.get("message_limit", 20, type=int), MAX_PAGE_SIZE))
+        before = request.args.get("before")
         
-        result = get_conversation_with_messages(conversation_id, user_id, message_limit)
+        try:
+            result = get_conversation_with_messages(conversation_id, user_id, message_limit, before=before)
+        except ValueError:
+            return jsonify({"error": "Invalid cursor"}), 400
         
         if not result:
             return jsonify({"error": "Conversation not found"}), 404
@@ -40,13 +40,20 @@ def chat_interface():
 
 @dashboard_bp.route("/health", methods=["GET"])
 def health_check():
-    """Health check endpoint"""
+    """Health check endpoint - 503 until this process has warmed up (readiness probe)
+    
+    Public, so it reports readiness only; startup timings and pool statistics are
+    in the admin runtime stats (/admin/api/runtime-stats).
+    """
     try:
+        from services.lifecycle import is_ready
+        ready = is_ready()
         return jsonify({
-            "status": "healthy",
+            "status": "healthy" if ready else "starting",
+            "ready": ready,
             "service": "chatbot-api",
             "version": "2.0"
-        })
+        }), 200 if ready else 503
     except Exception as e:
         return jsonify({
             "status": "error",
@@ -54,6 +61,12 @@ def health_check():
         }), 500
 
 
+@dashboard_bp.route("/health/live", methods=["GET"])
+def liveness_check():
+    """Liveness endpoint - the process is serving requests (ready or not)"""
+    return jsonify({"status": "alive"})
+
+
 @dashboard_bp.route("/privacy-policy")
 @login_required
 def privacy_policy():
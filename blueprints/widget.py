@@ -1,16 +1,78 @@
 """Widget and demo blueprint"""
-from flask import Blueprint, request, render_template, send_from_directory, jsonify, url_for
+from flask import Blueprint, request, render_template, send_from_directory, jsonify, url_for, make_response
 from flask_login import login_required, current_user
-from services.config_service import load_user_chatbot_config
+from services.config_service import load_user_chatbot_config, get_user_appearance, get_user_config_version
+from services.knowledge_service import warm_query_embeddings
 from utils.api_key import validate_api_key
 from config.constants import SUGGESTED_MESSAGES
-from models.chatbot_appearance import ChatbotAppearance
 from urllib.parse import quote
+import hashlib
 import json
 import os
 
 widget_bp = Blueprint('widget', __name__)
 
+# HTTP caching for the embed endpoints, loaded on every page view of every customer site.
+# Browsers and CDNs revalidate with the ETag, which changes when the tenant's config or
+# appearance is saved (or this code/template changes), and get a 304 otherwise.
+EMBED_SCRIPT_MAX_AGE = int(os.getenv('EMBED_SCRIPT_MAX_AGE', 300))
+WIDGET_MAX_AGE = int(os.getenv('WIDGET_MAX_AGE', 60))
+EMBED_STALE_WHILE_REVALIDATE = int(os.getenv('EMBED_STALE_WHILE_REVALIDATE', 86400))
+CACHEABLE_ENDPOINTS = {'widget.serve_embed_script_multi', 'widget.widget_multi'}
+
+
+def _build_version():
+    """Hash of the code and template the embed responses are generated from"""
+    digest = hashlib.sha1()
+    mtime = 0
+    for path in (__file__, os.path.join(os.path.dirname(__file__), '..', 'templates', 'widget', 'widget_embed.html')):
+        try:
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+            mtime = max(mtime, os.path.getmtime(path))
+        except OSError:
+            pass
+    return digest.hexdigest()[:12], mtime
+
+
+_BUILD_VERSION, _BUILD_MTIME = _build_version()
+
+
+def _embed_validators(kind, user_id, api_key):
+    """ETag and Last-Modified for a tenant's embed response
+
+    Returns:
+        tuple: (etag, last modified epoch seconds)
+    """
+    config_version, last_modified = get_user_config_version(user_id)
+    key = f"{kind}|{_BUILD_VERSION}|{request.host}|{api_key}|{config_version}"
+    etag = hashlib.sha1(key.encode('utf-8')).hexdigest()[:32]
+    return etag, max(last_modified or 0, _BUILD_MTIME)
+
+
+def _client_is_current(validators):
+    """Whether the conditional request's cached copy is still valid"""
+    etag, last_modified = validators
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since:
+        return request.if_modified_since.timestamp() >= int(last_modified)
+    return False
+
+
+def _cacheable_response(body, mimetype, validators, max_age):
+    """Response with validators and a public cache policy (304 if body is None)"""
+    response = make_response(body if body is not None else '', 200 if body is not None else 304)
+    if body is not None:
+        response.mimetype = mimetype
+    etag, last_modified = validators
+    response.set_etag(etag)
+    response.last_modified = int(last_modified)
+    response.headers['Cache-Control'] = (
+        f"public, max-age={max_age}, stale-while-revalidate={EMBED_STALE_WHILE_REVALIDATE}"
+    )
+    return response
+
 
 def _build_widget_config(user_id):
     """Assemble widget/appearance config for a user"""
@@ -30,9 +92,8 @@ def _build_widget_config(user_id):
     }
     suggested = list(SUGGESTED_MESSAGES)
     
-    appearance = ChatbotAppearance.get_by_user(user_id)
-    if appearance:
-        appearance_dict = ChatbotAppearance.to_dict(appearance)
+    appearance_dict = get_user_appearance(user_id)
+    if appearance_dict:
         primary_color_obj = appearance_dict.get('primary_color')
         if isinstance(primary_color_obj, dict):
             primary_color = primary_color_obj.get('value', '#0891b2')
@@ -150,17 +211,19 @@ def widget_multi():
     if not user_id:
         return "Error: Invalid API key", 401
     
+    validators = _embed_validators('widget', user_id, api_key)
+    if _client_is_current(validators):
+        return _cacheable_response(None, 'text/html', validators, WIDGET_MAX_AGE)
+    
     # Load user's config
     try:
         user_config = load_user_chatbot_config(user_id)
         bot_name = user_config.get('bot_name', 'Cortex')
         
-        # Load appearance config from database
-        from models.chatbot_appearance import ChatbotAppearance
-        appearance = ChatbotAppearance.get_by_user(user_id)
+        # Load appearance config (cached, from the database)
+        appearance_dict = get_user_appearance(user_id)
         
-        if appearance:
-            appearance_dict = ChatbotAppearance.to_dict(appearance)
+        if appearance_dict:
             # Get primary color (handle both string and object format)
             primary_color_obj = appearance_dict.get('primary_color')
             if isinstance(primary_color_obj, dict):
@@ -217,8 +280,11 @@ def widget_multi():
     if not welcome_message:
         welcome_message = f"Hi there! I'm {bot_name}, your helpful assistant. How can I help you today?"
     
+    # Pre-embed the suggested messages so a click skips the embedding model
+    warm_query_embeddings(suggested)
+    
     # Pass user-specific config to template - use embeddable widget
-    return render_template("widget/widget_embed.html", 
+    html = render_template("widget/widget_embed.html", 
                          bot_name=bot_name,
                          primary_color=primary_color,
                          primary_color_obj=primary_color_obj if 'primary_color_obj' in locals() else None,
@@ -229,6 +295,7 @@ def widget_multi():
                          avatar=avatar,
                          short_info=short_info,
                          welcome_message=welcome_message)
+    return _cacheable_response(html, 'text/html', validators, WIDGET_MAX_AGE)
 
 
 @widget_bp.route("/embed.js")
@@ -256,6 +323,10 @@ def serve_embed_script_multi():
 })();
 """, 200, {'Content-Type': 'application/javascript'}
     
+    validators = _embed_validators('embed.js', user_id, api_key)
+    if _client_is_current(validators):
+        return _cacheable_response(None, 'application/javascript', validators, EMBED_SCRIPT_MAX_AGE)
+    
     # Get the base URL from the script's src (where embed.js is loaded from)
     base_url = request.host_url.rstrip('/')
     
@@ -264,12 +335,10 @@ def serve_embed_script_multi():
         user_config = load_user_chatbot_config(user_id)
         bot_name = user_config.get('bot_name', 'Cortex')
         
-        # Load appearance config from database
-        from models.chatbot_appearance import ChatbotAppearance
-        appearance = ChatbotAppearance.get_by_user(user_id)
+        # Load appearance config (cached, from the database)
+        appearance_dict = get_user_appearance(user_id)
         
-        if appearance:
-            appearance_dict = ChatbotAppearance.to_dict(appearance)
+        if appearance_dict:
             # Get primary color (handle both string and object format)
             primary_color_obj = appearance_dict.get('primary_color')
             if isinstance(primary_color_obj, dict):
@@ -655,5 +724,5 @@ def serve_embed_script_multi():
 }})();
 """
     
-    return embed_script, 200, {'Content-Type': 'application/javascript'}
+    return _cacheable_response(embed_script, 'application/javascript', validators, EMBED_SCRIPT_MAX_AGE)
 
@@ -5,5 +5,19 @@ DB_CONFIG = {
     'host': os.getenv('DB_HOST', 'localhost'),        # Database host
     'user': os.getenv('DB_USER', 'root'),             # Database username
     'password': os.getenv('DB_PASSWORD', ''),         # Database password
-    'database': os.getenv('DB_NAME', 'saturn')        # Database name
-}
\ No newline at end of file
+    'database': os.getenv('DB_NAME', 'saturn'),       # Database name
+    # Sessions run in UTC, like SQLite: CURRENT_TIMESTAMP and timestamps written by
+    # the application (Message.new_timestamp()) use the same clock, whatever the
+    # server's time zone. TIMESTAMP columns store UTC, so existing rows read back unchanged.
+    'time_zone': '+00:00'
+}
+
+# Shared connection pool settings (see db_pool.py)
+DB_POOL_CONFIG = {
+    'pool_name': os.getenv('DB_POOL_NAME', 'cortex_pool'),
+    'pool_size': int(os.getenv('DB_POOL_SIZE', 10)),                   # Connections per process (max 32)
+    'pool_reset_session': os.getenv('DB_POOL_RESET_SESSION', 'true').lower() == 'true',
+    'checkout_timeout': float(os.getenv('DB_POOL_TIMEOUT', 5)),        # Seconds to wait for a free connection
+    'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', 5)),        # Seconds to wait for MySQL to answer
+    'retry_interval': float(os.getenv('DB_POOL_RETRY_INTERVAL', 30))   # Seconds before retrying an unreachable MySQL
+}
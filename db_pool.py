@@ -0,0 +1,242 @@
+"""
+Shared database connection provider
+
+All models get their connections here instead of calling mysql.connector.connect()
+per operation. MySQL connections come from one process-wide pool; when MySQL is
+unreachable, each thread reuses a single SQLite connection per database file.
+
+Callers keep the existing pattern of calling conn.close() when done - in a finally
+block, since a connection that is never closed stays checked out: for MySQL that
+returns the connection to the pool, for SQLite it only releases the checkout.
+"""
+import sqlite3
+import threading
+import time
+from mysql.connector import pooling, Error
+from mysql.connector.errors import PoolError
+from db_config import DB_CONFIG, DB_POOL_CONFIG
+
+
+class PooledSQLiteConnection(sqlite3.Connection):
+    """Per-thread SQLite connection whose close() only releases a checkout
+
+    The underlying connection stays open for the thread's next checkout. Uncommitted
+    work is rolled back when the outermost checkout is released, matching what a
+    real close() would have done.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+
+    def close(self):
+        if self.checkouts > 0:
+            self.checkouts -= 1
+        if self.checkouts == 0 and self.in_transaction:
+            self.rollback()
+
+    def really_close(self):
+        """Close the underlying SQLite connection"""
+        super().close()
+
+
+_mysql_pool = None
+_mysql_unavailable_until = 0.0
+_pool_lock = threading.Lock()
+_sqlite_local = threading.local()
+_stats_lock = threading.Lock()
+_stats = {
+    'checkouts': 0,
+    'waits': 0,
+    'wait_seconds_total': 0.0,
+    'max_wait_seconds': 0.0,
+    'timeouts': 0,
+    'mysql_connect_failures': 0,
+    'sqlite_fallbacks': 0,
+    'sqlite_connections_opened': 0
+}
+
+
+def _bump(name, amount=1):
+    with _stats_lock:
+        _stats[name] += amount
+
+
+def _mark_mysql_unavailable(error):
+    """Stop trying MySQL for retry_interval seconds after a connection failure"""
+    global _mysql_unavailable_until
+    with _pool_lock:
+        if _mysql_unavailable_until <= time.monotonic():
+            print(f"⚠️ MySQL unavailable, using SQLite for {DB_POOL_CONFIG['retry_interval']:.0f}s: {error}")
+        _mysql_unavailable_until = time.monotonic() + DB_POOL_CONFIG['retry_interval']
+    _bump('mysql_connect_failures')
+
+
+def _get_mysql_pool():
+    """Get the process-wide MySQL pool, creating it on first use (None if unreachable)"""
+    global _mysql_pool
+    if _mysql_pool is not None:
+        return _mysql_pool
+    if _mysql_unavailable_until > time.monotonic():
+        return None
+
+    error = None
+    with _pool_lock:
+        if _mysql_pool is None:
+            try:
+                _mysql_pool = pooling.MySQLConnectionPool(
+                    pool_name=DB_POOL_CONFIG['pool_name'],
+                    pool_size=DB_POOL_CONFIG['pool_size'],
+                    pool_reset_session=DB_POOL_CONFIG['pool_reset_session'],
+                    connection_timeout=DB_POOL_CONFIG['connect_timeout'],
+                    **DB_CONFIG
+                )
+                print(f"✅ MySQL connection pool ready (size {DB_POOL_CONFIG['pool_size']})")
+            except (Error, Exception) as e:
+                _mysql_pool = None
+                error = e
+    if error is not None:
+        _mark_mysql_unavailable(error)
+        return None
+    return _mysql_pool
+
+
+def _checkout_mysql(pool):
+    """Borrow a pooled MySQL connection, waiting up to checkout_timeout if exhausted"""
+    started = time.monotonic()
+    deadline = started + DB_POOL_CONFIG['checkout_timeout']
+    waited = False
+    while True:
+        try:
+            conn = pool.get_connection()
+            break
+        except PoolError as e:
+            if 'exhausted' not in str(e).lower():
+                raise
+            if time.monotonic() >= deadline:
+                _bump('timeouts')
+                raise PoolError(
+                    f"No database connection available within {DB_POOL_CONFIG['checkout_timeout']}s "
+                    f"(pool size {DB_POOL_CONFIG['pool_size']})"
+                )
+            waited = True
+            time.sleep(0.005)
+
+    with _stats_lock:
+        _stats['checkouts'] += 1
+        if waited:
+            wait = time.monotonic() - started
+            _stats['waits'] += 1
+            _stats['wait_seconds_total'] += wait
+            _stats['max_wait_seconds'] = max(_stats['max_wait_seconds'], wait)
+    return conn
+
+
+def _get_sqlite_connection(db_path):
+    """Get this thread's SQLite connection for db_path"""
+    connections = getattr(_sqlite_local, 'connections', None)
+    if connections is None:
+        connections = _sqlite_local.connections = {}
+
+    conn = connections.get(db_path)
+    if conn is None:
+        conn = sqlite3.connect(db_path, factory=PooledSQLiteConnection)
+        conn.row_factory = sqlite3.Row
+        connections[db_path] = conn
+        _bump('sqlite_connections_opened')
+
+    conn.checkouts += 1
+    _bump('checkouts')
+    return conn
+
+
+def get_db_connection(sqlite_path='users.db'):
+    """Get a database connection (pooled MySQL, or per-thread SQLite fallback)
+
+    Args:
+        sqlite_path: SQLite database file used when MySQL is not available
+
+    Returns:
+        A MySQL pooled connection or a sqlite3.Connection; call close() when done.
+
+    Raises:
+        PoolError: if MySQL is up but no pooled connection frees up within
+            DB_POOL_TIMEOUT seconds (falling back to SQLite would split the data)
+    """
+    pool = _get_mysql_pool()
+    if pool is not None:
+        try:
+            return _checkout_mysql(pool)
+        except PoolError:
+            raise
+        except (Error, Exception) as e:
+            _mark_mysql_unavailable(e)
+
+    _bump('sqlite_fallbacks')
+    return _get_sqlite_connection(sqlite_path)
+
+
+def close_all():
+    """Close the pooled MySQL connections and this thread's SQLite connections
+
+    Call in a process that is about to fork workers (the gunicorn master after
+    migrations), so no open socket or file handle is inherited by them.
+    """
+    global _mysql_pool
+    with _pool_lock:
+        pool, _mysql_pool = _mysql_pool, None
+    if pool is not None:
+        try:
+            pool._remove_connections()
+        except (Error, Exception) as e:
+            print(f"⚠️ Could not close pooled MySQL connections: {e}")
+
+    connections = getattr(_sqlite_local, 'connections', None) or {}
+    for conn in connections.values():
+        try:
+            conn.really_close()
+        except sqlite3.Error:
+            pass
+    connections.clear()
+
+
+def reset_after_fork():
+    """Forget the connections inherited from the parent process (call in a forked worker)
+
+    Pooled MySQL sockets and SQLite handles must not be shared between processes, so
+    the child opens its own on first use. Nothing is closed: that would also tear
+    down the parent's connections.
+    """
+    global _mysql_pool, _mysql_unavailable_until, _pool_lock, _sqlite_local, _stats_lock
+    _mysql_pool = None
+    _mysql_unavailable_until = 0.0
+    _pool_lock = threading.Lock()
+    _sqlite_local = threading.local()
+    _stats_lock = threading.Lock()
+
+
+def is_mysql_connection(conn):
+    """Check if a connection from get_db_connection() is MySQL"""
+    return not isinstance(conn, sqlite3.Connection)
+
+
+def get_pool_stats():
+    """Get connection pool statistics for monitoring"""
+    pool = _mysql_pool
+    available = None
+    if pool is not None:
+        queue = getattr(pool, '_cnx_queue', None)
+        if queue is not None:
+            available = queue.qsize()
+
+    with _stats_lock:
+        stats = dict(_stats)
+    stats.update({
+        'backend': 'mysql' if pool is not None else 'sqlite',
+        'pool_size': DB_POOL_CONFIG['pool_size'],
+        'available': available,
+        'in_use': (DB_POOL_CONFIG['pool_size'] - available) if available is not None else None,
+        'checkout_timeout': DB_POOL_CONFIG['checkout_timeout'],
+        'mysql_retry_in_seconds': max(0.0, round(_mysql_unavailable_until - time.monotonic(), 1))
+    })
+    return stats
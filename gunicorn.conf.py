@@ -0,0 +1,69 @@
+"""
+Gunicorn configuration - production server
+
+    gunicorn -c gunicorn.conf.py
+
+The app is imported once in the master (preload_app) so the embedding model is
+loaded a single time and shared copy-on-write by every worker. Each worker then
+resets the DB pool and Chroma clients it inherited and starts its own ingestion
+workers and startup tasks (services/lifecycle.py); /health reports 503 until
+those are done. Workers are recycled after MAX_REQUESTS requests.
+
+For the async widget chat path (asgi.py) run uvicorn workers instead:
+
+    GUNICORN_APP=asgi:application GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker \\
+        gunicorn -c gunicorn.conf.py
+"""
+import gc
+import os
+
+# Tell app.py not to start threads in the master (see services/lifecycle.py)
+os.environ.setdefault('FORKING_SERVER', '1')
+
+wsgi_app = os.getenv('GUNICORN_APP', 'app:app')
+bind = f"0.0.0.0:{os.getenv('PORT', 6001)}"
+preload_app = True
+
+workers = int(os.getenv('WEB_CONCURRENCY', 2))
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.getenv('GUNICORN_THREADS', 8))  # gthread: concurrent requests per worker (SSE streams hold one)
+
+# Graceful recycling: bounded memory growth, jitter so workers do not restart together
+max_requests = int(os.getenv('MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.getenv('MAX_REQUESTS_JITTER', 100))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+
+accesslog = '-'
+errorlog = '-'
+
+
+def on_starting(server):
+    """Initialize database tables and run migrations once, in the master"""
+    print("📦 Initializing database...")
+    import db_pool
+    from migrations import run_migrations
+    try:
+        run_migrations()
+    finally:
+        # Workers open their own connections; none may be inherited across the fork
+        db_pool.close_all()
+
+
+def when_ready(server):
+    # Move everything loaded so far (model, app) out of the GC's reach, so collections
+    # in the workers do not write to - and un-share - the preloaded pages
+    gc.freeze()
+    print(f"🤖 Serving {wsgi_app} with {workers} {worker_class} worker(s)")
+
+
+def post_fork(server, worker):
+    from app import app
+    from services.lifecycle import after_fork
+    after_fork(app)
+
+
+def worker_exit(server, worker):
+    from services.lifecycle import before_exit
+    before_exit()
@@ -4,6 +4,7 @@ Handles schema changes and data migrations
 """
 import os
 import sqlite3
+import threading
 from models import User
 from models.prompt_preset import PromptPreset
 from models.crawled_url import CrawledUrl
@@ -17,6 +18,11 @@ class MigrationManager:
     MIGRATIONS_DIR = "migrations"
     MIGRATION_TABLE = "schema_migrations"
     
+    # Set once this process has run (or found applied) every migration. Models never
+    # check or create tables per call, so the request path issues no DDL or catalog queries
+    schema_verified = False
+    _schema_lock = threading.Lock()
+    
     @staticmethod
     def init_migrations():
         """Initialize migration system"""
@@ -68,12 +74,12 @@ class MigrationManager:
                 versions = [row[0] for row in cursor.fetchall()]
                 cursor.close()
             
-            conn.close()
             return set(versions)
         except Exception as e:
             print(f" Error getting applied migrations: {e}")
-            conn.close()
             return set()
+        finally:
+            conn.close()
     
     @staticmethod
     def mark_migration_applied(version, name):
@@ -102,6 +108,15 @@ class MigrationManager:
         finally:
             conn.close()
     
+    @staticmethod
+    def ensure_schema():
+        """Run pending migrations once per process (a no-op once the schema is verified)"""
+        if MigrationManager.schema_verified:
+            return
+        with MigrationManager._schema_lock:
+            if not MigrationManager.schema_verified:
+                MigrationManager.run_migrations()
+    
     @staticmethod
     def run_migrations():
         """Run all pending migrations"""
@@ -122,6 +137,12 @@ class MigrationManager:
             (10, "010_create_messages", MigrationManager._migration_010_create_messages),
                 (11, "011_create_admin_api_keys", MigrationManager._migration_011_create_admin_api_keys),
                 (12, "012_add_welcome_message", MigrationManager._migration_012_add_welcome_message),
+                (13, "013_create_user_api_keys", MigrationManager._migration_013_create_user_api_keys),
+                (14, "014_create_ingestion_jobs", MigrationManager._migration_014_create_ingestion_jobs),
+                (15, "015_create_knowledge_stats", MigrationManager._migration_015_create_knowledge_stats),
+                (16, "016_ensure_chat_schema", MigrationManager._migration_016_ensure_chat_schema),
+                (17, "017_add_chat_history_indexes", MigrationManager._migration_017_add_chat_history_indexes),
+                (18, "018_move_chat_history_indexes", MigrationManager._migration_018_move_chat_history_indexes),
             ]
         
         for version, name, migration_func in migrations:
@@ -136,6 +157,8 @@ class MigrationManager:
                     raise
             else:
                 print(f"✓ Migration {version} already applied")
+        
+        MigrationManager.schema_verified = True
     
     @staticmethod
     def _migration_001_initial_schema():
@@ -336,7 +359,7 @@ class MigrationManager:
                 cursor.close()
         except Exception as e:
             print(f"⚠️  Error in migration 009: {e}")
-            # Don't fail - _ensure_tables will handle it
+            # Don't fail - migration 016 will handle it
         finally:
             conn.close()
     
@@ -409,7 +432,7 @@ class MigrationManager:
                 cursor.close()
         except Exception as e:
             print(f"⚠️  Error in migration 010: {e}")
-            # Don't fail - _ensure_tables will handle it
+            # Don't fail - migration 016 will handle it
         finally:
             conn.close()
 
@@ -418,7 +441,7 @@ class MigrationManager:
     def _migration_011_create_admin_api_keys():
         """Create admin_api_keys table for storing admin API keys"""
         from models.api_key import AdminAPIKey
-        AdminAPIKey._ensure_tables()
+        AdminAPIKey.init_db()
         AdminAPIKey._ensure_system_keys_table()
         print("✅ Created admin_api_keys and system_api_keys tables")
         
@@ -483,8 +506,119 @@ class MigrationManager:
         finally:
             conn.close()
 
+    @staticmethod
+    def _migration_013_create_user_api_keys():
+        """Create user_api_keys table and index existing widget keys from config files"""
+        import json
+        from models.user_api_key import UserAPIKey
+        UserAPIKey.init_db()
+        print("✅ Created user_api_keys table")
+        
+        # One-time backfill: hash every api_key found in config/user_*/chatbot_config.json
+        config_dir = "./config"
+        if not os.path.exists(config_dir):
+            return
+        
+        indexed = 0
+        for user_dir in os.listdir(config_dir):
+            if not user_dir.startswith('user_'):
+                continue
+            try:
+                user_id = int(user_dir.replace('user_', ''))
+                config_path = os.path.join(config_dir, user_dir, 'chatbot_config.json')
+                if not os.path.exists(config_path):
+                    continue
+                with open(config_path, 'r') as f:
+                    api_key = json.load(f).get('api_key')
+                if api_key and UserAPIKey.set_key_hash(user_id, UserAPIKey.hash_key(api_key)):
+                    indexed += 1
+            except Exception as e:
+                print(f"⚠️  Could not index API key for {user_dir}: {e}")
+        print(f"✅ Indexed {indexed} user API key(s)")
+
+    @staticmethod
+    def _migration_014_create_ingestion_jobs():
+        """Create ingestion_jobs table for background knowledge base ingestion"""
+        from models.ingestion_job import IngestionJob
+        IngestionJob.init_db()
+        print("✅ Created ingestion_jobs table")
+
+    @staticmethod
+    def _migration_015_create_knowledge_stats():
+        """Create knowledge_stats table (counters are backfilled lazily per user)"""
+        from models.knowledge_stat import KnowledgeStat
+        KnowledgeStat.init_db()
+        print("✅ Created knowledge_stats table")
+
+    @staticmethod
+    def _migration_016_ensure_chat_schema():
+        """Ensure conversations, messages and API key tables and columns, once
+
+        These models used to create their tables (and look up missing columns) on
+        every call; that now happens only here.
+        """
+        from models.conversation import Conversation
+        from models.message import Message
+        from models.api_key import AdminAPIKey
+        Conversation.init_db()
+        Message.init_db()
+        AdminAPIKey.init_db()
+        AdminAPIKey._ensure_system_keys_table()
+        print("✅ Verified conversations, messages and API key tables")
+
+    # (table, index name, columns) for the hot chat history queries
+    CHAT_HISTORY_INDEXES = (
+        # Recent messages of a conversation, and keyset pages of them
+        ('messages', 'idx_messages_conversation_created', 'conversation_id, created_at, id'),
+        # A user's conversations by last activity (dashboard history, /conversations)
+        ('conversations', 'idx_conversations_user_updated', 'user_id, updated_at, id'),
+        # Active conversation of a widget session (every chat turn)
+        ('conversations', 'idx_conversations_user_session', 'user_id, session_id, is_active, updated_at'),
+    )
+
+    @staticmethod
+    def _migration_017_add_chat_history_indexes():
+        """Add composite indexes for chat history reads and keyset pagination"""
+        from models.conversation import Conversation
+        from models.message import Message
+        # Each index goes where its table lives (conversations.db on SQLite, not users.db)
+        owners = {'messages': Message, 'conversations': Conversation}
+        for table, index, columns in MigrationManager.CHAT_HISTORY_INDEXES:
+            MigrationManager._add_index(owners[table], table, index, columns)
+
+    @staticmethod
+    def _migration_018_move_chat_history_indexes():
+        """Re-run 017, which created the SQLite indexes in users.db instead of conversations.db"""
+        MigrationManager._migration_017_add_chat_history_indexes()
+
+    @staticmethod
+    def _add_index(model, table, index, columns):
+        """Create an index on the connection of the model that owns the table (no-op if it exists)"""
+        conn = model._get_db_connection()
+        is_mysql = model._is_mysql_connection(conn)
+        
+        try:
+            cursor = conn.cursor()
+            if is_mysql:
+                cursor.execute("""
+                    SELECT COUNT(*) FROM INFORMATION_SCHEMA.STATISTICS 
+                    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s
+                """, (table, index))
+                if cursor.fetchone()[0] > 0:
+                    print(f"ℹ️  {index} already exists")
+                    cursor.close()
+                    return
+                # InnoDB builds secondary indexes online: chats keep reading and writing
+                cursor.execute(f"ALTER TABLE {table} ADD INDEX {index} ({columns}), ALGORITHM=INPLACE, LOCK=NONE")
+            else:
+                cursor.execute(f"CREATE INDEX IF NOT EXISTS {index} ON {table}({columns})")
+            conn.commit()
+            cursor.close()
+            print(f"✅ Added index {index} on {table}({columns})")
+        finally:
+            conn.close()
 
 def run_migrations():
-    """Convenience function to run migrations"""
-    MigrationManager.run_migrations()
+    """Convenience function to run migrations (once per process)"""
+    MigrationManager.ensure_schema()
 
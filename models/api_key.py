@@ -4,6 +4,7 @@ Admin API Key Model for database storage
 import mysql.connector
 from mysql.connector import Error
 from db_config import DB_CONFIG
+from db_pool import get_db_connection
 from datetime import datetime
 import sqlite3
 import os
@@ -28,23 +29,18 @@ class AdminAPIKey:
     @staticmethod
     def _get_db_connection():
         """Get database connection (MySQL or SQLite fallback)"""
-        try:
-            return mysql.connector.connect(**DB_CONFIG)
-        except (Error, Exception) as e:
-            db_path = 'users.db'
-            conn = sqlite3.connect(db_path)
-            conn.row_factory = sqlite3.Row
-            return conn
+        return get_db_connection('users.db')
     
     @staticmethod
     def _is_mysql_connection(conn):
         """Check if connection is MySQL (handles both MySQLConnection and CMySQLConnection)"""
-        return isinstance(conn, (mysql.connector.MySQLConnection, mysql.connector.connection_cext.CMySQLConnection)) or \
-               type(conn).__name__ in ('MySQLConnection', 'CMySQLConnection')
+        return isinstance(conn, (mysql.connector.MySQLConnection, mysql.connector.connection_cext.CMySQLConnection,
+                                 mysql.connector.pooling.PooledMySQLConnection)) or \
+               type(conn).__name__ in ('MySQLConnection', 'CMySQLConnection', 'PooledMySQLConnection')
     
     @staticmethod
-    def _ensure_tables():
-        """Ensure admin_api_keys table exists"""
+    def init_db():
+        """Create admin_api_keys table (run by migrations, never on the request path)"""
         conn = None
         try:
             conn = AdminAPIKey._get_db_connection()
@@ -114,14 +110,18 @@ class AdminAPIKey:
         return hashlib.sha256(key.encode()).hexdigest()
     
     @staticmethod
-    def validate_key(api_key):
-        """Validate API key against database"""
+    def validate_key(api_key, raise_errors=False):
+        """Validate API key against database
+
+        Args:
+            api_key: The plain API key
+            raise_errors: Re-raise database errors instead of reporting the key as invalid
+        """
         if not api_key:
             return None
         
         conn = None
         try:
-            AdminAPIKey._ensure_tables()
             conn = AdminAPIKey._get_db_connection()
             cursor = conn.cursor()
             
@@ -163,6 +163,8 @@ class AdminAPIKey:
             return None
         except Exception as e:
             print(f"Error validating API key: {e}")
+            if raise_errors:
+                raise
             return None
         finally:
             if conn:
@@ -174,7 +176,6 @@ class AdminAPIKey:
         """Create a new API key"""
         conn = None
         try:
-            AdminAPIKey._ensure_tables()
             conn = AdminAPIKey._get_db_connection()
             cursor = conn.cursor()
             
@@ -216,7 +217,6 @@ class AdminAPIKey:
         """Get all API keys (without tokens)"""
         conn = None
         try:
-            AdminAPIKey._ensure_tables()
             conn = AdminAPIKey._get_db_connection()
             cursor = conn.cursor(dictionary=True if AdminAPIKey._is_mysql_connection(conn) else None)
             
@@ -332,7 +332,6 @@ class AdminAPIKey:
         """Store system API key in database"""
         conn = None
         try:
-            AdminAPIKey._ensure_system_keys_table()
             conn = AdminAPIKey._get_db_connection()
             cursor = conn.cursor()
             
@@ -400,7 +399,6 @@ class AdminAPIKey:
         """Get system API key from database"""
         conn = None
         try:
-            AdminAPIKey._ensure_system_keys_table()
             conn = AdminAPIKey._get_db_connection()
             cursor = conn.cursor()
             
@@ -437,7 +435,7 @@ class AdminAPIKey:
     
     @staticmethod
     def _ensure_system_keys_table():
-        """Ensure system_api_keys table exists"""
+        """Create system_api_keys table (run by migrations, never on the request path)"""
         conn = None
         try:
             conn = AdminAPIKey._get_db_connection()
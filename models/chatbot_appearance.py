@@ -5,6 +5,7 @@ Stores user-specific appearance settings (color, avatar, suggested messages)
 import mysql.connector
 from mysql.connector import Error
 from db_config import DB_CONFIG
+from db_pool import get_db_connection
 from datetime import datetime
 import sqlite3
 import json
@@ -17,14 +18,7 @@ class ChatbotAppearance:
     @staticmethod
     def _get_db_connection():
         """Get database connection (MySQL or SQLite fallback)"""
-        try:
-            return mysql.connector.connect(**DB_CONFIG)
-        except (Error, Exception) as e:
-            # Fallback to SQLite if MySQL is not available
-            db_path = 'users.db'
-            conn = sqlite3.connect(db_path)
-            conn.row_factory = sqlite3.Row
-            return conn
+        return get_db_connection('users.db')
     
     @staticmethod
     def _is_sqlite(conn):
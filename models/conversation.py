@@ -4,6 +4,7 @@ Conversation Model for storing chat conversations
 import mysql.connector
 from mysql.connector import Error
 from db_config import DB_CONFIG
+from db_pool import get_db_connection
 from datetime import datetime
 import sqlite3
 import os
@@ -27,24 +28,18 @@ class Conversation:
     @staticmethod
     def _get_db_connection():
         """Get database connection (MySQL or SQLite fallback)"""
-        try:
-            return mysql.connector.connect(**DB_CONFIG)
-        except (Error, Exception) as e:
-            # Fallback to SQLite if MySQL is not available
-            db_path = 'conversations.db'
-            conn = sqlite3.connect(db_path)
-            conn.row_factory = sqlite3.Row
-            return conn
+        return get_db_connection('conversations.db')
     
     @staticmethod
     def _is_mysql_connection(conn):
         """Check if connection is MySQL (handles both MySQLConnection and CMySQLConnection)"""
-        return isinstance(conn, (mysql.connector.MySQLConnection, mysql.connector.connection_cext.CMySQLConnection)) or \
-               type(conn).__name__ in ('MySQLConnection', 'CMySQLConnection')
+        return isinstance(conn, (mysql.connector.MySQLConnection, mysql.connector.connection_cext.CMySQLConnection,
+                                 mysql.connector.pooling.PooledMySQLConnection)) or \
+               type(conn).__name__ in ('MySQLConnection', 'CMySQLConnection', 'PooledMySQLConnection')
     
     @staticmethod
-    def _ensure_tables():
-        """Ensure conversations table exists (create if not)"""
+    def init_db():
+        """Create conversations table (run by migrations, never on the request path)"""
         conn = None
         try:
             conn = Conversation._get_db_connection()
@@ -121,7 +116,6 @@ class Conversation:
     @staticmethod
     def create(user_id, session_id, title=None):
         """Create a new conversation"""
-        Conversation._ensure_tables()
         conn = None
         try:
             conn = Conversation._get_db_connection()
@@ -163,7 +157,6 @@ class Conversation:
     @staticmethod
     def get_by_id(conversation_id):
         """Get conversation by ID"""
-        Conversation._ensure_tables()
         conn = None
         try:
             conn = Conversation._get_db_connection()
@@ -194,7 +187,6 @@ class Conversation:
     @staticmethod
     def get_by_session(user_id, session_id, active_only=True):
         """Get active conversation by user_id and session_id"""
-        Conversation._ensure_tables()
         conn = None
         try:
             conn = Conversation._get_db_connection()
@@ -245,9 +237,15 @@ class Conversation:
                 conn.close()
     
     @staticmethod
-    def get_user_conversations(user_id, limit=10, active_only=False):
-        """Get user's conversations"""
-        Conversation._ensure_tables()
+    def get_user_conversations(user_id, limit=10, active_only=False, before=None):
+        """Get user's conversations, most recently updated first
+        
+        Args:
+            user_id: User ID
+            limit: Maximum number of conversations
+            active_only: Only return active conversations
+            before: Keyset cursor (updated_at, id) - only conversations after that one in this order
+        """
         conn = None
         try:
             conn = Conversation._get_db_connection()
@@ -255,32 +253,26 @@ class Conversation:
             
             is_mysql = Conversation._is_mysql_connection(conn)
             
-            if active_only:
-                if is_mysql:
-                    cursor.execute("""
-                        SELECT * FROM conversations 
-                        WHERE user_id = %s AND is_active = 1
-                        ORDER BY updated_at DESC LIMIT %s
-                    """, (user_id, limit))
-                else:
-                    cursor.execute("""
-                        SELECT * FROM conversations 
-                        WHERE user_id = ? AND is_active = 1
-                        ORDER BY updated_at DESC LIMIT ?
-                    """, (user_id, limit))
+            # Served by idx_conversations_user_updated (migration 017)
+            params = [user_id]
+            if is_mysql:
+                query = "SELECT * FROM conversations WHERE user_id = %s"
+                if active_only:
+                    query += " AND is_active = 1"
+                if before:
+                    query += " AND updated_at <= %s AND (updated_at < %s OR id < %s)"
+                    params += [before[0], before[0], before[1]]
+                query += " ORDER BY updated_at DESC, id DESC LIMIT %s"
             else:
-                if is_mysql:
-                    cursor.execute("""
-                        SELECT * FROM conversations 
-                        WHERE user_id = %s
-                        ORDER BY updated_at DESC LIMIT %s
-                    """, (user_id, limit))
-                else:
-                    cursor.execute("""
-                        SELECT * FROM conversations 
-                        WHERE user_id = ?
-                        ORDER BY updated_at DESC LIMIT ?
-                    """, (user_id, limit))
+                query = "SELECT * FROM conversations WHERE user_id = ?"
+                if active_only:
+                    query += " AND is_active = 1"
+                if before:
+                    query += " AND updated_at <= ? AND (updated_at < ? OR id < ?)"
+                    params += [before[0], before[0], before[1]]
+                query += " ORDER BY updated_at DESC, id DESC LIMIT ?"
+            params.append(limit)
+            cursor.execute(query, params)
             
             rows = cursor.fetchall()
             conversations = []
@@ -432,6 +424,73 @@ class Conversation:
                 cursor.close()
                 conn.close()
     
+    @staticmethod
+    def merge_metadata(conversation_id, key, value, only_if=None):
+        """Set one key of a conversation's metadata, keeping the others
+        
+        Reads and writes the metadata in one transaction (the row is locked on
+        MySQL, the database on SQLite), so concurrent updates of other keys are
+        not lost. updated_at is
+        left alone: this is bookkeeping, not conversation activity.
+        
+        Args:
+            conversation_id: Conversation ID
+            key: Metadata key to set
+            value: JSON-serializable value
+            only_if: Optional check of the current value of key; nothing is written
+                unless it returns True
+        
+        Returns:
+            bool: Whether the metadata was written
+        """
+        conn = None
+        try:
+            import json
+            conn = Conversation._get_db_connection()
+            cursor = conn.cursor()
+            
+            is_mysql = Conversation._is_mysql_connection(conn)
+            
+            if is_mysql:
+                cursor.execute("SELECT metadata FROM conversations WHERE id = %s FOR UPDATE", (conversation_id,))
+            else:
+                # Take the write lock before reading, or another writer can slip in between
+                if not conn.in_transaction:
+                    cursor.execute("BEGIN IMMEDIATE")
+                cursor.execute("SELECT metadata FROM conversations WHERE id = ?", (conversation_id,))
+            row = cursor.fetchone()
+            if not row:
+                conn.rollback()
+                return False
+            
+            try:
+                metadata = json.loads(row[0]) if row[0] else {}
+            except ValueError:
+                metadata = {}
+            if only_if is not None and not only_if(metadata.get(key)):
+                conn.rollback()
+                return False
+            metadata[key] = value
+            
+            if is_mysql:
+                cursor.execute("UPDATE conversations SET metadata = %s, updated_at = updated_at WHERE id = %s",
+                               (json.dumps(metadata), conversation_id))
+            else:
+                cursor.execute("UPDATE conversations SET metadata = ? WHERE id = ?",
+                               (json.dumps(metadata), conversation_id))
+            
+            conn.commit()
+            return True
+        except Exception as e:
+            print(f"Error merging conversation metadata: {e}")
+            if conn:
+                conn.rollback()
+            return False
+        finally:
+            if conn:
+                cursor.close()
+                conn.close()
+    
     def delete(self):
         """Delete conversation (cascade will delete messages)"""
         conn = None
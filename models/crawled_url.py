@@ -5,6 +5,7 @@ User-isolated, similar to uploaded files
 import mysql.connector
 from mysql.connector import Error
 from db_config import DB_CONFIG
+from db_pool import get_db_connection
 from datetime import datetime
 import sqlite3
 import os
@@ -16,14 +17,7 @@ class CrawledUrl:
     @staticmethod
     def _get_db_connection():
         """Get database connection (MySQL or SQLite fallback)"""
-        try:
-            return mysql.connector.connect(**DB_CONFIG)
-        except (Error, Exception) as e:
-            # Fallback to SQLite if MySQL is not available
-            db_path = 'users.db'
-            conn = sqlite3.connect(db_path)
-            conn.row_factory = sqlite3.Row
-            return conn
+        return get_db_connection('users.db')
     
     @staticmethod
     def _is_sqlite(conn):
@@ -216,6 +210,34 @@ class CrawledUrl:
         finally:
             conn.close()
     
+    @staticmethod
+    def count_by_user(user_id):
+        """Count a user's non-deleted crawled URLs without loading their rows"""
+        conn = CrawledUrl._get_db_connection()
+        is_sqlite = CrawledUrl._is_sqlite(conn)
+        
+        try:
+            if is_sqlite:
+                cursor = conn.execute("""
+                    SELECT COUNT(*) FROM crawled_urls
+                    WHERE user_id = ? AND status != 'deleted'
+                """, (user_id,))
+                return cursor.fetchone()[0]
+            else:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    SELECT COUNT(*) FROM crawled_urls
+                    WHERE user_id = %s AND status != 'deleted'
+                """, (user_id,))
+                count = cursor.fetchone()[0]
+                cursor.close()
+                return count
+        except Exception as e:
+            print(f"❌ Error counting crawled URLs: {e}")
+            return 0
+        finally:
+            conn.close()
+    
     @staticmethod
     def update_text(crawled_id, text):
         """Update extracted text"""
@@ -5,6 +5,7 @@ User-isolated, similar to crawled URLs and uploaded files
 import mysql.connector
 from mysql.connector import Error
 from db_config import DB_CONFIG
+from db_pool import get_db_connection
 from datetime import datetime
 import sqlite3
 import os
@@ -16,14 +17,7 @@ class FAQ:
     @staticmethod
     def _get_db_connection():
         """Get database connection (MySQL or SQLite fallback)"""
-        try:
-            return mysql.connector.connect(**DB_CONFIG)
-        except (Error, Exception) as e:
-            # Fallback to SQLite if MySQL is not available
-            db_path = 'users.db'
-            conn = sqlite3.connect(db_path)
-            conn.row_factory = sqlite3.Row
-            return conn
+        return get_db_connection('users.db')
     
     @staticmethod
     def _is_sqlite(conn):
@@ -193,6 +187,38 @@ class FAQ:
         finally:
             conn.close()
     
+    @staticmethod
+    def count_by_user(user_id):
+        """Count a user's non-deleted FAQs and how many of them are ingested
+        
+        Returns:
+            tuple: (total, ingested)
+        """
+        conn = FAQ._get_db_connection()
+        is_sqlite = FAQ._is_sqlite(conn)
+        
+        try:
+            if is_sqlite:
+                cursor = conn.execute("""
+                    SELECT COUNT(*), COUNT(ingested_at) FROM faqs 
+                    WHERE user_id = ? AND status != 'deleted'
+                """, (user_id,))
+                row = cursor.fetchone()
+            else:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    SELECT COUNT(*), COUNT(ingested_at) FROM faqs 
+                    WHERE user_id = %s AND status != 'deleted'
+                """, (user_id,))
+                row = cursor.fetchone()
+                cursor.close()
+            return int(row[0] or 0), int(row[1] or 0)
+        except Exception as e:
+            print(f"❌ Error counting FAQs: {e}")
+            return 0, 0
+        finally:
+            conn.close()
+    
     @staticmethod
     def update(user_id, faq_id, question=None, answer=None, category=None):
         """Update FAQ question, answer, or category"""
@@ -0,0 +1,478 @@
+"""
+Ingestion Job Model - persistent queue for background knowledge base ingestion
+Jobs are claimed atomically (UPDATE ... WHERE status = 'queued') so several
+processes can run workers against the same table.
+"""
+import mysql.connector
+from mysql.connector import Error
+from db_config import DB_CONFIG
+from db_pool import get_db_connection
+from datetime import datetime, timedelta
+import sqlite3
+import json
+
+
+class IngestionJob:
+    """Model for background ingestion jobs"""
+
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+
+    @staticmethod
+    def _get_db_connection():
+        """Get database connection (MySQL or SQLite fallback)"""
+        return get_db_connection('users.db')
+
+    @staticmethod
+    def _is_sqlite(conn):
+        """Check if connection is SQLite"""
+        return isinstance(conn, sqlite3.Connection)
+
+    @staticmethod
+    def _row_to_dict(row):
+        """Convert a row to a dict and decode JSON columns"""
+        if row is None:
+            return None
+        job = dict(row)
+        for field in ('payload', 'result'):
+            if job.get(field):
+                try:
+                    job[field] = json.loads(job[field])
+                except (TypeError, ValueError):
+                    pass
+        return job
+
+    @staticmethod
+    def init_db():
+        """Initialize ingestion_jobs table"""
+        conn = IngestionJob._get_db_connection()
+        is_sqlite = IngestionJob._is_sqlite(conn)
+
+        try:
+            if is_sqlite:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS ingestion_jobs (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        user_id INTEGER NOT NULL,
+                        job_type TEXT NOT NULL,
+                        target_id INTEGER,
+                        payload TEXT,
+                        status TEXT DEFAULT 'queued',
+                        attempts INTEGER DEFAULT 0,
+                        max_attempts INTEGER DEFAULT 3,
+                        progress INTEGER DEFAULT 0,
+                        progress_message TEXT,
+                        result TEXT,
+                        error TEXT,
+                        run_after DATETIME DEFAULT CURRENT_TIMESTAMP,
+                        started_at DATETIME,
+                        finished_at DATETIME,
+                        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+                    )
+                """)
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_ingestion_jobs_status ON ingestion_jobs(status, run_after)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_ingestion_jobs_user ON ingestion_jobs(user_id, created_at)")
+                conn.commit()
+            else:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS ingestion_jobs (
+                        id INT PRIMARY KEY AUTO_INCREMENT,
+                        user_id INT NOT NULL,
+                        job_type VARCHAR(32) NOT NULL,
+                        target_id INT NULL,
+                        payload TEXT,
+                        status ENUM('queued', 'running', 'succeeded', 'failed') DEFAULT 'queued',
+                        attempts INT DEFAULT 0,
+                        max_attempts INT DEFAULT 3,
+                        progress INT DEFAULT 0,
+                        progress_message VARCHAR(255),
+                        result TEXT,
+                        error TEXT,
+                        run_after DATETIME DEFAULT CURRENT_TIMESTAMP,
+                        started_at DATETIME NULL,
+                        finished_at DATETIME NULL,
+                        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+                        INDEX idx_ingestion_jobs_status (status, run_after),
+                        INDEX idx_ingestion_jobs_user (user_id, created_at)
+                    )
+                """)
+                conn.commit()
+                cursor.close()
+        except Exception as e:
+            print(f"⚠️ Error creating ingestion_jobs table: {e}")
+        finally:
+            conn.close()
+
+    @staticmethod
+    def create(user_id, job_type, target_id=None, payload=None, max_attempts=3):
+        """Queue a new ingestion job"""
+        conn = IngestionJob._get_db_connection()
+        is_sqlite = IngestionJob._is_sqlite(conn)
+        payload_json = json.dumps(payload) if payload is not None else None
+        now = datetime.now()
+
+        try:
+            if is_sqlite:
+                cursor = conn.execute("""
+                    INSERT INTO ingestion_jobs (user_id, job_type, target_id, payload, status, max_attempts,
+                                                run_after, created_at, updated_at)
+                    VALUES (?, ?, ?, ?, 'queued', ?, ?, ?, ?)
+                """, (user_id, job_type, target_id, payload_json, max_attempts, now, now, now))
+                conn.commit()
+                return cursor.lastrowid
+            else:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    INSERT INTO ingestion_jobs (user_id, job_type, target_id, payload, status, max_attempts,
+                                                run_after, created_at)
+                    VALUES (%s, %s, %s, %s, 'queued', %s, %s, %s)
+                """, (user_id, job_type, target_id, payload_json, max_attempts, now, now))
+                conn.commit()
+                job_id = cursor.lastrowid
+                cursor.close()
+                return job_id
+        except Exception as e:
+            print(f"❌ Error creating ingestion job: {e}")
+            return None
+        finally:
+            conn.close()
+
+    @staticmethod
+    def get_by_id(user_id, job_id):
+        """Get job by ID (user-isolated)"""
+        conn = IngestionJob._get_db_connection()
+        is_sqlite = IngestionJob._is_sqlite(conn)
+
+        try:
+            if is_sqlite:
+                cursor = conn.execute("SELECT * FROM ingestion_jobs WHERE id = ? AND user_id = ?", (job_id, user_id))
+                row = cursor.fetchone()
+            else:
+                cursor = conn.cursor(dictionary=True)
+                cursor.execute("SELECT * FROM ingestion_jobs WHERE id = %s AND user_id = %s", (job_id, user_id))
+                row = cursor.fetchone()
+                cursor.close()
+            return IngestionJob._row_to_dict(row)
+        except Exception as e:
+            print(f"❌ Error getting ingestion job: {e}")
+            return None
+        finally:
+            conn.close()
+
+    @staticmethod
+    def get_all_by_user(user_id, limit=50):
+        """Get a user's most recent jobs"""
+        conn = IngestionJob._get_db_connection()
+        is_sqlite = IngestionJob._is_sqlite(conn)
+
+        try:
+            if is_sqlite:
+                cursor = conn.execute("""
+                    SELECT * FROM ingestion_jobs WHERE user_id = ?
+                    ORDER BY id DESC LIMIT ?
+                """, (user_id, limit))
+                rows = cursor.fetchall()
+            else:
+                cursor = conn.cursor(dictionary=True)
+                cursor.execute("""
+                    SELECT * FROM ingestion_jobs WHERE user_id = %s
+                    ORDER BY id DESC LIMIT %s
+                """, (user_id, limit))
+                rows = cursor.fetchall()
+                cursor.close()
+            return [IngestionJob._row_to_dict(row) for row in rows]
+        except Exception as e:
+            print(f"❌ Error getting ingestion jobs: {e}")
+            return []
+        finally:
+            conn.close()
+
+    @staticmethod
+    def find_active(user_id, job_type, target_id):
+        """Find a queued or running job for the same target (to avoid double ingestion)"""
+        conn = IngestionJob._get_db_connection()
+        is_sqlite = IngestionJob._is_sqlite(conn)
+
+        try:
+            if is_sqlite:
+                cursor = conn.execute("""
+                    SELECT * FROM ingestion_jobs
+                    WHERE user_id = ? AND job_type = ? AND target_id = ? AND status IN ('queued', 'running')
+                    ORDER BY id DESC LIMIT 1
+                """, (user_id, job_type, target_id))
+                row = cursor.fetchone()
+            else:
+                cursor = conn.cursor(dictionary=True)
+                cursor.execute("""
+                    SELECT * FROM ingestion_jobs
+                    WHERE user_id = %s AND job_type = %s AND target_id = %s AND status IN ('queued', 'running')
+                    ORDER BY id DESC LIMIT 1
+                """, (user_id, job_type, target_id))
+                row = cursor.fetchone()
+                cursor.close()
+            return IngestionJob._row_to_dict(row)
+        except Exception as e:
+            print(f"❌ Error finding active ingestion job: {e}")
+            return None
+        finally:
+            conn.close()
+
+    @staticmethod
+    def get_runnable(limit=50):
+        """Get queued jobs that are due to run, oldest first"""
+        conn = IngestionJob._get_db_connection()
+        is_sqlite = IngestionJob._is_sqlite(conn)
+
+        try:
+            if is_sqlite:
+                cursor = conn.execute("""
+                    SELECT * FROM ingestion_jobs
+                    WHERE status = 'queued' AND run_after <= ?
+                    ORDER BY id ASC LIMIT ?
+                """, (datetime.now(), limit))
+                rows = cursor.fetchall()
+            else:
+                cursor = conn.cursor(dictionary=True)
+                cursor.execute("""
+                    SELECT * FROM ingestion_jobs
+                    WHERE status = 'queued' AND run_after <= %s
+                    ORDER BY id ASC LIMIT %s
+                """, (datetime.now(), limit))
+                rows = cursor.fetchall()
+                cursor.close()
+            return [IngestionJob._row_to_dict(row) for row in rows]
+        except Exception as e:
+            print(f"❌ Error getting runnable ingestion jobs: {e}")
+            return []
+        finally:
+            conn.close()
+
+    @staticmethod
+    def get_running_counts():
+        """Get the number of running jobs per user_id"""
+        conn = IngestionJob._get_db_connection()
+        is_sqlite = IngestionJob._is_sqlite(conn)
+
+        try:
+            query = "SELECT user_id, COUNT(*) FROM ingestion_jobs WHERE status = 'running' GROUP BY user_id"
+            if is_sqlite:
+                rows = conn.execute(query).fetchall()
+            else:
+                cursor = conn.cursor()
+                cursor.execute(query)
+                rows = cursor.fetchall()
+                cursor.close()
+            return {row[0]: row[1] for row in rows}
+        except Exception as e:
+            print(f"❌ Error counting running ingestion jobs: {e}")
+            return {}
+        finally:
+            conn.close()
+
+    @staticmethod
+    def get_status_counts():
+        """Get the number of jobs per status (for monitoring)"""
+        conn = IngestionJob._get_db_connection()
+        is_sqlite = IngestionJob._is_sqlite(conn)
+
+        try:
+            query = "SELECT status, COUNT(*) FROM ingestion_jobs GROUP BY status"
+            if is_sqlite:
+                rows = conn.execute(query).fetchall()
+            else:
+                cursor = conn.cursor()
+                cursor.execute(query)
+                rows = cursor.fetchall()
+                cursor.close()
+            return {row[0]: row[1] for row in rows}
+        except Exception as e:
+            print(f"❌ Error counting ingestion jobs: {e}")
+            return {}
+        finally:
+            conn.close()
+
+    @staticmethod
+    def claim(job_id):
+        """Atomically move a queued job to running; False if another worker got it first"""
+        conn = IngestionJob._get_db_connection()
+        is_sqlite = IngestionJob._is_sqlite(conn)
+        now = datetime.now()
+
+        try:
+            if is_sqlite:
+                cursor = conn.execute("""
+                    UPDATE ingestion_jobs
+                    SET status = 'running', attempts = attempts + 1, started_at = ?, updated_at = ?, error = NULL
+                    WHERE id = ? AND status = 'queued'
+                """, (now, now, job_id))
+                conn.commit()
+                return cursor.rowcount == 1
+            else:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    UPDATE ingestion_jobs
+                    SET status = 'running', attempts = attempts + 1, started_at = %s, error = NULL
+                    WHERE id = %s AND status = 'queued'
+                """, (now, job_id))
+                conn.commit()
+                claimed = cursor.rowcount == 1
+                cursor.close()
+                return claimed
+        except Exception as e:
+            print(f"❌ Error claiming ingestion job: {e}")
+            return False
+        finally:
+            conn.close()
+
+    @staticmethod
+    def update_progress(job_id, progress, message=None):
+        """Record job progress (0-100) and an optional status message"""
+        conn = IngestionJob._get_db_connection()
+        is_sqlite = IngestionJob._is_sqlite(conn)
+
+        try:
+            if is_sqlite:
+                conn.execute("""
+                    UPDATE ingestion_jobs SET progress = ?, progress_message = ?, updated_at = ?
+                    WHERE id = ?
+                """, (progress, message, datetime.now(), job_id))
+                conn.commit()
+            else:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    UPDATE ingestion_jobs SET progress = %s, progress_message = %s, updated_at = %s
+                    WHERE id = %s
+                """, (progress, message, datetime.now(), job_id))
+                conn.commit()
+                cursor.close()
+            return True
+        except Exception as e:
+            print(f"❌ Error updating ingestion job progress: {e}")
+            return False
+        finally:
+            conn.close()
+
+    @staticmethod
+    def mark_succeeded(job_id, result=None):
+        """Mark a job as finished successfully"""
+        return IngestionJob._finish(job_id, IngestionJob.STATUS_SUCCEEDED, result=result)
+
+    @staticmethod
+    def mark_failed(job_id, error):
+        """Mark a job as permanently failed"""
+        return IngestionJob._finish(job_id, IngestionJob.STATUS_FAILED, error=error)
+
+    @staticmethod
+    def _finish(job_id, status, result=None, error=None):
+        conn = IngestionJob._get_db_connection()
+        is_sqlite = IngestionJob._is_sqlite(conn)
+        result_json = json.dumps(result) if result is not None else None
+        progress = 100 if status == IngestionJob.STATUS_SUCCEEDED else None
+        now = datetime.now()
+
+        try:
+            if is_sqlite:
+                conn.execute("""
+                    UPDATE ingestion_jobs
+                    SET status = ?, result = ?, error = ?, progress = COALESCE(?, progress),
+                        finished_at = ?, updated_at = ?
+                    WHERE id = ?
+                """, (status, result_json, error, progress, now, now, job_id))
+                conn.commit()
+            else:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    UPDATE ingestion_jobs
+                    SET status = %s, result = %s, error = %s, progress = COALESCE(%s, progress),
+                        finished_at = %s
+                    WHERE id = %s
+                """, (status, result_json, error, progress, now, job_id))
+                conn.commit()
+                cursor.close()
+            return True
+        except Exception as e:
+            print(f"❌ Error finishing ingestion job: {e}")
+            return False
+        finally:
+            conn.close()
+
+    @staticmethod
+    def requeue(job_id, error, delay_seconds):
+        """Put a failed attempt back in the queue to retry after delay_seconds"""
+        conn = IngestionJob._get_db_connection()
+        is_sqlite = IngestionJob._is_sqlite(conn)
+        run_after = datetime.now() + timedelta(seconds=delay_seconds)
+
+        try:
+            if is_sqlite:
+                conn.execute("""
+                    UPDATE ingestion_jobs SET status = 'queued', error = ?, run_after = ?, updated_at = ?
+                    WHERE id = ?
+                """, (error, run_after, datetime.now(), job_id))
+                conn.commit()
+            else:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    UPDATE ingestion_jobs SET status = 'queued', error = %s, run_after = %s
+                    WHERE id = %s
+                """, (error, run_after, job_id))
+                conn.commit()
+                cursor.close()
+            return True
+        except Exception as e:
+            print(f"❌ Error requeueing ingestion job: {e}")
+            return False
+        finally:
+            conn.close()
+
+    @staticmethod
+    def requeue_stale(stale_after_seconds):
+        """Requeue running jobs whose worker stopped reporting (crashed or restarted process)
+        
+        Jobs that already used all their attempts are failed instead, so a job that
+        kills its worker cannot loop forever.
+        """
+        conn = IngestionJob._get_db_connection()
+        is_sqlite = IngestionJob._is_sqlite(conn)
+        now = datetime.now()
+        cutoff = now - timedelta(seconds=stale_after_seconds)
+        error = 'Worker stopped responding'
+
+        try:
+            if is_sqlite:
+                conn.execute("""
+                    UPDATE ingestion_jobs SET status = 'failed', error = ?, finished_at = ?, updated_at = ?
+                    WHERE status = 'running' AND updated_at < ? AND attempts >= max_attempts
+                """, (error, now, now, cutoff))
+                cursor = conn.execute("""
+                    UPDATE ingestion_jobs SET status = 'queued', error = ?, updated_at = ?
+                    WHERE status = 'running' AND updated_at < ?
+                """, (error, now, cutoff))
+                conn.commit()
+                return cursor.rowcount
+            else:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    UPDATE ingestion_jobs SET status = 'failed', error = %s, finished_at = %s
+                    WHERE status = 'running' AND updated_at < %s AND attempts >= max_attempts
+                """, (error, now, cutoff))
+                cursor.execute("""
+                    UPDATE ingestion_jobs SET status = 'queued', error = %s
+                    WHERE status = 'running' AND updated_at < %s
+                """, (error, cutoff))
+                conn.commit()
+                count = cursor.rowcount
+                cursor.close()
+                return count
+        except Exception as e:
+            print(f"❌ Error requeueing stale ingestion jobs: {e}")
+            return 0
+        finally:
+            conn.close()
@@ -0,0 +1,236 @@
+"""
+Knowledge Stat Model - per-user chunk counters for the knowledge base
+Counters are kept per source_type, category and source_file, plus one 'total' row
+that also marks the user's counters as initialized. They are adjusted on every
+ingest/delete so dashboard stats never have to scan the vector collection.
+"""
+import mysql.connector
+from mysql.connector import Error
+from db_config import DB_CONFIG
+from db_pool import get_db_connection
+from datetime import datetime
+import sqlite3
+
+
+class KnowledgeStat:
+    """Model for knowledge base chunk counters"""
+
+    DIMENSIONS = ('total', 'source_type', 'category', 'source_file')
+    MAX_NAME_LENGTH = 512
+
+    @staticmethod
+    def _get_db_connection():
+        """Get database connection (MySQL or SQLite fallback)"""
+        return get_db_connection('users.db')
+
+    @staticmethod
+    def _is_sqlite(conn):
+        """Check if connection is SQLite"""
+        return isinstance(conn, sqlite3.Connection)
+
+    @staticmethod
+    def init_db():
+        """Initialize knowledge_stats table"""
+        conn = KnowledgeStat._get_db_connection()
+        is_sqlite = KnowledgeStat._is_sqlite(conn)
+
+        try:
+            if is_sqlite:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS knowledge_stats (
+                        user_id INTEGER NOT NULL,
+                        dimension TEXT NOT NULL,
+                        name TEXT NOT NULL,
+                        chunk_count INTEGER DEFAULT 0,
+                        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                        PRIMARY KEY (user_id, dimension, name),
+                        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+                    )
+                """)
+                conn.commit()
+            else:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS knowledge_stats (
+                        user_id INT NOT NULL,
+                        dimension ENUM('total', 'source_type', 'category', 'source_file') NOT NULL,
+                        name VARCHAR(512) NOT NULL,
+                        chunk_count INT DEFAULT 0,
+                        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                        PRIMARY KEY (user_id, dimension, name),
+                        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+                    )
+                """)
+                conn.commit()
+                cursor.close()
+        except Exception as e:
+            print(f"⚠️ Error creating knowledge_stats table: {e}")
+        finally:
+            conn.close()
+
+    @staticmethod
+    def get_by_user(user_id):
+        """Get a user's counters
+
+        Returns:
+            dict: {dimension: {name: chunk_count}}, empty if the user's counters were
+            never initialized, or None on a database error
+        """
+        conn = KnowledgeStat._get_db_connection()
+        is_sqlite = KnowledgeStat._is_sqlite(conn)
+
+        try:
+            if is_sqlite:
+                cursor = conn.execute("""
+                    SELECT dimension, name, chunk_count FROM knowledge_stats
+                    WHERE user_id = ?
+                """, (user_id,))
+                rows = [dict(row) for row in cursor.fetchall()]
+            else:
+                cursor = conn.cursor(dictionary=True)
+                cursor.execute("""
+                    SELECT dimension, name, chunk_count FROM knowledge_stats
+                    WHERE user_id = %s
+                """, (user_id,))
+                rows = cursor.fetchall()
+                cursor.close()
+
+            counters = {}
+            for row in rows:
+                counters.setdefault(row['dimension'], {})[row['name']] = int(row['chunk_count'] or 0)
+            return counters
+        except Exception as e:
+            print(f"❌ Error getting knowledge stats: {e}")
+            return None
+        finally:
+            conn.close()
+
+    @staticmethod
+    def apply_deltas(user_id, deltas):
+        """Add signed chunk deltas to an initialized user's counters
+
+        Does nothing until the user's counters have been initialized with replace();
+        the first stats read counts the collection and includes these chunks anyway.
+
+        Args:
+            user_id: User ID
+            deltas: {(dimension, name): delta}
+
+        Returns:
+            True if applied, None if the counters are not initialized, False on error
+        """
+        deltas = {key: delta for key, delta in deltas.items() if delta}
+        if not deltas:
+            return True
+        conn = KnowledgeStat._get_db_connection()
+        is_sqlite = KnowledgeStat._is_sqlite(conn)
+        now = datetime.now()
+
+        try:
+            if is_sqlite:
+                cursor = conn.execute("""
+                    SELECT 1 FROM knowledge_stats
+                    WHERE user_id = ? AND dimension = 'total'
+                """, (user_id,))
+                if cursor.fetchone() is None:
+                    return None
+                conn.executemany("""
+                    INSERT INTO knowledge_stats (user_id, dimension, name, chunk_count, updated_at)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT (user_id, dimension, name)
+                    DO UPDATE SET chunk_count = MAX(0, chunk_count + excluded.chunk_count),
+                                  updated_at = excluded.updated_at
+                """, [(user_id, dimension, name, delta, now) for (dimension, name), delta in deltas.items()])
+                conn.execute("""
+                    DELETE FROM knowledge_stats
+                    WHERE user_id = ? AND dimension != 'total' AND chunk_count <= 0
+                """, (user_id,))
+                conn.commit()
+            else:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    SELECT 1 FROM knowledge_stats
+                    WHERE user_id = %s AND dimension = 'total'
+                """, (user_id,))
+                if cursor.fetchone() is None:
+                    cursor.close()
+                    return None
+                cursor.executemany("""
+                    INSERT INTO knowledge_stats (user_id, dimension, name, chunk_count, updated_at)
+                    VALUES (%s, %s, %s, %s, %s)
+                    ON DUPLICATE KEY UPDATE chunk_count = GREATEST(0, chunk_count + VALUES(chunk_count)),
+                                            updated_at = VALUES(updated_at)
+                """, [(user_id, dimension, name, delta, now) for (dimension, name), delta in deltas.items()])
+                cursor.execute("""
+                    DELETE FROM knowledge_stats
+                    WHERE user_id = %s AND dimension != 'total' AND chunk_count <= 0
+                """, (user_id,))
+                conn.commit()
+                cursor.close()
+            return True
+        except Exception as e:
+            print(f"❌ Error updating knowledge stats: {e}")
+            return False
+        finally:
+            conn.close()
+
+    @staticmethod
+    def replace(user_id, counts):
+        """Replace all of a user's counters (initializes them)
+
+        Args:
+            user_id: User ID
+            counts: {(dimension, name): chunk_count}; a ('total', '') entry is always written
+        """
+        counts = dict(counts)
+        counts.setdefault(('total', ''), 0)
+        conn = KnowledgeStat._get_db_connection()
+        is_sqlite = KnowledgeStat._is_sqlite(conn)
+        now = datetime.now()
+        rows = [(user_id, dimension, name, count, now) for (dimension, name), count in counts.items()]
+
+        try:
+            if is_sqlite:
+                conn.execute("DELETE FROM knowledge_stats WHERE user_id = ?", (user_id,))
+                conn.executemany("""
+                    INSERT INTO knowledge_stats (user_id, dimension, name, chunk_count, updated_at)
+                    VALUES (?, ?, ?, ?, ?)
+                """, rows)
+                conn.commit()
+            else:
+                cursor = conn.cursor()
+                cursor.execute("DELETE FROM knowledge_stats WHERE user_id = %s", (user_id,))
+                cursor.executemany("""
+                    INSERT INTO knowledge_stats (user_id, dimension, name, chunk_count, updated_at)
+                    VALUES (%s, %s, %s, %s, %s)
+                """, rows)
+                conn.commit()
+                cursor.close()
+            return True
+        except Exception as e:
+            print(f"❌ Error replacing knowledge stats: {e}")
+            return False
+        finally:
+            conn.close()
+
+    @staticmethod
+    def reset(user_id):
+        """Forget a user's counters so the next stats read recounts the collection"""
+        conn = KnowledgeStat._get_db_connection()
+        is_sqlite = KnowledgeStat._is_sqlite(conn)
+
+        try:
+            if is_sqlite:
+                conn.execute("DELETE FROM knowledge_stats WHERE user_id = ?", (user_id,))
+                conn.commit()
+            else:
+                cursor = conn.cursor()
+                cursor.execute("DELETE FROM knowledge_stats WHERE user_id = %s", (user_id,))
+                conn.commit()
+                cursor.close()
+            return True
+        except Exception as e:
+            print(f"❌ Error resetting knowledge stats: {e}")
+            return False
+        finally:
+            conn.close()
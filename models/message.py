@@ -4,7 +4,8 @@ Message Model for storing individual chat messages within conversations
 import mysql.connector
 from mysql.connector import Error
 from db_config import DB_CONFIG
-from datetime import datetime
+from db_pool import get_db_connection
+from datetime import datetime, timezone
 import sqlite3
 import json
 
@@ -23,24 +24,18 @@ class Message:
     @staticmethod
     def _get_db_connection():
         """Get database connection (MySQL or SQLite fallback)"""
-        try:
-            return mysql.connector.connect(**DB_CONFIG)
-        except (Error, Exception) as e:
-            # Fallback to SQLite if MySQL is not available
-            db_path = 'conversations.db'
-            conn = sqlite3.connect(db_path)
-            conn.row_factory = sqlite3.Row
-            return conn
+        return get_db_connection('conversations.db')
     
     @staticmethod
     def _is_mysql_connection(conn):
         """Check if connection is MySQL (handles both MySQLConnection and CMySQLConnection)"""
-        return isinstance(conn, (mysql.connector.MySQLConnection, mysql.connector.connection_cext.CMySQLConnection)) or \
-               type(conn).__name__ in ('MySQLConnection', 'CMySQLConnection')
+        return isinstance(conn, (mysql.connector.MySQLConnection, mysql.connector.connection_cext.CMySQLConnection,
+                                 mysql.connector.pooling.PooledMySQLConnection)) or \
+               type(conn).__name__ in ('MySQLConnection', 'CMySQLConnection', 'PooledMySQLConnection')
     
     @staticmethod
-    def _ensure_tables():
-        """Ensure messages table exists (create if not)"""
+    def init_db():
+        """Create messages table (run by migrations, never on the request path)"""
         conn = None
         try:
             conn = Message._get_db_connection()
@@ -92,10 +87,20 @@ class Message:
                 cursor.close()
                 conn.close()
     
+    @staticmethod
+    def new_timestamp():
+        """created_at for a new message: UTC in whole seconds, as CURRENT_TIMESTAMP
+        
+        SQLite's CURRENT_TIMESTAMP is UTC and MySQL sessions are set to UTC
+        (db_config.py), so these sort with conversations.updated_at and older rows.
+        Every insert passes it explicitly, so messages written directly and by the
+        transcript buffer sort together and keyset cursors compare like with like.
+        """
+        return datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0)
+    
     @staticmethod
     def create(conversation_id, role, content, metadata=None):
         """Create a new message"""
-        Message._ensure_tables()
         conn = None
         try:
             conn = Message._get_db_connection()
@@ -108,15 +113,15 @@ class Message:
             
             if is_mysql:
                 cursor.execute("""
-                    INSERT INTO messages (conversation_id, role, content, metadata)
-                    VALUES (%s, %s, %s, %s)
-                """, (conversation_id, role, content, metadata_json))
+                    INSERT INTO messages (conversation_id, role, content, metadata, created_at)
+                    VALUES (%s, %s, %s, %s, %s)
+                """, (conversation_id, role, content, metadata_json, Message.new_timestamp()))
                 message_id = cursor.lastrowid
             else:
                 cursor.execute("""
-                    INSERT INTO messages (conversation_id, role, content, metadata)
-                    VALUES (?, ?, ?, ?)
-                """, (conversation_id, role, content, metadata_json))
+                    INSERT INTO messages (conversation_id, role, content, metadata, created_at)
+                    VALUES (?, ?, ?, ?, ?)
+                """, (conversation_id, role, content, metadata_json, Message.new_timestamp()))
                 message_id = cursor.lastrowid
             
             conn.commit()
@@ -133,10 +138,146 @@ class Message:
                 cursor.close()
                 conn.close()
     
+    @staticmethod
+    def append_to_conversation(conversation_id, entries, title=None):
+        """Insert messages and update the conversation's counters in one transaction
+        
+        Uses a single connection: one INSERT per message, then one UPDATE that bumps
+        message_count/updated_at and sets the title if the conversation has none.
+        Nothing is read back.
+        
+        Args:
+            conversation_id: Conversation ID
+            entries: List of (role, content, metadata) tuples, in order
+            title: Title to set if the conversation has none yet (None to leave it)
+        
+        Returns:
+            list: Created Message objects, or [] on failure
+        """
+        conn = None
+        try:
+            conn = Message._get_db_connection()
+            cursor = conn.cursor()
+            
+            is_mysql = Message._is_mysql_connection(conn)
+            
+            messages = []
+            created_at = Message.new_timestamp()
+            for role, content, metadata in entries:
+                # Serialize metadata to JSON string
+                metadata_json = json.dumps(metadata) if metadata else None
+                if is_mysql:
+                    cursor.execute("""
+                        INSERT INTO messages (conversation_id, role, content, metadata, created_at)
+                        VALUES (%s, %s, %s, %s, %s)
+                    """, (conversation_id, role, content, metadata_json, created_at))
+                else:
+                    cursor.execute("""
+                        INSERT INTO messages (conversation_id, role, content, metadata, created_at)
+                        VALUES (?, ?, ?, ?, ?)
+                    """, (conversation_id, role, content, metadata_json, created_at))
+                messages.append(Message(cursor.lastrowid, conversation_id, role, content,
+                                        created_at=created_at, metadata=metadata))
+            
+            if is_mysql:
+                cursor.execute("""
+                    UPDATE conversations 
+                    SET message_count = message_count + %s,
+                        updated_at = CURRENT_TIMESTAMP,
+                        title = CASE WHEN title IS NULL OR title = '' THEN %s ELSE title END
+                    WHERE id = %s
+                """, (len(entries), title, conversation_id))
+            else:
+                cursor.execute("""
+                    UPDATE conversations 
+                    SET message_count = message_count + ?,
+                        updated_at = CURRENT_TIMESTAMP,
+                        title = CASE WHEN title IS NULL OR title = '' THEN ? ELSE title END
+                    WHERE id = ?
+                """, (len(entries), title, conversation_id))
+            
+            conn.commit()
+            return messages
+        except Exception as e:
+            print(f"Error appending messages: {e}")
+            if conn:
+                conn.rollback()
+            return []
+        finally:
+            if conn:
+                cursor.close()
+                conn.close()
+    
+    @staticmethod
+    def insert_batch(rows, conversations):
+        """Insert messages of several conversations with one multi-row INSERT
+        
+        Used by the transcript write-behind buffer. The conversations' counters are
+        updated in the same transaction (one UPDATE per conversation).
+        
+        Args:
+            rows: List of (conversation_id, role, content, metadata, created_at) tuples, in order
+                (created_at from new_timestamp())
+            conversations: Dict of conversation_id -> (messages added, title to set if it has none)
+        
+        Returns:
+            bool: Success status
+        """
+        conn = None
+        try:
+            conn = Message._get_db_connection()
+            cursor = conn.cursor()
+            
+            is_mysql = Message._is_mysql_connection(conn)
+            
+            values = []
+            for conversation_id, role, content, metadata, created_at in rows:
+                values.extend((conversation_id, role, content, json.dumps(metadata) if metadata else None, created_at))
+            
+            if is_mysql:
+                cursor.execute(
+                    "INSERT INTO messages (conversation_id, role, content, metadata, created_at) VALUES "
+                    + ", ".join(["(%s, %s, %s, %s, %s)"] * len(rows)),
+                    values
+                )
+                for conversation_id, (count, title) in conversations.items():
+                    cursor.execute("""
+                        UPDATE conversations
+                        SET message_count = message_count + %s,
+                            updated_at = CURRENT_TIMESTAMP,
+                            title = CASE WHEN title IS NULL OR title = '' THEN %s ELSE title END
+                        WHERE id = %s
+                    """, (count, title, conversation_id))
+            else:
+                cursor.execute(
+                    "INSERT INTO messages (conversation_id, role, content, metadata, created_at) VALUES "
+                    + ", ".join(["(?, ?, ?, ?, ?)"] * len(rows)),
+                    values
+                )
+                for conversation_id, (count, title) in conversations.items():
+                    cursor.execute("""
+                        UPDATE conversations
+                        SET message_count = message_count + ?,
+                            updated_at = CURRENT_TIMESTAMP,
+                            title = CASE WHEN title IS NULL OR title = '' THEN ? ELSE title END
+                        WHERE id = ?
+                    """, (count, title, conversation_id))
+            
+            conn.commit()
+            return True
+        except Exception as e:
+            print(f"Error inserting message batch: {e}")
+            if conn:
+                conn.rollback()
+            return False
+        finally:
+            if conn:
+                cursor.close()
+                conn.close()
+
     @staticmethod
     def get_by_id(message_id):
         """Get message by ID"""
-        Message._ensure_tables()
         conn = None
         try:
             conn = Message._get_db_connection()
@@ -165,9 +306,15 @@ class Message:
                 conn.close()
     
     @staticmethod
-    def get_conversation_messages(conversation_id, limit=20, offset=0):
-        """Get messages for a conversation, ordered by created_at"""
-        Message._ensure_tables()
+    def get_conversation_messages(conversation_id, limit=20, offset=0, after=None):
+        """Get messages for a conversation, ordered by created_at
+        
+        Args:
+            conversation_id: Conversation ID
+            limit: Maximum number of messages
+            offset: Messages to skip (ignored when after is given)
+            after: Keyset cursor (created_at, id) - only messages after that one
+        """
         conn = None
         try:
             conn = Message._get_db_connection()
@@ -176,19 +323,37 @@ class Message:
             is_mysql = Message._is_mysql_connection(conn)
             
             if is_mysql:
-                cursor.execute("""
-                    SELECT * FROM messages 
-                    WHERE conversation_id = %s
-                    ORDER BY created_at ASC
-                    LIMIT %s OFFSET %s
-                """, (conversation_id, limit, offset))
+                if after:
+                    cursor.execute("""
+                        SELECT * FROM messages 
+                        WHERE conversation_id = %s
+                          AND created_at >= %s AND (created_at > %s OR id > %s)
+                        ORDER BY created_at ASC, id ASC
+                        LIMIT %s
+                    """, (conversation_id, after[0], after[0], after[1], limit))
+                else:
+                    cursor.execute("""
+                        SELECT * FROM messages 
+                        WHERE conversation_id = %s
+                        ORDER BY created_at ASC, id ASC
+                        LIMIT %s OFFSET %s
+                    """, (conversation_id, limit, offset))
             else:
-                cursor.execute("""
-                    SELECT * FROM messages 
-                    WHERE conversation_id = ?
-                    ORDER BY created_at ASC
-                    LIMIT ? OFFSET ?
-                """, (conversation_id, limit, offset))
+                if after:
+                    cursor.execute("""
+                        SELECT * FROM messages 
+                        WHERE conversation_id = ?
+                          AND created_at >= ? AND (created_at > ? OR id > ?)
+                        ORDER BY created_at ASC, id ASC
+                        LIMIT ?
+                    """, (conversation_id, after[0], after[0], after[1], limit))
+                else:
+                    cursor.execute("""
+                        SELECT * FROM messages 
+                        WHERE conversation_id = ?
+                        ORDER BY created_at ASC, id ASC
+                        LIMIT ? OFFSET ?
+                    """, (conversation_id, limit, offset))
             
             rows = cursor.fetchall()
             messages = []
@@ -207,9 +372,17 @@ class Message:
                 conn.close()
     
     @staticmethod
-    def get_recent_messages(conversation_id, limit=10):
-        """Get most recent messages for a conversation (for context building)"""
-        Message._ensure_tables()
+    def get_recent_messages(conversation_id, limit=10, before=None):
+        """Get most recent messages for a conversation (for context building)
+        
+        Args:
+            conversation_id: Conversation ID
+            limit: Maximum number of messages
+            before: Keyset cursor (created_at, id) - only messages older than that one
+        
+        Returns:
+            list: Message objects, chronological
+        """
         conn = None
         try:
             conn = Message._get_db_connection()
@@ -217,20 +390,39 @@ class Message:
             
             is_mysql = Message._is_mysql_connection(conn)
             
+            # Served by idx_messages_conversation_created (migration 017)
             if is_mysql:
-                cursor.execute("""
-                    SELECT * FROM messages 
-                    WHERE conversation_id = %s
-                    ORDER BY created_at DESC
-                    LIMIT %s
-                """, (conversation_id, limit))
+                if before:
+                    cursor.execute("""
+                        SELECT * FROM messages 
+                        WHERE conversation_id = %s
+                          AND created_at <= %s AND (created_at < %s OR id < %s)
+                        ORDER BY created_at DESC, id DESC
+                        LIMIT %s
+                    """, (conversation_id, before[0], before[0], before[1], limit))
+                else:
+                    cursor.execute("""
+                        SELECT * FROM messages 
+                        WHERE conversation_id = %s
+                        ORDER BY created_at DESC, id DESC
+                        LIMIT %s
+                    """, (conversation_id, limit))
             else:
-                cursor.execute("""
-                    SELECT * FROM messages 
-                    WHERE conversation_id = ?
-                    ORDER BY created_at DESC
-                    LIMIT ?
-                """, (conversation_id, limit))
+                if before:
+                    cursor.execute("""
+                        SELECT * FROM messages 
+                        WHERE conversation_id = ?
+                          AND created_at <= ? AND (created_at < ? OR id < ?)
+                        ORDER BY created_at DESC, id DESC
+                        LIMIT ?
+                    """, (conversation_id, before[0], before[0], before[1], limit))
+                else:
+                    cursor.execute("""
+                        SELECT * FROM messages 
+                        WHERE conversation_id = ?
+                        ORDER BY created_at DESC, id DESC
+                        LIMIT ?
+                    """, (conversation_id, limit))
             
             rows = cursor.fetchall()
             messages = []
@@ -252,7 +444,6 @@ class Message:
     @staticmethod
     def count_by_conversation(conversation_id):
         """Count messages in a conversation"""
-        Message._ensure_tables()
         conn = None
         try:
             conn = Message._get_db_connection()
@@ -4,6 +4,7 @@ OTP Model for email verification and authentication
 import sqlite3
 import mysql.connector
 from db_config import DB_CONFIG
+from db_pool import get_db_connection
 from datetime import datetime, timedelta
 import secrets
 import os
@@ -21,20 +22,14 @@ class OTP:
     @staticmethod
     def _get_db_connection():
         """Get database connection (MySQL or SQLite fallback)"""
-        try:
-            return mysql.connector.connect(**DB_CONFIG)
-        except Exception as e:
-            # Fallback to SQLite if MySQL is not available
-            # Use PVC path if available, otherwise use default location
-            db_path = os.getenv('SQLITE_DB_PATH', 'users.db')
-            # If relative path, make it absolute from /app
-            if not os.path.isabs(db_path):
-                db_path = os.path.join('/app', db_path)
-            # Ensure directory exists
-            os.makedirs(os.path.dirname(db_path), exist_ok=True)
-            conn = sqlite3.connect(db_path)
-            conn.row_factory = sqlite3.Row
-            return conn
+        # SQLite fallback uses PVC path if available, otherwise default location
+        db_path = os.getenv('SQLITE_DB_PATH', 'users.db')
+        # If relative path, make it absolute from /app
+        if not os.path.isabs(db_path):
+            db_path = os.path.join('/app', db_path)
+        # Ensure directory exists
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        return get_db_connection(db_path)
     
     @staticmethod
     def _is_sqlite(conn):
@@ -59,6 +54,7 @@ class OTP:
         Returns:
             str: OTP code, or None if creation failed
         """
+        conn = None
         try:
             conn = OTP._get_db_connection()
             is_sqlite = OTP._is_sqlite(conn)
@@ -86,7 +82,6 @@ class OTP:
                 conn.commit()
                 cursor.close()
             
-            conn.close()
             print(f"✅ OTP created for {email} (purpose: {purpose})")
             return otp_code
             
@@ -95,6 +90,9 @@ class OTP:
             import traceback
             traceback.print_exc()
             return None
+        finally:
+            if conn:
+                conn.close()
     
     @staticmethod
     def verify_otp(email, otp_code, purpose='registration'):
@@ -109,6 +107,7 @@ class OTP:
         Returns:
             tuple: (success: bool, message: str, otp_id: int or None)
         """
+        conn = None
         try:
             conn = OTP._get_db_connection()
             is_sqlite = OTP._is_sqlite(conn)
@@ -136,7 +135,6 @@ class OTP:
                 cursor.close()
             
             if not otp_record:
-                conn.close()
                 return False, "No valid OTP found for this email", None
             
             # Check if OTP is expired
@@ -145,13 +143,11 @@ class OTP:
                 expires_at = datetime.fromisoformat(expires_at.replace('Z', '+00:00'))
             
             if datetime.now() > expires_at:
-                conn.close()
                 return False, "OTP has expired. Please request a new one.", None
             
             # Check attempts
             attempts = otp_record['attempts']
             if attempts >= OTP.MAX_ATTEMPTS:
-                conn.close()
                 return False, "Maximum verification attempts exceeded. Please request a new OTP.", None
             
             # Verify OTP code
@@ -171,7 +167,6 @@ class OTP:
                     )
                     cursor.close()
                 conn.commit()
-                conn.close()
                 return False, "Invalid OTP code", None
             
             # Mark as verified
@@ -189,7 +184,6 @@ class OTP:
                 )
                 cursor.close()
             conn.commit()
-            conn.close()
             
             print(f"✅ OTP verified for {email}")
             return True, "OTP verified successfully", otp_id
@@ -199,10 +193,14 @@ class OTP:
             import traceback
             traceback.print_exc()
             return False, f"Error verifying OTP: {str(e)}", None
+        finally:
+            if conn:
+                conn.close()
     
     @staticmethod
     def cleanup_expired():
         """Remove expired OTPs (older than 24 hours)"""
+        conn = None
         try:
             conn = OTP._get_db_connection()
             is_sqlite = OTP._is_sqlite(conn)
@@ -223,17 +221,20 @@ class OTP:
                 cursor.close()
             
             conn.commit()
-            conn.close()
             print("✅ Cleaned up expired OTPs")
             return True
             
         except Exception as e:
             print(f"❌ Error cleaning up expired OTPs: {e}")
             return False
+        finally:
+            if conn:
+                conn.close()
     
     @staticmethod
     def get_recent_otp_count(email, purpose, minutes=15):
         """Get count of OTPs created for email in last N minutes (for rate limiting)"""
+        conn = None
         try:
             conn = OTP._get_db_connection()
             is_sqlite = OTP._is_sqlite(conn)
@@ -257,16 +258,19 @@ class OTP:
                 count = result['count'] if result else 0
                 cursor.close()
             
-            conn.close()
             return count
             
         except Exception as e:
             print(f"❌ Error getting recent OTP count: {e}")
             return 0
+        finally:
+            if conn:
+                conn.close()
     
     @staticmethod
     def get_oldest_recent_otp_time(email, purpose, minutes=60):
         """Get the creation time of the oldest OTP in the last N minutes (for rate limiting)"""
+        conn = None
         try:
             conn = OTP._get_db_connection()
             is_sqlite = OTP._is_sqlite(conn)
@@ -290,10 +294,12 @@ class OTP:
                 oldest_time = result['oldest_time'] if result and result['oldest_time'] else None
                 cursor.close()
             
-            conn.close()
             return oldest_time
             
         except Exception as e:
             print(f"❌ Error getting oldest OTP time: {e}")
             return None
+        finally:
+            if conn:
+                conn.close()
 
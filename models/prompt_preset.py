@@ -4,6 +4,7 @@ Prompt Preset Model - Global presets stored in database
 import mysql.connector
 from mysql.connector import Error
 from db_config import DB_CONFIG
+from db_pool import get_db_connection
 from datetime import datetime
 import sqlite3
 
@@ -23,14 +24,7 @@ class PromptPreset:
     @staticmethod
     def _get_db_connection():
         """Get database connection (MySQL or SQLite fallback)"""
-        try:
-            return mysql.connector.connect(**DB_CONFIG)
-        except (Error, Exception) as e:
-            # Fallback to SQLite if MySQL is not available
-            db_path = 'users.db'
-            conn = sqlite3.connect(db_path)
-            conn.row_factory = sqlite3.Row
-            return conn
+        return get_db_connection('users.db')
     
     @staticmethod
     def _is_sqlite(conn):
@@ -40,6 +34,7 @@ class PromptPreset:
     @staticmethod
     def get_all():
         """Get all prompt presets"""
+        conn = None
         try:
             conn = PromptPreset._get_db_connection()
             is_sqlite = PromptPreset._is_sqlite(conn)
@@ -66,17 +61,20 @@ class PromptPreset:
                 presets = cursor.fetchall()
                 cursor.close()
             
-            conn.close()
             return presets
         except Exception as e:
             print(f"Error getting presets: {e}")
             import traceback
             traceback.print_exc()
             return []
+        finally:
+            if conn:
+                conn.close()
     
     @staticmethod
     def get_by_id(preset_id):
         """Get preset by ID"""
+        conn = None
         try:
             conn = PromptPreset._get_db_connection()
             is_sqlite = PromptPreset._is_sqlite(conn)
@@ -105,11 +103,13 @@ class PromptPreset:
                     preset['id'] = str(preset['id'])  # Convert to string for consistency
                     return preset
             
-            conn.close()
             return None
         except Exception as e:
             print(f"Error getting preset by ID: {e}")
             return None
+        finally:
+            if conn:
+                conn.close()
     
     @staticmethod
     def init_presets_db():
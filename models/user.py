@@ -6,6 +6,7 @@ from mysql.connector import Error
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
 from db_config import DB_CONFIG
+from db_pool import get_db_connection
 from datetime import datetime
 import sqlite3
 import os
@@ -42,14 +43,7 @@ class User(UserMixin):
     @staticmethod
     def _get_db_connection():
         """Get database connection (MySQL or SQLite fallback)"""
-        try:
-            return mysql.connector.connect(**DB_CONFIG)
-        except (Error, Exception) as e:
-            # Fallback to SQLite if MySQL is not available
-            db_path = 'users.db'
-            conn = sqlite3.connect(db_path)
-            conn.row_factory = sqlite3.Row
-            return conn
+        return get_db_connection('users.db')
     
     @staticmethod
     def _is_sqlite(conn):
@@ -59,6 +53,7 @@ class User(UserMixin):
     @staticmethod
     def get_by_id(user_id):
         """Get user by ID"""
+        conn = None
         try:
             conn = User._get_db_connection()
             is_sqlite = User._is_sqlite(conn)
@@ -74,8 +69,6 @@ class User(UserMixin):
                 user_data = cursor.fetchone()
                 cursor.close()
             
-            conn.close()
-            
             if user_data:
                 if is_sqlite:
                     return User(
@@ -101,10 +94,14 @@ class User(UserMixin):
         except Exception as e:
             print(f"Error getting user by ID: {e}")
             return None
+        finally:
+            if conn:
+                conn.close()
     
     @staticmethod
     def get_by_email(email):
         """Get user by email"""
+        conn = None
         try:
             conn = User._get_db_connection()
             is_sqlite = User._is_sqlite(conn)
@@ -120,8 +117,6 @@ class User(UserMixin):
                 user_data = cursor.fetchone()
                 cursor.close()
             
-            conn.close()
-            
             if user_data:
                 if is_sqlite:
                     return User(
@@ -147,10 +142,14 @@ class User(UserMixin):
         except Exception as e:
             print(f"Error getting user by email: {e}")
             return None
+        finally:
+            if conn:
+                conn.close()
     
     @staticmethod
     def email_exists(email):
         """Check if email already exists"""
+        conn = None
         try:
             conn = User._get_db_connection()
             is_sqlite = User._is_sqlite(conn)
@@ -167,15 +166,18 @@ class User(UserMixin):
                 count = cursor.fetchone()[0]
                 cursor.close()
             
-            conn.close()
             return count > 0
         except Exception as e:
             print(f"Error checking email: {e}")
             return False
+        finally:
+            if conn:
+                conn.close()
     
     @staticmethod
     def username_exists(username):
         """Check if username already exists"""
+        conn = None
         try:
             conn = User._get_db_connection()
             is_sqlite = User._is_sqlite(conn)
@@ -192,11 +194,13 @@ class User(UserMixin):
                 count = cursor.fetchone()[0]
                 cursor.close()
             
-            conn.close()
             return count > 0
         except Exception as e:
             print(f"Error checking username: {e}")
             return False
+        finally:
+            if conn:
+                conn.close()
     
     @staticmethod
     def create_user(email, username, password, role='user'):
@@ -208,6 +212,7 @@ class User(UserMixin):
                    If successful, returns (user_id, None)
                    If failed, returns (None, error_message)
         """
+        conn = None
         try:
             # Check if email already exists
             if User.get_by_email(email):
@@ -242,8 +247,6 @@ class User(UserMixin):
                 user_id = cursor.lastrowid
                 cursor.close()
             
-            conn.close()
-            
             # Create user-specific directories
             if user_id:
                 User._create_user_directories(user_id)
@@ -283,6 +286,9 @@ class User(UserMixin):
             import traceback
             traceback.print_exc()
             return None, f"Failed to create account: {str(e)}"
+        finally:
+            if conn:
+                conn.close()
     
     @staticmethod
     def _create_user_directories(user_id):
@@ -300,6 +306,7 @@ class User(UserMixin):
     @staticmethod
     def update_last_login(user_id):
         """Update last login timestamp"""
+        conn = None
         try:
             conn = User._get_db_connection()
             is_sqlite = User._is_sqlite(conn)
@@ -315,11 +322,13 @@ class User(UserMixin):
                 conn.commit()
                 cursor.close()
             
-            conn.close()
             return True
         except Exception as e:
             print(f"Error updating last login: {e}")
             return False
+        finally:
+            if conn:
+                conn.close()
     
     @staticmethod
     def init_db():
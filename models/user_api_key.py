@@ -0,0 +1,147 @@
+"""
+User API Key Model - hashed widget API keys indexed for O(1) validation
+The plain token stays in the user's chatbot_config.json (it is shown in the embed code);
+this table only stores its SHA-256 hash so validation never scans config files.
+"""
+from db_pool import get_db_connection
+from datetime import datetime
+import sqlite3
+import hashlib
+
+
+class UserAPIKey:
+    """Model for hashed per-user widget API keys"""
+
+    @staticmethod
+    def _get_db_connection():
+        """Get database connection (MySQL or SQLite fallback)"""
+        return get_db_connection('users.db')
+
+    @staticmethod
+    def _is_sqlite(conn):
+        """Check if connection is SQLite"""
+        return isinstance(conn, sqlite3.Connection)
+
+    @staticmethod
+    def hash_key(api_key):
+        """Hash an API key for storage and lookup"""
+        return hashlib.sha256(api_key.encode()).hexdigest()
+
+    @staticmethod
+    def init_db():
+        """Initialize user_api_keys table"""
+        conn = UserAPIKey._get_db_connection()
+        is_sqlite = UserAPIKey._is_sqlite(conn)
+
+        try:
+            if is_sqlite:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS user_api_keys (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        user_id INTEGER NOT NULL UNIQUE,
+                        key_hash TEXT NOT NULL UNIQUE,
+                        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+                    )
+                """)
+                conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_user_api_keys_key_hash ON user_api_keys(key_hash)")
+                conn.commit()
+            else:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS user_api_keys (
+                        id INT PRIMARY KEY AUTO_INCREMENT,
+                        user_id INT NOT NULL,
+                        key_hash CHAR(64) NOT NULL,
+                        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+                        UNIQUE KEY uniq_user_id (user_id),
+                        UNIQUE KEY uniq_key_hash (key_hash)
+                    )
+                """)
+                conn.commit()
+                cursor.close()
+        except Exception as e:
+            print(f"⚠️ Error creating user_api_keys table: {e}")
+        finally:
+            conn.close()
+
+    @staticmethod
+    def set_key_hash(user_id, key_hash):
+        """Store (or replace) the hashed API key for a user"""
+        conn = UserAPIKey._get_db_connection()
+        is_sqlite = UserAPIKey._is_sqlite(conn)
+
+        try:
+            if is_sqlite:
+                conn.execute("""
+                    INSERT INTO user_api_keys (user_id, key_hash, created_at, updated_at)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT(user_id) DO UPDATE SET key_hash = excluded.key_hash, updated_at = excluded.updated_at
+                """, (user_id, key_hash, datetime.now(), datetime.now()))
+                conn.commit()
+            else:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    INSERT INTO user_api_keys (user_id, key_hash)
+                    VALUES (%s, %s)
+                    ON DUPLICATE KEY UPDATE key_hash = VALUES(key_hash), updated_at = CURRENT_TIMESTAMP
+                """, (user_id, key_hash))
+                conn.commit()
+                cursor.close()
+            return True
+        except Exception as e:
+            print(f"❌ Error storing user API key hash: {e}")
+            return False
+        finally:
+            conn.close()
+
+    @staticmethod
+    def get_user_id_by_hash(key_hash):
+        """Look up the user owning a hashed API key (unique index lookup)
+
+        Returns:
+            int: The user ID, or None if no user has this key
+
+        Raises:
+            Database errors - a failed lookup must not be mistaken for an unknown key
+        """
+        conn = UserAPIKey._get_db_connection()
+        is_sqlite = UserAPIKey._is_sqlite(conn)
+
+        try:
+            if is_sqlite:
+                cursor = conn.execute("SELECT user_id FROM user_api_keys WHERE key_hash = ?", (key_hash,))
+                row = cursor.fetchone()
+            else:
+                cursor = conn.cursor()
+                cursor.execute("SELECT user_id FROM user_api_keys WHERE key_hash = %s", (key_hash,))
+                row = cursor.fetchone()
+                cursor.close()
+            return row[0] if row else None
+        finally:
+            conn.close()
+
+    @staticmethod
+    def get_key_hash(user_id):
+        """Get the stored key hash for a user (None if not indexed yet)"""
+        conn = UserAPIKey._get_db_connection()
+        is_sqlite = UserAPIKey._is_sqlite(conn)
+
+        try:
+            if is_sqlite:
+                cursor = conn.execute("SELECT key_hash FROM user_api_keys WHERE user_id = ?", (user_id,))
+                row = cursor.fetchone()
+            else:
+                cursor = conn.cursor()
+                cursor.execute("SELECT key_hash FROM user_api_keys WHERE user_id = %s", (user_id,))
+                row = cursor.fetchone()
+                cursor.close()
+            return row[0] if row else None
+        except Exception as e:
+            print(f"❌ Error getting user API key hash: {e}")
+            return None
+        finally:
+            conn.close()
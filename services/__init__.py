@@ -1,22 +1,33 @@
 """Services package"""
 from .chatbot_service import get_chatbot_response
-from .knowledge_service import get_user_vectorstore, get_knowledge_stats, remove_file_from_vectorstore, set_embeddings
+from .knowledge_service import (
+    user_vectorstore_in_use,
+    invalidate_user_vectorstore,
+    get_knowledge_stats,
+    remove_file_from_vectorstore,
+    set_embeddings
+)
 from .config_service import (
     load_user_chatbot_config,
     save_user_chatbot_config_file,
-    get_user_chatbot_config_path
+    get_user_chatbot_config_path,
+    get_user_appearance,
+    invalidate_user_appearance
 )
 from .file_service import save_uploaded_file, list_user_files, delete_user_file, process_file_for_user
 
 __all__ = [
     'get_chatbot_response',
-    'get_user_vectorstore',
+    'user_vectorstore_in_use',
+    'invalidate_user_vectorstore',
     'get_knowledge_stats',
     'remove_file_from_vectorstore',
     'set_embeddings',
     'load_user_chatbot_config',
     'save_user_chatbot_config_file',
     'get_user_chatbot_config_path',
+    'get_user_appearance',
+    'invalidate_user_appearance',
     'save_uploaded_file',
     'list_user_files',
     'delete_user_file',
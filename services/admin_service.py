@@ -8,6 +8,7 @@ from models.faq import FAQ
 import sqlite3
 import mysql.connector
 from db_config import DB_CONFIG
+from db_pool import get_db_connection
 
 
 class AdminService:
@@ -16,14 +17,7 @@ class AdminService:
     @staticmethod
     def _get_db_connection():
         """Get database connection (MySQL or SQLite fallback)"""
-        try:
-            return mysql.connector.connect(**DB_CONFIG)
-        except Exception as e:
-            # Fallback to SQLite if MySQL is not available
-            db_path = 'users.db'
-            conn = sqlite3.connect(db_path)
-            conn.row_factory = sqlite3.Row
-            return conn
+        return get_db_connection('users.db')
     
     @staticmethod
     def _is_sqlite(conn):
@@ -38,6 +32,7 @@ class AdminService:
         Returns:
             list: List of user dictionaries with id, email, username, role, created_at, last_login
         """
+        conn = None
         try:
             conn = AdminService._get_db_connection()
             is_sqlite = AdminService._is_sqlite(conn)
@@ -53,13 +48,15 @@ class AdminService:
                 users = cursor.fetchall()
                 cursor.close()
             
-            conn.close()
             return users
         except Exception as e:
             print(f"❌ Error getting all users: {e}")
             import traceback
             traceback.print_exc()
             return []
+        finally:
+            if conn:
+                conn.close()
     
     @staticmethod
     def get_user_stats(user_id):
@@ -97,6 +94,7 @@ class AdminService:
     @staticmethod
     def get_user_files_count(user_id):
         """Get count of uploaded files for a user"""
+        conn = None
         try:
             conn = AdminService._get_db_connection()
             is_sqlite = AdminService._is_sqlite(conn)
@@ -114,15 +112,18 @@ class AdminService:
                 count = result['count'] if result else 0
                 cursor.close()
             
-            conn.close()
             return count
         except Exception as e:
             print(f"❌ Error getting user files count: {e}")
             return 0
+        finally:
+            if conn:
+                conn.close()
     
     @staticmethod
     def get_user_crawls_count(user_id):
         """Get count of crawled URLs for a user"""
+        conn = None
         try:
             conn = AdminService._get_db_connection()
             is_sqlite = AdminService._is_sqlite(conn)
@@ -140,15 +141,18 @@ class AdminService:
                 count = result['count'] if result else 0
                 cursor.close()
             
-            conn.close()
             return count
         except Exception as e:
             print(f"❌ Error getting user crawls count: {e}")
             return 0
+        finally:
+            if conn:
+                conn.close()
     
     @staticmethod
     def get_user_faqs_count(user_id):
         """Get count of FAQs for a user"""
+        conn = None
         try:
             conn = AdminService._get_db_connection()
             is_sqlite = AdminService._is_sqlite(conn)
@@ -166,11 +170,13 @@ class AdminService:
                 count = result['count'] if result else 0
                 cursor.close()
             
-            conn.close()
             return count
         except Exception as e:
             print(f"❌ Error getting user FAQs count: {e}")
             return 0
+        finally:
+            if conn:
+                conn.close()
     
     @staticmethod
     def get_system_stats():
@@ -180,6 +186,7 @@ class AdminService:
         Returns:
             dict: System-wide statistics
         """
+        conn = None
         try:
             conn = AdminService._get_db_connection()
             is_sqlite = AdminService._is_sqlite(conn)
@@ -277,7 +284,6 @@ class AdminService:
                 
                 cursor.close()
             
-            conn.close()
             return stats
         except Exception as e:
             print(f"❌ Error getting system stats: {e}")
@@ -292,6 +298,9 @@ class AdminService:
                 'total_faqs': 0,
                 'active_users': 0
             }
+        finally:
+            if conn:
+                conn.close()
     
     @staticmethod
     def get_users_with_stats():
@@ -0,0 +1,176 @@
+"""Per-tenant cache of chatbot answers for repeated questions
+
+FAQ-style widgets see the same few questions over and over, each paying for
+retrieval plus a full LLM call. Tenants that opt in (answer_cache_enabled in their
+chatbot config) get answers served from this cache when a new question matches a
+previous one, either by exact normalized text or by query-embedding cosine
+similarity of at least ANSWER_CACHE_SIMILARITY.
+
+Every tenant's entries are scoped to a version: a fingerprint of the chatbot config
+plus the knowledge-base version. When either changes (config saved, documents
+ingested, deleted, reset or restored) the tenant's entries are dropped on the next
+lookup, so a cached answer is never served against a different prompt or KB.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+ANSWER_CACHE = os.getenv('ANSWER_CACHE', 'true').lower() == 'true'  # global kill switch
+ANSWER_CACHE_SIMILARITY = float(os.getenv('ANSWER_CACHE_SIMILARITY', 0.95))
+ANSWER_CACHE_TTL = int(os.getenv('ANSWER_CACHE_TTL', 3600))
+ANSWER_CACHE_MAX_PER_TENANT = int(os.getenv('ANSWER_CACHE_MAX_PER_TENANT', 256))
+ANSWER_CACHE_MAX_TENANTS = int(os.getenv('ANSWER_CACHE_MAX_TENANTS', 1000))
+
+
+class _TenantAnswers:
+    """One tenant's cached answers, all for the same config/KB version"""
+
+    __slots__ = ('version', 'entries')
+
+    def __init__(self, version):
+        self.version = version
+        # normalized question -> (expires_at, unit vector or None, answer)
+        self.entries = OrderedDict()
+
+
+class AnswerCache:
+    """LRU + TTL answer cache keyed by user_id, then normalized question"""
+
+    def __init__(self, similarity=0.95, ttl=3600, max_per_tenant=256, max_tenants=1000):
+        self.similarity = similarity
+        self.ttl = ttl
+        self.max_per_tenant = max_per_tenant
+        self.max_tenants = max_tenants
+        self._tenants = OrderedDict()
+        self._lock = threading.Lock()
+        self._exact_hits = 0
+        self._semantic_hits = 0
+        self._misses = 0
+        self._stores = 0
+        self._invalidations = 0
+
+    @staticmethod
+    def _unit(vector):
+        if vector is None:
+            return None
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else None
+
+    def lookup(self, user_id, version, normalized, vector=None):
+        """Find a cached answer for a question
+
+        Args:
+            user_id: Tenant the question was asked on
+            version: Current (config fingerprint, KB version) of the tenant
+            normalized: Normalized question text
+            vector: Optional query embedding for the similarity match
+
+        Returns:
+            tuple: (answer, 'exact' or 'semantic') or (None, None) on a miss
+        """
+        with self._lock:
+            tenant = self._tenant_locked(user_id, version, create=False)
+            if tenant is None:
+                self._misses += 1
+                return None, None
+
+            now = time.monotonic()
+            entry = tenant.entries.get(normalized)
+            if entry is not None and entry[0] > now:
+                tenant.entries.move_to_end(normalized)
+                self._exact_hits += 1
+                return entry[2], 'exact'
+
+            unit = self._unit(vector)
+            if unit is not None:
+                best_key, best_score = None, self.similarity
+                for key, (expires_at, cached_unit, _) in tenant.entries.items():
+                    if expires_at <= now or cached_unit is None or cached_unit.shape != unit.shape:
+                        continue
+                    score = float(np.dot(cached_unit, unit))
+                    if score >= best_score:
+                        best_key, best_score = key, score
+                if best_key is not None:
+                    tenant.entries.move_to_end(best_key)
+                    self._semantic_hits += 1
+                    return tenant.entries[best_key][2], 'semantic'
+
+            self._misses += 1
+            return None, None
+
+    def store(self, user_id, version, normalized, answer, vector=None):
+        """Cache the answer generated for a question under the tenant's current version"""
+        if not answer:
+            return
+        unit = self._unit(vector)
+        with self._lock:
+            tenant = self._tenant_locked(user_id, version, create=True)
+            tenant.entries.pop(normalized, None)
+            tenant.entries[normalized] = (time.monotonic() + self.ttl, unit, answer)
+            while len(tenant.entries) > self.max_per_tenant:
+                tenant.entries.popitem(last=False)
+            self._stores += 1
+
+    def invalidate(self, user_id):
+        """Drop every cached answer for user_id"""
+        with self._lock:
+            if self._tenants.pop(user_id, None) is not None:
+                self._invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._tenants.clear()
+
+    def stats(self):
+        """Cache counters for monitoring"""
+        with self._lock:
+            lookups = self._exact_hits + self._semantic_hits + self._misses
+            hits = self._exact_hits + self._semantic_hits
+            return {
+                'enabled': ANSWER_CACHE,
+                'similarity': self.similarity,
+                'ttl': self.ttl,
+                'tenants': len(self._tenants),
+                'entries': sum(len(t.entries) for t in self._tenants.values()),
+                'max_per_tenant': self.max_per_tenant,
+                'exact_hits': self._exact_hits,
+                'semantic_hits': self._semantic_hits,
+                'misses': self._misses,
+                'hit_rate': round(hits / lookups, 3) if lookups else 0,
+                'stores': self._stores,
+                'invalidations': self._invalidations
+            }
+
+    def _tenant_locked(self, user_id, version, create):
+        tenant = self._tenants.get(user_id)
+        if tenant is not None and tenant.version != version:
+            # Config or knowledge base changed since these answers were generated
+            del self._tenants[user_id]
+            self._invalidations += 1
+            tenant = None
+        if tenant is None:
+            if not create:
+                return None
+            tenant = self._tenants[user_id] = _TenantAnswers(version)
+            while len(self._tenants) > self.max_tenants:
+                self._tenants.popitem(last=False)
+        self._tenants.move_to_end(user_id)
+        return tenant
+
+
+answer_cache = AnswerCache(
+    similarity=ANSWER_CACHE_SIMILARITY,
+    ttl=ANSWER_CACHE_TTL,
+    max_per_tenant=ANSWER_CACHE_MAX_PER_TENANT,
+    max_tenants=ANSWER_CACHE_MAX_TENANTS
+)
+
+
+def get_answer_cache_stats():
+    """Get answer cache statistics for monitoring"""
+    return answer_cache.stats()
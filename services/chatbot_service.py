@@ -1,57 +1,195 @@
 """Chatbot service - handles chat responses and RAG"""
+import asyncio
+import hashlib
+import json
+import os
 import re
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-from services.knowledge_service import get_user_vectorstore
+from services import knowledge_service
+from services.knowledge_service import user_vectorstore_in_use, get_knowledge_version, normalize_query_text
 from services.config_service import load_user_chatbot_config
 from services.llm_service import LLMProvider
-from services.conversation_service import build_conversation_context
+from services.conversation_service import format_history, get_conversation_history, to_history, add_messages_async
+from services.conversation_memory import recall, update_memory_async
+from services.answer_cache import answer_cache, ANSWER_CACHE
+from services.keyword_index import hybrid_search
+from services.context_builder import build_context, context_token_budget
 from services.user_info_service import get_user_name_for_chat
-from utils.prompts import get_default_prompt_with_name
+from services.prompt_service import get_compiled_prompt
+from utils.timing import StageTimings, get_stage_timing_stats
 
 
-def _replace_bot_name(prompt_text: str, bot_name: str) -> str:
-    """Replace any hardcoded 'Cortex' tokens with the current bot name."""
-    if not prompt_text or not bot_name:
-        return prompt_text
+# Chunks retrieved per chat turn (from each of the dense and keyword searches)
+RETRIEVAL_K = int(os.getenv('RETRIEVAL_K', 12))
+# Previous messages (10 turns) considered for conversation context; what goes into the
+# prompt is trimmed to a token budget, with older turns summarized (services/conversation_memory.py)
+HISTORY_MESSAGES = 20
 
-    # Replace possessive first to avoid partial overlaps
-    prompt_text = re.sub(r"\bCortex's\b", f"{bot_name}'s", prompt_text)
-    # Replace any remaining standalone occurrences (case-sensitive, boundary-aware)
-    prompt_text = re.sub(r"\bCortex\b", bot_name, prompt_text)
-    # Replace placeholder tokens
-    prompt_text = prompt_text.replace('{bot_name}', bot_name)
-    # Fallback: replace any remaining case-insensitive occurrences (safety net)
-    if bot_name.lower() != 'cortex':
-        prompt_text = re.sub(r"cortex", bot_name, prompt_text, flags=re.IGNORECASE)
-    return prompt_text
+# Config, visitor name, history and retrieval of a turn are independent I/O and run
+# concurrently on this pool; the LLM call starts once the slowest of them is done
+CHAT_STAGE_WORKERS = int(os.getenv('CHAT_STAGE_WORKERS', 32))
+_stage_executor = ThreadPoolExecutor(max_workers=CHAT_STAGE_WORKERS, thread_name_prefix="chat-stage")
 
 
-def get_chatbot_response(user_id, message, system_llm=None, name="User", conversation_id=None):
-    """Get chatbot response using user's knowledge base and config
+def new_chat_timings():
+    """Start the per-stage timings of one chat turn"""
+    return StageTimings('chat')
+
+
+def get_chat_pipeline_stats():
+    """Get per-stage chat timings (count, avg_ms, max_ms) for monitoring"""
+    return get_stage_timing_stats('chat')
+
+
+def begin_chat_turn(conversation, timings):
+    """Start reading the conversation history for a new turn
+    
+    The history usually comes from the session cache (get_history_window()), led by
+    the conversation's running summary once it has one. The turn's messages are
+    written afterwards, together, by save_chat_turn().
     
     Args:
-        user_id: User ID for isolation
-        message: User's message
-        system_llm: System-level LLM (fallback if user config fails)
-        name: User's name (default: "User")
-        conversation_id: Optional conversation ID for maintaining context
+        conversation: The turn's Conversation (its message_count validates the cache)
+        timings: The turn's StageTimings
     
     Returns:
-        tuple: (response_text, error_message)
+        Future of the messages before this turn (HistoryMessage tuples)
     """
-    if conversation_id:
-        name = get_user_name_for_chat(conversation_id, default=name)
+    return timings.submit(_stage_executor, 'history', recall, conversation, HISTORY_MESSAGES)
+
+
+def save_chat_turn(conversation_id, message, reply=None):
+    """Save the user's message and its reply as one write, in order
     
-    # Load user's chatbot config
-    user_config = load_user_chatbot_config(user_id)
-    bot_name = user_config.get('bot_name', 'Cortex')
-    user_prompt_template = user_config.get('prompt')
+    Args:
+        conversation_id: Conversation ID
+        message: The user's message
+        reply: Formatted reply, or None to save only the message (no answer was generated)
+    
+    Callers do not need to wait for the future: the response does not depend on the
+    write, and a failed write is logged here.
+    
+    Returns:
+        Future resolving to the saved Message objects ([user, assistant])
+    """
+    messages = [("user", message)]
+    if reply:
+        messages.append(("assistant", reply))
+    saved = add_messages_async(conversation_id, messages)
+    
+    def on_saved(future):
+        error = future.exception()
+        if error is not None:
+            print(f"⚠️ Failed to save chat turn of conversation {conversation_id}: {error}")
+        elif reply:
+            # Older turns are summarized in the background once the turn is stored
+            update_memory_async(conversation_id)
+    
+    saved.add_done_callback(on_saved)
+    return saved
+
+
+def saved_reply_id(saved):
+    """ID of the stored reply if save_chat_turn()'s write has already finished, else None"""
+    if not saved.done() or saved.exception() is not None:
+        return None
+    messages = saved.result()
+    return messages[1].id if len(messages) > 1 else None
+
+
+def _messages_before(conversation_id, message):
+    """Conversation history for callers that saved the current message themselves"""
+    messages = get_conversation_history(conversation_id, limit=HISTORY_MESSAGES + 1)
+    if messages and messages[-1].role == "user" and messages[-1].content == message:
+        messages = messages[:-1]
+    return to_history(messages[-HISTORY_MESSAGES:])
+
+
+def _retrieve(user_id, message):
+    """Relevant chunks from the user's knowledge base, most relevant first
+    
+    Returns:
+        list: Documents, or None when the user has no vectorstore
+    """
+    # Try to get user-specific vectorstore (will create if doesn't exist); held
+    # until the search is done so the registry cannot close it meanwhile
+    try:
+        with user_vectorstore_in_use(user_id) as user_vectorstore:
+            if not user_vectorstore:
+                return None
+            try:
+                # Dense + keyword (BM25) search fused by rank; keyword matches catch exact
+                # phone numbers, SKUs and names, so a small k keeps recall
+                return hybrid_search(user_id, user_vectorstore, message, k=RETRIEVAL_K)
+            except Exception as e:
+                print(f" Error retrieving documents: {e}")
+                import traceback
+                traceback.print_exc()
+                return []
+    except Exception as e:
+        print(f" Vectorstore not available, using direct LLM: {e}")
+        return None
+
+
+class _TurnStages:
+    """The independent lookups of one chat turn, started concurrently"""
+    
+    def __init__(self, user_id, message, name, conversation_id, history, timings):
+        self._name_default = name
+        self._config = timings.submit(_stage_executor, 'config', load_user_chatbot_config, user_id)
+        self._docs = timings.submit(_stage_executor, 'retrieval', _retrieve, user_id, message)
+        if conversation_id:
+            self._name = timings.submit(_stage_executor, 'name', get_user_name_for_chat, conversation_id, name)
+            if history is None:
+                history = timings.submit(_stage_executor, 'history', _messages_before, conversation_id, message)
+            self._history = history
+        else:
+            self._name = StageTimings.done(name)
+            self._history = StageTimings.done([])
+    
+    def config(self):
+        return self._config.result()
+    
+    def name(self):
+        try:
+            return self._name.result()
+        except Exception as e:
+            print(f" Could not look up the visitor's name: {e}")
+            return self._name_default
+    
+    def history(self):
+        """Messages before this turn, oldest first"""
+        try:
+            return self._history.result()
+        except Exception as e:
+            print(f" Could not load conversation history: {e}")
+            return []
+    
+    def docs(self):
+        return self._docs.result()
+    
+    async def wait(self):
+        """Wait for every lookup without blocking the event loop"""
+        await asyncio.gather(
+            *(asyncio.wrap_future(f) for f in (self._config, self._docs, self._name, self._history)),
+            return_exceptions=True
+        )
+
+
+def _prepare_chat(user_id, message, stages, timings, system_llm=None, anonymous=False):
+    """Resolve the user's LLM and build the full prompt for one chat turn
     
-    # Log prompt status for debugging
-    print(f" User {user_id} prompt status:")
-    print(f"   - Has prompt: {user_prompt_template is not None}")
-    print(f"   - Prompt length: {len(user_prompt_template) if user_prompt_template else 0}")
-    print(f"   - Prompt preview: {user_prompt_template[:100] if user_prompt_template else 'None'}...")
+    Shared by the blocking and streaming chat paths. An anonymous prompt leaves the
+    visitor's name out, so the answer can be cached and served to anyone.
+    
+    Returns:
+        tuple: (llm, full_prompt) - full_prompt is None when the LLM cannot be invoked (mock fallback)
+    """
+    # Load user's chatbot config
+    user_config = stages.config()
+    name = "User" if anonymous else stages.name()
     
     # Get user-specific LLM settings
     temperature = float(user_config.get('temperature', 0.3))
@@ -59,7 +197,6 @@ def get_chatbot_response(user_id, message, system_llm=None, name="User", convers
     top_p = float(user_config.get('top_p', 1.0))
     frequency_penalty = float(user_config.get('frequency_penalty', 0.0))
     presence_penalty = float(user_config.get('presence_penalty', 0.0))
-    system_instructions = user_config.get('system_instructions', '')
     
     # Get user's selected provider and model
     llm_provider = user_config.get('llm_provider', 'openai')
@@ -68,7 +205,7 @@ def get_chatbot_response(user_id, message, system_llm=None, name="User", convers
     
     # Create user-specific LLM with their provider and settings
     try:
-        llm = LLMProvider.get_llm(
+        llm = LLMProvider.get_cached_llm(
             provider=llm_provider,
             model=llm_model,
             api_key=llm_api_key,  # Uses system default if None
@@ -83,176 +220,312 @@ def get_chatbot_response(user_id, message, system_llm=None, name="User", convers
         print(f" Failed to create user LLM ({llm_provider}/{llm_model}), using system LLM: {e}")
         llm = system_llm if system_llm else LLMProvider.get_default_llm()
     
-    # Try to get user-specific vectorstore (will create if doesn't exist)
-    user_vectorstore = None
-    user_retriever = None
+    # Static parts of the prompt are compiled once per tenant config
+    compiled_prompt = get_compiled_prompt(user_id, user_config)
+    
+    # Get relevant documents from user's knowledge base (retrieved concurrently with the lookups above)
+    # Priority order: FAQ > Crawl > File Upload
+    context = ""
+    docs = stages.docs()
+    if docs:
+        # Pack by relevance into the model's token budget (deduped, overlaps merged);
+        # passages come out ordered FAQ > Crawl > File Upload
+        context, packing = timings.timed('context', build_context, docs, context_token_budget(llm_model))
+        
+        # Log retrieval for debugging
+        # Note: Accept both 'crawl' and 'web_crawl' for backward compatibility
+        source_types = [d.metadata.get('source_type') for d in docs]
+        faq_count = source_types.count('faq')
+        crawl_count = source_types.count('crawl') + source_types.count('web_crawl')
+        file_count = source_types.count('file_upload')
+        print(f" Retrieved {len(docs)} documents, packed {packing['chunks_used']} into {packing['passages']} passage(s)")
+        print(f" Breakdown: FAQ={faq_count}, Crawl={crawl_count}, File={file_count}, Other={len(docs) - faq_count - crawl_count - file_count}")
+        print(f" Context tokens: {packing['tokens_used']}/{packing['budget']} "
+              f"({packing['duplicates']} duplicate, {packing['merged']} merged, {packing['skipped_over_budget']} over budget)")
+    elif docs is None:
+        print(f"ℹ No vectorstore available - using direct LLM response")
+    else:
+        print(f"ℹ No relevant documents found in knowledge base for: {message[:50]}")
+    
+    if not hasattr(llm, 'invoke'):
+        return llm, None
     
+    # Build conversation history context from the messages before this turn
+    conversation_context = format_history(stages.history())
+    if conversation_context:
+        print(f" Using conversation history ({len(conversation_context)} chars)")
+    
+    if context:
+        print(f" Using RAG with {len(context)} characters of context")
+    else:
+        print(f"ℹ No knowledge base context - using direct LLM response")
+    full_prompt = compiled_prompt.render(message, context=context, history=conversation_context, name=name)
+    return llm, full_prompt
+
+
+def _answer_cache_scope(user_id, message, stages):
+    """Work out whether this turn can use the tenant's answer cache
+
+    Only standalone questions qualify: follow-ups depend on earlier turns. A turn
+    the cache applies to is answered without the visitor's name (see _prepare_chat()),
+    so widget visitors and dashboard users share the same cached answers.
+
+    Returns:
+        dict: version, normalized question and query vector - or None when the cache
+        does not apply
+    """
+    if not ANSWER_CACHE:
+        return None
+    user_config = stages.config()
+    if not user_config.get('answer_cache_enabled'):
+        return None
+    if stages.history():
+        return None
+
+    config_fingerprint = hashlib.sha256(
+        json.dumps(user_config, sort_keys=True, default=str).encode('utf-8')
+    ).hexdigest()
+    vector = None
     try:
-        user_vectorstore = get_user_vectorstore(user_id)
-        if user_vectorstore:
-            # Try to create retriever - if it fails, we'll use direct LLM
-            # Increased k to 30 for better retrieval, especially for FILE documents
-            # Priority order handled in retrieval
-            try:
-                user_retriever = user_vectorstore.as_retriever(search_kwargs={"k": 30})
-            except Exception as e:
-                print(f" Cannot create retriever, using direct LLM: {e}")
-                user_retriever = None
+        if knowledge_service.embeddings is not None:
+            # Shares the query embedding cache with the retrieval running alongside
+            vector = knowledge_service.embeddings.embed_query(message)
     except Exception as e:
-        print(f" Vectorstore not available, using direct LLM: {e}")
-        user_vectorstore = None
-        user_retriever = None
+        print(f" Answer cache: could not embed question, exact match only: {e}")
+
+    return {
+        'version': (config_fingerprint, get_knowledge_version(user_id)),
+        'normalized': normalize_query_text(message),
+        'vector': vector
+    }
+
+
+def _get_cached_answer(user_id, scope):
+    """Look up a cached raw answer for the turn (None on a miss or when caching is off)"""
+    if scope is None:
+        return None
+    answer, kind = answer_cache.lookup(user_id, scope['version'], scope['normalized'], scope['vector'])
+    if answer is not None:
+        print(f" Answer cache {kind} hit for user {user_id}")
+    return answer
+
+
+def _store_cached_answer(user_id, scope, answer):
+    """Remember a freshly generated raw answer for the turn's cache scope"""
+    if scope is not None:
+        answer_cache.store(user_id, scope['version'], scope['normalized'], answer, scope['vector'])
+
+
+def format_chat_reply(reply):
+    """Normalize raw LLM output for display (same format for blocking and streamed replies)"""
+    # Ensure reply is a string
+    if hasattr(reply, 'content'):
+        reply = reply.content
+    reply = str(reply).strip()
     
-    # Use user's custom prompt or default
-    if user_prompt_template:
-        prompt_template_text = user_prompt_template
-        print(f" Using user's custom prompt (length: {len(prompt_template_text)})")
-    else:
-        prompt_template_text = get_default_prompt_with_name(bot_name)
-        print(f" No custom prompt found, using default prompt")
+    # Clean up excessive newlines (more than 2 consecutive)
+    reply = re.sub(r'\n{3,}', '\n\n', reply)
     
-    # Normalize bot name usage in the prompt (handles placeholders and hardcoded names)
-    prompt_template_text = _replace_bot_name(prompt_template_text, bot_name)
+    # Convert newlines to <br> for HTML display
+    return reply.replace("\n", "<br>")
+
+
+def get_chatbot_response(user_id, message, system_llm=None, name="User", conversation_id=None,
+                         history=None, timings=None):
+    """Get chatbot response using user's knowledge base and config
     
-    # Get relevant documents from user's knowledge base (if retriever is available)
-    # Priority order: FAQ > Crawl > File Upload
-    context = ""
-    if user_retriever:
-        try:
-            # Use invoke() instead of get_relevant_documents() for LangChain 0.3.x
-            if hasattr(user_retriever, 'invoke'):
-                docs = user_retriever.invoke(message)
-            else:
-                # Fallback for older LangChain versions
-                docs = user_retriever.get_relevant_documents(message)
-            
-            # Apply priority ordering: FAQ > Crawl > File Upload
-            if docs:
-                # Separate by source type
-                # Note: Accept both 'crawl' and 'web_crawl' for backward compatibility
-                faq_docs = [d for d in docs if d.metadata.get('source_type') == 'faq']
-                crawl_docs = [d for d in docs if d.metadata.get('source_type') in ['crawl', 'web_crawl']]
-                file_docs = [d for d in docs if d.metadata.get('source_type') == 'file_upload']
-                other_docs = [d for d in docs if d.metadata.get('source_type') not in ['faq', 'crawl', 'web_crawl', 'file_upload']]
-                
-                # Phase 2: Improved prioritization for FILE documents
-                # Reorder: FAQ first, then crawl, then file, then others
-                prioritized_docs = faq_docs + crawl_docs + file_docs + other_docs
-                
-                # Phase 2: Ensure FILE documents are included if they exist
-                # If we have FILE documents but they're not in top 8, include at least one
-                if file_docs and len(prioritized_docs) > 8:
-                    top_docs = prioritized_docs[:7]
-                    # Check if any FILE docs are already in top 7
-                    has_file = any(d.metadata.get('source_type') == 'file_upload' for d in top_docs)
-                    if not has_file and file_docs:
-                        # Replace last doc with first FILE doc to ensure FILE content is included
-                        top_docs = top_docs[:6] + [file_docs[0]]
-                    prioritized_docs = top_docs
-                else:
-                    # Limit to top 8 for context (keep some for diversity)
-                    prioritized_docs = prioritized_docs[:8]
-                
-                context = "\n\n".join([doc.page_content for doc in prioritized_docs]) if prioritized_docs else ""
-                
-                # Log retrieval for debugging
-                print(f" Retrieved {len(docs)} documents, prioritized to {len(prioritized_docs)}")
-                print(f" Breakdown: FAQ={len(faq_docs)}, Crawl={len(crawl_docs)}, File={len(file_docs)}, Other={len(other_docs)}")
-                print(f" Top sources: {[doc.metadata.get('source_file', 'unknown')[:30] for doc in prioritized_docs[:3]]}")
-            else:
-                print(f"ℹ No relevant documents found in knowledge base for: {message[:50]}")
-        except Exception as e:
-            print(f" Error retrieving documents: {e}")
-            import traceback
-            traceback.print_exc()
-            context = ""
-    else:
-        print(f"ℹ No retriever available - using direct LLM response")
+    Args:
+        user_id: User ID for isolation
+        message: User's message
+        system_llm: System-level LLM (fallback if user config fails)
+        name: User's name (default: "User")
+        conversation_id: Optional conversation ID for maintaining context
+        history: Optional future of the messages before this turn (see begin_chat_turn())
+        timings: Optional StageTimings filled with per-stage durations
     
-    # Generate response
-    if hasattr(llm, 'invoke'):
-        try:
-            # Build system instructions
-            system_prompt = f"You are {bot_name}, an intelligent AI assistant."
-            if system_instructions:
-                system_prompt += f"\n\nAdditional Instructions: {system_instructions}"
-            
-            # Apply response style
-            response_style = user_config.get('response_style', 'balanced')
-            style_instructions = {
-                'concise': "Be brief and to the point. Keep responses under 100 words.",
-                'balanced': "Provide balanced, informative responses. Be helpful and clear.",
-                'detailed': "Provide comprehensive, detailed responses. Include examples when helpful.",
-                'creative': "Be creative and engaging. Use storytelling when appropriate."
-            }
-            if response_style in style_instructions:
-                system_prompt += f"\n\nResponse Style: {style_instructions[response_style]}"
-            
-            # Build conversation history context if conversation_id is provided
-            conversation_context = ""
-            if conversation_id:
-                conversation_context = build_conversation_context(conversation_id, max_messages=10)
-                if conversation_context:
-                    print(f" Using conversation history ({len(conversation_context)} chars)")
-            
-            # Build the full prompt with knowledge base context and conversation history
-            if context:
-                # Use RAG with context from knowledge base
-                base_prompt = prompt_template_text.format(context=context, question=message)
-                print(f" Using RAG with {len(context)} characters of context")
-            else:
-                # No context found - use LLM directly with user's bot name
-                base_prompt = f"User ({name}) asks: {message}"
-                print(f"ℹ No knowledge base context - using direct LLM response")
-            
-            # Combine system prompt, conversation history, and base prompt
-            full_prompt = system_prompt
-            
-            # Add conversation history if available with explicit instructions
-            if conversation_context:
-                full_prompt += f"\n\n--- CONVERSATION CONTEXT ---"
-                full_prompt += f"\nYou are having an ongoing conversation with the user. Below is the previous conversation history."
-                full_prompt += f"\nIMPORTANT: Use this context to understand references like 'their', 'it', 'that', 'they', etc."
-                full_prompt += f"\nIf the user says 'their phone number' and the previous conversation was about Person 1, they are referring to Person 1's phone number."
-                full_prompt += f"\n\nPrevious Conversation History:\n{conversation_context}"
-                full_prompt += f"\n--- END CONVERSATION CONTEXT ---\n"
-            
-            # Add user name instruction if name is provided (not default "User")
-            if name and name != "User":
-                full_prompt += f"\n\nIMPORTANT: The user's name is {name}. When appropriate, address them by name at the beginning of your response (e.g., '{name}, I can assist you...')."
-            
-            # Add knowledge base context and current question
-            full_prompt += f"\n{base_prompt}"
-            
-            # Add instructions for including contact information and links
-            full_prompt += f"\n\nCRITICAL INSTRUCTIONS:"
-            full_prompt += f"\n- Respond in plain text ONLY. NO HTML, NO code blocks."
-            full_prompt += f"\n- Be helpful and friendly."
-            full_prompt += f"\n- When the knowledge base contains contact information (phone numbers, email addresses, physical addresses, website URLs, booking links), ALWAYS include them in your response."
-            full_prompt += f"\n- If the user asks about reservations, bookings, or how to contact, provide the exact contact information from the knowledge base."
-            full_prompt += f"\n- Include website links, phone numbers, and email addresses when available in the context."
-            full_prompt += f"\n- Format contact information clearly (e.g., 'Phone: +1-555-1234', 'Email: info@example.com', 'Website: https://example.com')."
+    Returns:
+        tuple: (response_text, error_message)
+    """
+    timings = timings or new_chat_timings()
+    try:
+        stages = _TurnStages(user_id, message, name, conversation_id, history, timings)
+        cache_scope = _answer_cache_scope(user_id, message, stages)
+        cached = _get_cached_answer(user_id, cache_scope)
+        if cached is not None:
+            return format_chat_reply(cached), None
+        
+        llm, full_prompt = _prepare_chat(user_id, message, stages, timings, system_llm,
+                                         anonymous=cache_scope is not None)
+        if full_prompt is None:
+            # Mock LLM fallback
+            return f"Mock response for: {message}<br><br>What else would you like to know?", None
+        
+        # Generate response
+        reply = timings.timed('llm', llm.invoke, full_prompt)
+        reply = reply.content if hasattr(reply, 'content') else str(reply)
+        _store_cached_answer(user_id, cache_scope, reply)
+        return format_chat_reply(reply), None
+    except Exception as e:
+        print(f"LLM error: {e}")
+        import traceback
+        traceback.print_exc()
+        return f"I'm here to help! Could you please rephrase your question?<br><br>Error: {str(e)}", None
+    finally:
+        timings.finish()
+
+
+def stream_chatbot_response(user_id, message, system_llm=None, name="User", conversation_id=None,
+                            history=None, timings=None):
+    """Stream a chatbot response as the LLM generates it
+    
+    Args are the same as get_chatbot_response(). Run format_chat_reply() on the
+    joined chunks to get the text that get_chatbot_response() would have returned.
+    Streaming timings add 'first_token' (time from the LLM call to its first chunk).
+    
+    Yields:
+        str: raw text chunks (newlines not yet converted)
+    
+    Raises:
+        Exception: if the LLM fails after some chunks were already yielded
+    """
+    timings = timings or new_chat_timings()
+    streamed = False
+    try:
+        stages = _TurnStages(user_id, message, name, conversation_id, history, timings)
+        cache_scope = _answer_cache_scope(user_id, message, stages)
+        cached = _get_cached_answer(user_id, cache_scope)
+        if cached is not None:
+            yield cached
+            return
+        
+        llm, full_prompt = _prepare_chat(user_id, message, stages, timings, system_llm,
+                                         anonymous=cache_scope is not None)
+        if full_prompt is None:
+            # Mock LLM fallback
+            yield f"Mock response for: {message}\n\nWhat else would you like to know?"
+            return
+        
+        chunks = []
+        llm_started = time.perf_counter()
+        if hasattr(llm, 'stream'):
+            for chunk in llm.stream(full_prompt):
+                text = chunk.content if hasattr(chunk, 'content') else chunk
+                if text:
+                    if not streamed:
+                        timings.record('first_token', time.perf_counter() - llm_started)
+                    streamed = True
+                    chunks.append(str(text))
+                    yield str(text)
+        else:
             reply = llm.invoke(full_prompt)
-            
-            # Ensure reply is a string
-            if hasattr(reply, 'content'):
-                reply = reply.content
-            reply = str(reply).strip()
-            
-            # Clean up excessive newlines (more than 2 consecutive)
-            import re
-            reply = re.sub(r'\n{3,}', '\n\n', reply)
-            
-            # Convert newlines to <br> for HTML display
-            reply = reply.replace("\n", "<br>")
-            
-            return reply, None
-        except Exception as e:
-            print(f"LLM error: {e}")
-            import traceback
-            traceback.print_exc()
-            return f"I'm here to help! Could you please rephrase your question?<br><br>Error: {str(e)}", None
-    else:
-        # Mock LLM fallback
-        return f"Mock response for: {message}<br><br>What else would you like to know?", None
+            timings.record('first_token', time.perf_counter() - llm_started)
+            streamed = True
+            chunks.append(reply.content if hasattr(reply, 'content') else str(reply))
+            yield chunks[-1]
+        timings.record('llm', time.perf_counter() - llm_started)
+        # Only complete replies are cached (a disconnect closes the generator before this)
+        _store_cached_answer(user_id, cache_scope, "".join(chunks))
+    except Exception as e:
+        print(f"LLM stream error: {e}")
+        import traceback
+        traceback.print_exc()
+        if streamed:
+            raise
+        yield f"I'm here to help! Could you please rephrase your question?\n\nError: {str(e)}"
+    finally:
+        timings.finish()
+
+
+async def aget_chatbot_response(user_id, message, system_llm=None, name="User", conversation_id=None,
+                                history=None, timings=None):
+    """Async get_chatbot_response() for the ASGI chat path (same args and return value)
+    
+    The turn's lookups run on the stage pool as usual, but the LLM is awaited with
+    ainvoke(), so no thread is held for the LLM round-trip.
+    """
+    timings = timings or new_chat_timings()
+    loop = asyncio.get_running_loop()
+    try:
+        stages = _TurnStages(user_id, message, name, conversation_id, history, timings)
+        await stages.wait()
+        cache_scope = await loop.run_in_executor(None, _answer_cache_scope, user_id, message, stages)
+        cached = _get_cached_answer(user_id, cache_scope)
+        if cached is not None:
+            return format_chat_reply(cached), None
+        
+        llm, full_prompt = await loop.run_in_executor(None, _prepare_chat, user_id, message, stages, timings,
+                                                      system_llm, cache_scope is not None)
+        if full_prompt is None:
+            # Mock LLM fallback
+            return f"Mock response for: {message}<br><br>What else would you like to know?", None
+        
+        # Generate response
+        llm_started = time.perf_counter()
+        if hasattr(llm, 'ainvoke'):
+            reply = await llm.ainvoke(full_prompt)
+        else:
+            reply = await loop.run_in_executor(None, llm.invoke, full_prompt)
+        timings.record('llm', time.perf_counter() - llm_started)
+        reply = reply.content if hasattr(reply, 'content') else str(reply)
+        _store_cached_answer(user_id, cache_scope, reply)
+        return format_chat_reply(reply), None
+    except Exception as e:
+        print(f"LLM error: {e}")
+        import traceback
+        traceback.print_exc()
+        return f"I'm here to help! Could you please rephrase your question?<br><br>Error: {str(e)}", None
+    finally:
+        timings.finish()
 
+
+async def astream_chatbot_response(user_id, message, system_llm=None, name="User", conversation_id=None,
+                                   history=None, timings=None):
+    """Async stream_chatbot_response() for the ASGI chat path (same args, yields and errors)"""
+    timings = timings or new_chat_timings()
+    loop = asyncio.get_running_loop()
+    streamed = False
+    try:
+        stages = _TurnStages(user_id, message, name, conversation_id, history, timings)
+        await stages.wait()
+        cache_scope = await loop.run_in_executor(None, _answer_cache_scope, user_id, message, stages)
+        cached = _get_cached_answer(user_id, cache_scope)
+        if cached is not None:
+            yield cached
+            return
+        
+        llm, full_prompt = await loop.run_in_executor(None, _prepare_chat, user_id, message, stages, timings,
+                                                      system_llm, cache_scope is not None)
+        if full_prompt is None:
+            # Mock LLM fallback
+            yield f"Mock response for: {message}\n\nWhat else would you like to know?"
+            return
+        
+        chunks = []
+        llm_started = time.perf_counter()
+        if hasattr(llm, 'astream'):
+            async for chunk in llm.astream(full_prompt):
+                text = chunk.content if hasattr(chunk, 'content') else chunk
+                if text:
+                    if not streamed:
+                        timings.record('first_token', time.perf_counter() - llm_started)
+                    streamed = True
+                    chunks.append(str(text))
+                    yield str(text)
+        else:
+            reply = await loop.run_in_executor(None, llm.invoke, full_prompt)
+            timings.record('first_token', time.perf_counter() - llm_started)
+            streamed = True
+            chunks.append(reply.content if hasattr(reply, 'content') else str(reply))
+            yield chunks[-1]
+        timings.record('llm', time.perf_counter() - llm_started)
+        # Only complete replies are cached (a disconnect closes the generator before this)
+        _store_cached_answer(user_id, cache_scope, "".join(chunks))
+    except Exception as e:
+        print(f"LLM stream error: {e}")
+        import traceback
+        traceback.print_exc()
+        if streamed:
+            raise
+        yield f"I'm here to help! Could you please rephrase your question?\n\nError: {str(e)}"
+    finally:
+        timings.finish()
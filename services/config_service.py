@@ -1,18 +1,119 @@
-"""User chatbot configuration service"""
+"""User chatbot configuration service
+
+A tenant's chatbot config (config/user_<id>/chatbot_config.json) and widget
+appearance (chatbot_appearance row) are read on every chat turn and widget load,
+so both are cached in-process. A cached entry is revalidated at most every
+CONFIG_CACHE_CHECK_INTERVAL seconds by stat()ing a file: the config file itself,
+and for the appearance an appearance_version file that is replaced whenever it is
+saved. Saves in this process invalidate immediately; other worker processes see
+the change on their next revalidation. Entries are also reloaded after
+CONFIG_CACHE_TTL seconds, which bounds how long a failed read or an edit made
+outside the app (e.g. directly in the database) can be served.
+"""
 import os
 import json
+import copy
+import threading
+import time
+from collections import OrderedDict
 from utils.prompts import get_default_prompt_with_name
 
 
+CONFIG_CACHE_SIZE = int(os.getenv('CONFIG_CACHE_SIZE', 1024))                      # tenants kept per cache
+CONFIG_CACHE_CHECK_INTERVAL = float(os.getenv('CONFIG_CACHE_CHECK_INTERVAL', 1))  # seconds between stat() checks
+CONFIG_CACHE_TTL = float(os.getenv('CONFIG_CACHE_TTL', 300))                       # seconds before an entry is reloaded
+
+_config_dirs = set()  # user_ids whose config directory exists
+_config_dirs_lock = threading.Lock()
+
+
+class _FileVersionedCache:
+    """LRU of user_id -> value, reloaded when the user's version file changes"""
+
+    def __init__(self, path_fn, load_fn):
+        self._path_fn = path_fn
+        self._load_fn = load_fn
+        self._entries = OrderedDict()  # user_id -> (value, file signature, checked_at, loaded_at)
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'revalidations': 0, 'loads': 0}
+
+    def get(self, user_id):
+        return self.get_versioned(user_id)[0]
+
+    def get_versioned(self, user_id):
+        """(value, signature of the version file it was loaded from)"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and now - entry[2] < CONFIG_CACHE_CHECK_INTERVAL:
+                self._entries.move_to_end(user_id)
+                self._stats['hits'] += 1
+                return entry[0], entry[1]
+
+        # Take the signature before loading: a change during the load is picked up next time
+        signature = _file_signature(self._path_fn(user_id))
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[1] == signature and now - entry[3] < CONFIG_CACHE_TTL:
+                self._entries[user_id] = (entry[0], signature, now, entry[3])
+                self._entries.move_to_end(user_id)
+                self._stats['revalidations'] += 1
+                return entry[0], entry[1]
+            self._stats['loads'] += 1
+
+        value = self._load_fn(user_id)
+        with self._lock:
+            self._entries[user_id] = (value, signature, now, now)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > CONFIG_CACHE_SIZE:
+                self._entries.popitem(last=False)
+        return value, signature
+
+    def invalidate(self, user_id=None):
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+    def get_stats(self):
+        with self._lock:
+            return {'size': len(self._entries), 'max_size': CONFIG_CACHE_SIZE, **self._stats}
+
+
+def _file_signature(path):
+    """(mtime, size, inode) of a file, or None if it does not exist"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def _write_file_atomic(path, write):
+    """Write a file via a temp file and rename, so readers never see a partial file"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w') as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
 def get_user_chatbot_config_path(user_id):
     """Get path to user's chatbot config file"""
     config_dir = f"./config/user_{user_id}"
-    os.makedirs(config_dir, exist_ok=True)
+    if user_id not in _config_dirs:
+        os.makedirs(config_dir, exist_ok=True)
+        with _config_dirs_lock:
+            _config_dirs.add(user_id)
     return f"{config_dir}/chatbot_config.json"
 
 
-def load_user_chatbot_config(user_id):
-    """Load user's chatbot configuration"""
+def _appearance_version_path(user_id):
+    return os.path.join(os.path.dirname(get_user_chatbot_config_path(user_id)), 'appearance_version')
+
+
+def _read_user_chatbot_config(user_id):
     config_path = get_user_chatbot_config_path(user_id)
     default_config = {
         'bot_name': 'Cortex',
@@ -28,12 +129,13 @@ def load_user_chatbot_config(user_id):
         'presence_penalty': 0.0,  # -2.0 to 2.0, encourages new topics
         'response_style': 'balanced',  # concise, balanced, detailed, creative
         'system_instructions': '',  # Additional context for the LLM
+        'answer_cache_enabled': False,  # Reuse answers for repeated standalone questions
         # LLM Provider settings
         'llm_provider': 'openai',  # openai, claude, gemini, deepseek, groq, together
         'llm_model': 'gpt-4o-mini',  # Provider-specific model
         'llm_api_key': None  # User's API key for selected provider (optional, uses system key if not provided)
     }
-    
+
     if os.path.exists(config_path):
         try:
             with open(config_path, 'r') as f:
@@ -42,18 +144,85 @@ def load_user_chatbot_config(user_id):
                 default_config.update(user_config)
         except Exception as e:
             print(f"Error loading user config: {e}")
-    
+
     return default_config
 
 
+def _read_user_appearance(user_id):
+    from models.chatbot_appearance import ChatbotAppearance
+    appearance = ChatbotAppearance.get_by_user(user_id)
+    return ChatbotAppearance.to_dict(appearance) if appearance else None
+
+
+_config_cache = _FileVersionedCache(get_user_chatbot_config_path, _read_user_chatbot_config)
+_appearance_cache = _FileVersionedCache(_appearance_version_path, _read_user_appearance)
+
+
+def load_user_chatbot_config(user_id):
+    """Load user's chatbot configuration (a copy the caller may modify)"""
+    return copy.deepcopy(_config_cache.get(user_id))
+
+
 def save_user_chatbot_config_file(user_id, config):
     """Save user's chatbot configuration to file"""
     config_path = get_user_chatbot_config_path(user_id)
     try:
-        with open(config_path, 'w') as f:
-            json.dump(config, f, indent=2)
+        _write_file_atomic(config_path, lambda f: json.dump(config, f, indent=2))
         return True
     except Exception as e:
         print(f"Error saving user config: {e}")
         return False
+    finally:
+        _config_cache.invalidate(user_id)
+
+
+def get_user_appearance(user_id):
+    """Get user's widget appearance (ChatbotAppearance.to_dict of their row, or None)"""
+    return copy.deepcopy(_appearance_cache.get(user_id))
+
 
+def invalidate_user_appearance(user_id):
+    """Mark the user's appearance as changed (call after saving chatbot_appearance)
+
+    Replaces the appearance_version file so other worker processes reload it too.
+    """
+    try:
+        _write_file_atomic(_appearance_version_path(user_id), lambda f: f.write(f"{time.time_ns()}-{os.getpid()}"))
+    except OSError as e:
+        print(f"⚠️ Could not update appearance version for user {user_id}: {e}")
+    _appearance_cache.invalidate(user_id)
+
+
+def get_user_config_version(user_id):
+    """Get a version of the user's config and appearance, for HTTP validators
+
+    Derived from the version files, so every worker process computes the same one.
+
+    Returns:
+        tuple: (version string, last modified epoch seconds or None if never saved)
+    """
+    config_signature = _config_cache.get_versioned(user_id)[1]
+    appearance_signature = _appearance_cache.get_versioned(user_id)[1]
+    mtimes = [sig[0] for sig in (config_signature, appearance_signature) if sig]
+    last_modified = max(mtimes) / 1e9 if mtimes else None
+    return f"{config_signature}/{appearance_signature}", last_modified
+
+
+def invalidate_user_config_cache(user_id=None):
+    """Forget cached config and appearance (one user, or everyone if none given)"""
+    _config_cache.invalidate(user_id)
+    _appearance_cache.invalidate(user_id)
+    with _config_dirs_lock:
+        if user_id is None:
+            _config_dirs.clear()
+        else:
+            _config_dirs.discard(user_id)
+
+
+def get_config_cache_stats():
+    """Get chatbot config and appearance cache statistics"""
+    return {
+        'check_interval_s': CONFIG_CACHE_CHECK_INTERVAL,
+        'chatbot_config': _config_cache.get_stats(),
+        'appearance': _appearance_cache.get_stats()
+    }
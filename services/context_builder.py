@@ -0,0 +1,168 @@
+"""Token-budgeted knowledge base context for chat prompts
+
+Retrieved chunks are packed into the prompt by relevance until the model's context
+budget is spent, instead of always concatenating a fixed number of chunks:
+
+- exact duplicates and chunks contained in an already selected passage are dropped
+- chunks from the same source_file that overlap (RecursiveCharacterTextSplitter
+  repeats up to chunk_overlap characters between neighbours) are merged into one
+  passage, so the overlap is only paid for once
+- a chunk that does not fit the remaining budget is skipped and smaller, less
+  relevant ones may still fill the gap
+
+Selected passages are emitted FAQ first, then crawled pages, then files, matching
+the priority the prompt has always presented knowledge in.
+"""
+import os
+
+
+# Tokens of knowledge base context per model family (first name fragment found wins).
+# Only bounds retrieved context - history, instructions and the reply need room too.
+MODEL_CONTEXT_BUDGETS = (
+    ('gpt-4o', 3000),
+    ('gpt-4.1', 3000),
+    ('gpt-4-turbo', 3000),
+    ('gpt-4', 1500),
+    ('gpt-3.5', 1500),
+    ('claude', 4000),
+    ('gemini', 4000),
+    ('deepseek', 3000),
+    ('llama', 2000),
+    ('mixtral', 2000),
+    ('gemma', 1500)
+)
+DEFAULT_CONTEXT_TOKEN_BUDGET = 2500
+CONTEXT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', 0))  # > 0 overrides every model
+
+_MIN_OVERLAP_CHARS = 20
+_MAX_OVERLAP_CHARS = 400
+_SOURCE_PRIORITY = {'faq': 0, 'crawl': 1, 'web_crawl': 1, 'file_upload': 2}
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding('cl100k_base')
+except Exception:
+    _encoding = None
+
+
+def count_tokens(text):
+    """Count tokens with tiktoken when available, else estimate ~4 characters per token"""
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+def context_token_budget(llm_model=None):
+    """Knowledge base context budget in tokens for a model name"""
+    if CONTEXT_TOKEN_BUDGET > 0:
+        return CONTEXT_TOKEN_BUDGET
+    model = (llm_model or '').lower()
+    for fragment, budget in MODEL_CONTEXT_BUDGETS:
+        if fragment in model:
+            return budget
+    return DEFAULT_CONTEXT_TOKEN_BUDGET
+
+
+def _overlap(head, tail):
+    """Length of the longest suffix of head that is a prefix of tail (0 if too short)"""
+    limit = min(len(head), len(tail), _MAX_OVERLAP_CHARS)
+    if limit < _MIN_OVERLAP_CHARS:
+        return 0
+    probe = tail[:_MIN_OVERLAP_CHARS]
+    start = head.find(probe, len(head) - limit)
+    while start != -1:
+        size = len(head) - start
+        if tail.startswith(head[start:]):
+            return size
+        start = head.find(probe, start + 1)
+    return 0
+
+
+class _Passage:
+    __slots__ = ('source_file', 'source_type', 'text', 'rank')
+
+    def __init__(self, doc, rank):
+        self.source_file = doc.metadata.get('source_file')
+        self.source_type = doc.metadata.get('source_type')
+        self.text = doc.page_content.strip()
+        self.rank = rank
+
+
+def _extend_passage(passage, text):
+    """Try to merge text into passage; returns (merged_text, added_text) or None"""
+    if text in passage.text:
+        return passage.text, ''
+    if passage.text in text:
+        return text, text
+    size = _overlap(passage.text, text)
+    if size:
+        return passage.text + text[size:], text[size:]
+    size = _overlap(text, passage.text)
+    if size:
+        return text[:-size] + passage.text, text[:-size]
+    return None
+
+
+def build_context(docs, budget):
+    """Pack retrieved documents into a context string within a token budget
+
+    Args:
+        docs: Retrieved LangChain Documents, most relevant first
+        budget: Maximum tokens of context
+
+    Returns:
+        tuple: (context string, stats dict with tokens_used, budget, chunk and passage counts)
+    """
+    passages = []
+    seen = set()
+    used = 0
+    stats = {'budget': budget, 'chunks_in': len(docs), 'chunks_used': 0,
+             'duplicates': 0, 'merged': 0, 'skipped_over_budget': 0}
+
+    for rank, doc in enumerate(docs):
+        text = (doc.page_content or '').strip()
+        if not text or text in seen:
+            stats['duplicates'] += 1
+            continue
+        seen.add(text)
+
+        merged = False
+        for passage in passages:
+            if passage.source_file is None or passage.source_file != doc.metadata.get('source_file'):
+                continue
+            extension = _extend_passage(passage, text)
+            if extension is None:
+                continue
+            merged_text, added_text = extension
+            if not added_text.strip():
+                stats['duplicates'] += 1
+                merged = True
+                break
+            # Merging into the same passage costs only the new text
+            cost = count_tokens(merged_text) - count_tokens(passage.text)
+            if used + cost > budget:
+                stats['skipped_over_budget'] += 1
+            else:
+                passage.text = merged_text
+                used += cost
+                stats['chunks_used'] += 1
+                stats['merged'] += 1
+            merged = True
+            break
+        if merged:
+            continue
+
+        cost = count_tokens(text) + 1  # + separator
+        if used + cost > budget:
+            stats['skipped_over_budget'] += 1
+            continue
+        passages.append(_Passage(doc, rank))
+        used += cost
+        stats['chunks_used'] += 1
+
+    passages.sort(key=lambda p: (_SOURCE_PRIORITY.get(p.source_type, 3), p.rank))
+    stats['passages'] = len(passages)
+    stats['tokens_used'] = used
+    return "\n\n".join(p.text for p in passages), stats
@@ -0,0 +1,221 @@
+"""Conversation memory - a running summary plus the latest turns, under a token budget
+
+A chat prompt used to carry the conversation's last 20 messages verbatim, so
+prompts grew with the session and older context was cut off abruptly. The
+history in a prompt is now:
+
+- a running summary of the messages before the last MEMORY_RECENT_MESSAGES,
+  kept in the conversation's metadata under 'memory' (the summary, how many
+  messages it covers and the (created_at, id) of the last of them), then
+- the messages it does not cover, verbatim, newest first until
+  MEMORY_TOKEN_BUDGET (summary included) is used up.
+
+After each turn a background job folds the messages that have aged out of the
+verbatim window into the summary, once MEMORY_SUMMARIZE_BATCH of them are
+waiting, with one call to the tenant's LLM. Recalling the memory costs no query:
+the summary comes with the Conversation row each turn loads anyway, and the
+messages with the history window (conversation_service.get_history_window()).
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from models.conversation import Conversation
+from models.message import Message
+from services.config_service import load_user_chatbot_config
+from services.context_builder import count_tokens
+from services.conversation_service import (
+    HistoryMessage, SUMMARY_ROLE, clean_message_text, count_unsaved_messages, get_history_window
+)
+from services.llm_service import LLMProvider
+
+
+CONVERSATION_MEMORY = os.getenv('CONVERSATION_MEMORY', 'true').lower() == 'true'
+MEMORY_TOKEN_BUDGET = int(os.getenv('MEMORY_TOKEN_BUDGET', 1200))         # summary + verbatim turns
+MEMORY_SUMMARY_TOKENS = int(os.getenv('MEMORY_SUMMARY_TOKENS', 300))      # length of the summary
+MEMORY_RECENT_MESSAGES = int(os.getenv('MEMORY_RECENT_MESSAGES', 6))      # always kept verbatim
+MEMORY_SUMMARIZE_BATCH = int(os.getenv('MEMORY_SUMMARIZE_BATCH', 4))      # aged-out messages per summary update
+MEMORY_SUMMARIZE_MAX = 40                                                 # messages folded in per LLM call
+
+SUMMARY_PROMPT = """You maintain a running summary of a chat between a website visitor and {bot_name}, an AI assistant.
+
+Current summary (empty at the start):
+{summary}
+
+New messages to add to it:
+{transcript}
+
+Write the updated summary as plain text, at most {words} words. Keep what later messages may refer back to: the visitor's name and the details they shared, what they asked for, the products, places or people discussed, facts and contact details the assistant gave, and anything still unresolved. Leave out greetings and small talk. Do not add anything that is not in the messages."""
+
+_memory_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('MEMORY_WORKERS', 2)),
+    thread_name_prefix="conversation-memory"
+)
+_running = set()   # conversation ids with an update in progress
+_rerun = set()     # ... and a turn that finished while it ran
+_lock = threading.Lock()
+_stats = {'summaries': 0, 'messages_summarized': 0, 'failures': 0, 'conflicts': 0}
+
+
+def recall(conversation, limit=20):
+    """History for a turn's prompt: the summary (if any), then the latest messages
+
+    Args:
+        conversation: The turn's Conversation
+        limit: Maximum number of verbatim messages
+
+    Returns:
+        list: HistoryMessage tuples, oldest first - a leading SUMMARY_ROLE entry
+        holds the summary
+    """
+    history = get_history_window(conversation.id, limit, conversation.message_count)
+    if not CONVERSATION_MEMORY:
+        return history
+
+    memory = (conversation.metadata or {}).get('memory') or {}
+    summary = memory.get('summary')
+    if summary:
+        # Only the messages the summary does not cover yet
+        unsummarized = max((conversation.message_count or 0) - memory.get('summarized', 0), 0)
+        unsummarized += count_unsaved_messages(conversation.id)
+        history = history[-unsummarized:] if unsummarized else []
+    return _fit_budget(summary, history)
+
+
+def _fit_budget(summary, history):
+    """Drop the oldest messages until summary and messages fit MEMORY_TOKEN_BUDGET (the last two always stay)"""
+    budget = MEMORY_TOKEN_BUDGET - count_tokens(summary)
+    kept = len(history)
+    used = 0
+    for i in range(len(history) - 1, -1, -1):
+        used += count_tokens(history[i].content)
+        if used > budget and len(history) - i > 2:
+            break
+        kept = len(history) - i
+    recent = history[len(history) - kept:] if kept else []
+    return ([HistoryMessage(SUMMARY_ROLE, summary)] if summary else []) + recent
+
+
+def update_memory_async(conversation_id):
+    """Fold messages that aged out of the verbatim window into the summary, in the background
+
+    Call after a turn was saved. Does nothing until MEMORY_SUMMARIZE_BATCH
+    messages are waiting.
+    """
+    if not CONVERSATION_MEMORY:
+        return
+    with _lock:
+        if conversation_id in _running:
+            _rerun.add(conversation_id)
+            return
+        _running.add(conversation_id)
+    _memory_executor.submit(_run_update, conversation_id)
+
+
+def _run_update(conversation_id):
+    while True:
+        try:
+            _update_memory(conversation_id)
+        except Exception as e:
+            import traceback
+            print(f"⚠️ Could not update memory of conversation {conversation_id}: {e}")
+            traceback.print_exc()
+            with _lock:
+                _stats['failures'] += 1
+        with _lock:
+            if conversation_id not in _rerun:
+                _running.discard(conversation_id)
+                return
+            _rerun.discard(conversation_id)
+
+
+def _update_memory(conversation_id):
+    conversation = Conversation.get_by_id(conversation_id)
+    if not conversation:
+        return
+    memory = (conversation.metadata or {}).get('memory') or {}
+    summary = memory.get('summary') or ""
+    summarized = memory.get('summarized', 0)
+    last = memory.get('last')  # (created_at, id) of the last summarized message
+
+    while (conversation.message_count or 0) - MEMORY_RECENT_MESSAGES - summarized >= MEMORY_SUMMARIZE_BATCH:
+        aged_out = conversation.message_count - MEMORY_RECENT_MESSAGES - summarized
+        limit = min(aged_out, MEMORY_SUMMARIZE_MAX)
+        if last:
+            messages = Message.get_conversation_messages(conversation_id, limit=limit, after=tuple(last))
+        else:
+            # Summaries written before the marker existed are located by position once
+            messages = Message.get_conversation_messages(conversation_id, limit=limit, offset=summarized)
+        if not messages:
+            return
+        summary = _summarize(conversation.user_id, summary, messages)
+        if not summary:
+            return
+
+        expected = summarized
+        summarized += len(messages)
+        last = [str(messages[-1].created_at), messages[-1].id]
+        written = Conversation.merge_metadata(
+            conversation_id,
+            'memory',
+            {'summary': summary, 'summarized': summarized, 'last': last,
+             'updated_at': datetime.now().isoformat()},
+            only_if=lambda current: (current or {}).get('summarized', 0) == expected
+        )
+        with _lock:
+            if not written:
+                # Another process got there first (or the conversation is gone)
+                _stats['conflicts'] += 1
+                return
+            _stats['summaries'] += 1
+            _stats['messages_summarized'] += len(messages)
+        print(f"🧠 Conversation {conversation_id}: summary now covers {summarized} message(s)")
+
+
+def _summarize(user_id, summary, messages):
+    """One LLM call folding messages into the summary
+
+    Returns:
+        str: The new summary, or None if the LLM is unavailable
+    """
+    user_config = load_user_chatbot_config(user_id)
+    max_tokens = MEMORY_SUMMARY_TOKENS * 2
+    try:
+        llm = LLMProvider.get_cached_llm(
+            provider=user_config.get('llm_provider', 'openai'),
+            model=user_config.get('llm_model', 'gpt-4o-mini'),
+            api_key=user_config.get('llm_api_key'),
+            temperature=0.0,
+            max_tokens=max_tokens
+        )
+    except Exception as e:
+        print(f"⚠️ Summarizing with the system LLM, user LLM unavailable: {e}")
+        llm = LLMProvider.get_default_llm(temperature=0.0, max_tokens=max_tokens)
+    if not hasattr(llm, 'invoke'):
+        return None
+
+    speakers = {'user': 'Visitor', 'assistant': 'Assistant'}
+    transcript = "\n".join(
+        f"{speakers.get(m.role, m.role)}: {clean_message_text(m.content)}" for m in messages
+    )
+    prompt = SUMMARY_PROMPT.format(
+        bot_name=user_config.get('bot_name', 'Cortex'),
+        summary=summary or "(none)",
+        transcript=transcript,
+        words=MEMORY_SUMMARY_TOKENS * 3 // 4
+    )
+    response = llm.invoke(prompt)
+    text = response.content if hasattr(response, 'content') else str(response)
+    return text.strip() or None
+
+
+def get_memory_stats():
+    """Get conversation summary statistics for monitoring"""
+    with _lock:
+        return {
+            'enabled': CONVERSATION_MEMORY,
+            'token_budget': MEMORY_TOKEN_BUDGET,
+            'running': len(_running),
+            **_stats
+        }
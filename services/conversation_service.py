@@ -1,11 +1,64 @@
 """
 Conversation Service - manages conversation lifecycle and history
 """
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
 from models.conversation import Conversation
 from models.message import Message
+from services.transcript_buffer import TRANSCRIPT_WRITE_BEHIND, transcript_buffer
+from utils.helpers import encode_cursor, decode_cursor
+import os
+import re
+import threading
+import time
 import uuid
 
 
+# Background pool for message writes that should not hold up a chat reply
+_write_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('CONVERSATION_WRITE_WORKERS', 4)),
+    thread_name_prefix="conversation-write"
+)
+
+# Session cache: the last messages of active conversations, already cleaned for the prompt
+HISTORY_CACHE_SIZE = int(os.getenv('HISTORY_CACHE_SIZE', 2048))          # conversations
+HISTORY_CACHE_MESSAGES = int(os.getenv('HISTORY_CACHE_MESSAGES', 20))    # messages kept per conversation
+HISTORY_CACHE_TTL = float(os.getenv('HISTORY_CACHE_TTL', 900))           # seconds since the last update
+
+# A message as it goes into the LLM prompt (content already cleaned)
+HistoryMessage = namedtuple('HistoryMessage', ['role', 'content'])
+# Role of a leading HistoryMessage that summarizes older turns (services/conversation_memory.py)
+SUMMARY_ROLE = 'summary'
+
+_HTML_TAG = re.compile(r'<[^>]+>')
+_BOLD = re.compile(r'\*\*([^*]+)\*\*')
+_ITALIC = re.compile(r'\*([^*]+)\*')
+_BLANK_LINES = re.compile(r'\n{3,}')
+_SPACES = re.compile(r'[ \t]+')
+
+
+class _HistoryWindow:
+    """Cached tail of one conversation (messages is None while it is being read)"""
+    
+    __slots__ = ('messages', 'count', 'updated_at', 'dirty')
+    
+    def __init__(self):
+        self.messages = None
+        self.count = 0          # the conversation's message_count these messages reflect
+        self.updated_at = 0.0
+        self.dirty = False      # messages were added while it was being read
+    
+    def fill(self, messages, count, now):
+        self.messages = deque(messages, maxlen=HISTORY_CACHE_MESSAGES)
+        self.count = count
+        self.updated_at = now
+
+
+_history_windows = OrderedDict()  # conversation_id -> _HistoryWindow
+_history_lock = threading.Lock()
+_history_stats = {'hits': 0, 'loads': 0, 'stale': 0, 'expired': 0}
+
+
 def generate_session_id():
     """Generate a unique session ID"""
     return str(uuid.uuid4())
@@ -61,6 +114,40 @@ def get_or_create_conversation(user_id, session_id=None, conversation_id=None):
     return create_conversation(user_id, session_id), True
 
 
+def _title_from(content):
+    """Conversation title from its first user message (first 50 chars)"""
+    title = content[:50].strip()
+    if len(content) > 50:
+        title += "..."
+    return title
+
+
+def _entries_and_title(messages):
+    """(role, content, metadata) entries, and the title their first user message gives"""
+    entries = [(m[0], m[1], m[2] if len(m) > 2 else None) for m in messages]
+    title = next((_title_from(content) for role, content, _ in entries if role == 'user'), None)
+    return entries, title
+
+
+def add_messages(conversation_id, messages):
+    """Add messages to a conversation in one transaction
+    
+    The conversation's message count and timestamp are updated in the same
+    transaction, and its title is set from the first user message if it has none.
+    
+    Args:
+        conversation_id: Conversation ID
+        messages: List of (role, content) or (role, content, metadata) tuples, in order
+    
+    Returns:
+        list: Message objects (empty if nothing was saved)
+    """
+    entries, title = _entries_and_title(messages)
+    saved = Message.append_to_conversation(conversation_id, entries, title=title)
+    _remember_messages(conversation_id, saved)
+    return saved
+
+
 def add_message(conversation_id, role, content, metadata=None):
     """Add a message to a conversation
     
@@ -73,23 +160,57 @@ def add_message(conversation_id, role, content, metadata=None):
     Returns:
         Message object or None
     """
-    message = Message.create(conversation_id, role, content, metadata)
+    saved = add_messages(conversation_id, [(role, content, metadata)])
+    return saved[0] if saved else None
+
+
+def _queue_messages(conversation_id, messages):
+    """Hand messages to the write-behind buffer (TRANSCRIPT_WRITE_BEHIND=true)"""
+    entries, title = _entries_and_title(messages)
+    queued = transcript_buffer.append(conversation_id, entries, title=title)
+    _remember_messages(conversation_id, queued)
+    return queued
+
+
+def _save_after(conversation_id, messages, after):
+    if after is not None:
+        try:
+            after.result()
+        except Exception:
+            pass
+    if TRANSCRIPT_WRITE_BEHIND:
+        return _queue_messages(conversation_id, messages)
+    saved = add_messages(conversation_id, messages)
+    if not saved:
+        roles = "/".join(m[0] for m in messages)
+        print(f"⚠️ Warning: Failed to save {roles} message(s) for conversation {conversation_id}")
+    return saved
+
+
+def add_messages_async(conversation_id, messages, after=None):
+    """Add messages to a conversation (see add_messages()) on a background thread
     
-    # Update conversation message count and timestamp
-    if message:
-        conversation = Conversation.get_by_id(conversation_id)
-        if conversation:
-            conversation.increment_message_count()
-            
-            # Auto-generate title from first user message if not set
-            if not conversation.title and role == 'user':
-                # Use first 50 chars of message as title
-                title = content[:50].strip()
-                if len(content) > 50:
-                    title += "..."
-                conversation.update_title(title)
+    With TRANSCRIPT_WRITE_BEHIND=true the messages are queued for a batched write
+    instead (services/transcript_buffer.py) and the returned Messages have no id.
     
-    return message
+    Args:
+        conversation_id: Conversation ID
+        messages: List of (role, content) or (role, content, metadata) tuples, in order
+        after: Optional future to wait for before writing (e.g. a history snapshot
+            that must not include these messages)
+    
+    Returns:
+        Future resolving to the list of saved Message objects
+    """
+    if TRANSCRIPT_WRITE_BEHIND and after is None:
+        # Queueing is quick: no need for a thread hop
+        future = Future()
+        try:
+            future.set_result(_queue_messages(conversation_id, messages))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+    return _write_executor.submit(_save_after, conversation_id, messages, after)
 
 
 def get_conversation_history(conversation_id, limit=20):
@@ -102,41 +223,155 @@ def get_conversation_history(conversation_id, limit=20):
     Returns:
         list: List of Message objects (chronological order)
     """
+    if TRANSCRIPT_WRITE_BEHIND:
+        # Include this process's messages that are not flushed yet
+        return transcript_buffer.read_through(
+            conversation_id, limit, lambda n: Message.get_recent_messages(conversation_id, n))
     return Message.get_recent_messages(conversation_id, limit)
 
 
-def build_conversation_context(conversation_id, max_messages=10):
+def build_conversation_context(conversation_id, max_messages=10, message_count=None):
     """Build conversation context string for LLM prompt
     
     Args:
         conversation_id: Conversation ID
         max_messages: Maximum number of message pairs to include
+        message_count: The conversation's message_count, if the caller has read it
     
     Returns:
         str: Formatted conversation context
     """
-    import re
-    
-    def clean_html_tags(text):
-        """Remove HTML tags from text and clean up formatting"""
-        if not text:
-            return ""
-        # Replace <br> tags with newlines
-        text = text.replace('<br>', '\n').replace('<br/>', '\n').replace('<br />', '\n')
-        # Remove other HTML tags
-        text = re.sub(r'<[^>]+>', '', text)
-        # Remove markdown bold/italic markers (keep content)
-        text = re.sub(r'\*\*([^*]+)\*\*', r'\1', text)  # Remove **bold**
-        text = re.sub(r'\*([^*]+)\*', r'\1', text)  # Remove *italic*
-        # Clean up multiple newlines
-        text = re.sub(r'\n{3,}', '\n\n', text)
-        # Clean up whitespace
-        text = re.sub(r'[ \t]+', ' ', text)
-        return text.strip()
-    
-    messages = get_conversation_history(conversation_id, limit=max_messages * 2)
+    return format_history(get_history_window(conversation_id, max_messages * 2, message_count))
+
+
+def clean_message_text(text):
+    """Remove HTML tags and markdown emphasis from a message for the LLM prompt"""
+    if not text:
+        return ""
+    # Replace <br> tags with newlines
+    text = text.replace('<br>', '\n').replace('<br/>', '\n').replace('<br />', '\n')
+    # Remove other HTML tags
+    text = _HTML_TAG.sub('', text)
+    # Remove markdown bold/italic markers (keep content)
+    text = _BOLD.sub(r'\1', text)
+    text = _ITALIC.sub(r'\1', text)
+    # Clean up multiple newlines
+    text = _BLANK_LINES.sub('\n\n', text)
+    # Clean up whitespace
+    text = _SPACES.sub(' ', text)
+    return text.strip()
+
+
+def to_history(messages):
+    """Cleaned HistoryMessages for Message objects (oldest first)"""
+    return [HistoryMessage(m.role, clean_message_text(m.content)) for m in messages]
+
+
+def get_history_window(conversation_id, limit=20, message_count=None):
+    """Recent messages of a conversation, cleaned for the LLM prompt
+    
+    Served from the session cache while it is current; otherwise read from the
+    database (see get_conversation_history()) and cached. The cache is updated as
+    messages are added in this process. A message_count higher than the cache has
+    seen means another process added messages, and the window is read again.
     
+    Args:
+        conversation_id: Conversation ID
+        limit: Maximum number of messages to return
+        message_count: The conversation's message_count as just read, if known
+    
+    Returns:
+        list: HistoryMessage tuples (chronological order)
+    """
+    if limit > HISTORY_CACHE_MESSAGES:
+        return to_history(get_conversation_history(conversation_id, limit=limit))
+    
+    now = time.monotonic()
+    with _history_lock:
+        window = _history_windows.get(conversation_id)
+        if window is not None and window.messages is not None:
+            if now - window.updated_at >= HISTORY_CACHE_TTL:
+                _history_stats['expired'] += 1
+            elif message_count is not None and message_count > window.count:
+                _history_stats['stale'] += 1
+            else:
+                _history_windows.move_to_end(conversation_id)
+                _history_stats['hits'] += 1
+                return list(window.messages)[-limit:]
+        # Messages added while the window is read make it incomplete (see _remember_messages())
+        window = _HistoryWindow()
+        _history_windows[conversation_id] = window
+        _history_windows.move_to_end(conversation_id)
+        while len(_history_windows) > HISTORY_CACHE_SIZE:
+            _history_windows.popitem(last=False)
+        _history_stats['loads'] += 1
+    
+    if message_count == 0 and not TRANSCRIPT_WRITE_BEHIND:
+        messages = []  # New conversation: nothing to read
+    else:
+        messages = to_history(get_conversation_history(conversation_id, limit=HISTORY_CACHE_MESSAGES))
+    with _history_lock:
+        if _history_windows.get(conversation_id) is window and not window.dirty:
+            window.fill(messages, message_count if message_count is not None else len(messages), now)
+    return messages[-limit:]
+
+
+def count_unsaved_messages(conversation_id):
+    """Messages of a conversation queued by this process but not in the database yet"""
+    if TRANSCRIPT_WRITE_BEHIND:
+        return transcript_buffer.pending_count(conversation_id)
+    return 0
+
+
+def _remember_messages(conversation_id, messages):
+    """Add just-saved messages to the conversation's cached window, if it has one"""
     if not messages:
+        return
+    with _history_lock:
+        window = _history_windows.get(conversation_id)
+        if window is None:
+            return
+        if window.messages is None:
+            window.dirty = True
+            return
+        window.messages.extend(to_history(messages))
+        window.count += len(messages)
+        window.updated_at = time.monotonic()
+
+
+def forget_history_window(conversation_id=None):
+    """Drop a conversation's cached window (everyone's if none given)"""
+    with _history_lock:
+        if conversation_id is None:
+            _history_windows.clear()
+        else:
+            _history_windows.pop(conversation_id, None)
+
+
+def get_history_cache_stats():
+    """Get conversation history cache statistics"""
+    with _history_lock:
+        return {
+            'size': len(_history_windows),
+            'max_size': HISTORY_CACHE_SIZE,
+            'messages_per_conversation': HISTORY_CACHE_MESSAGES,
+            'ttl_s': HISTORY_CACHE_TTL,
+            **_history_stats
+        }
+
+
+def format_history(history):
+    """Format cleaned history (HistoryMessage tuples, oldest first) as conversation context
+    
+    A leading SUMMARY_ROLE entry is written before the turns.
+    
+    Args:
+        history: Messages to include, oldest first
+    
+    Returns:
+        str: Formatted conversation context
+    """
+    if not history:
         return ""
     
     # Build context with cleaner formatting
@@ -144,17 +379,19 @@ def build_conversation_context(conversation_id, max_messages=10):
     turn_num = 1
     
     i = 0
-    while i < len(messages):
+    if history[0].role == SUMMARY_ROLE:
+        context_parts.append(f"Summary of the earlier conversation:\n{history[0].content}")
+        context_parts.append("")
+        i = 1
+    while i < len(history):
         # Group user and assistant messages as conversation turns
-        if messages[i].role == "user":
-            user_msg = clean_html_tags(messages[i].content)
+        if history[i].role == "user":
             context_parts.append(f"Turn {turn_num}:")
-            context_parts.append(f"User: {user_msg}")
+            context_parts.append(f"User: {history[i].content}")
             
             # Look for corresponding assistant response
-            if i + 1 < len(messages) and messages[i + 1].role == "assistant":
-                assistant_msg = clean_html_tags(messages[i + 1].content)
-                context_parts.append(f"Assistant: {assistant_msg}")
+            if i + 1 < len(history) and history[i + 1].role == "assistant":
+                context_parts.append(f"Assistant: {history[i + 1].content}")
                 i += 2
             else:
                 i += 1
@@ -167,6 +404,18 @@ def build_conversation_context(conversation_id, max_messages=10):
     return "\n".join(context_parts).strip()
 
 
+def format_conversation_context(messages):
+    """Format messages (chronological Message objects) as conversation context for the LLM prompt
+    
+    Args:
+        messages: Messages to include, oldest first
+    
+    Returns:
+        str: Formatted conversation context
+    """
+    return format_history(to_history(messages))
+
+
 def end_conversation(conversation_id):
     """Mark conversation as inactive
     
@@ -196,6 +445,34 @@ def get_user_conversations(user_id, limit=10, active_only=False):
     return Conversation.get_user_conversations(user_id, limit, active_only)
 
 
+def get_user_conversations_page(user_id, limit=10, active_only=False, cursor=None):
+    """Get one page of a user's conversations, most recently updated first
+    
+    Pages are keyset-paginated on (updated_at, id), so deep pages cost the same as
+    the first. A conversation that gets a new message while someone pages moves to
+    the front and is not repeated further down.
+    
+    Args:
+        user_id: User ID
+        limit: Maximum number of conversations to return
+        active_only: Only return active conversations
+        cursor: next_cursor of the previous page (None for the first page)
+    
+    Returns:
+        tuple: (list of Conversation objects, cursor of the next page or None)
+    
+    Raises:
+        ValueError: The cursor is malformed
+    """
+    before = decode_cursor(cursor) if cursor else None
+    conversations = Conversation.get_user_conversations(user_id, limit + 1, active_only, before=before)
+    if len(conversations) <= limit:
+        return conversations, None
+    conversations = conversations[:limit]
+    last = conversations[-1]
+    return conversations, encode_cursor(last.updated_at, last.id)
+
+
 def delete_conversation(conversation_id, user_id):
     """Delete a conversation (with permission check)
     
@@ -208,29 +485,49 @@ def delete_conversation(conversation_id, user_id):
     """
     conversation = Conversation.get_by_id(conversation_id)
     if conversation and conversation.user_id == user_id:
+        if TRANSCRIPT_WRITE_BEHIND:
+            transcript_buffer.discard(conversation_id)
+        forget_history_window(conversation_id)
         return conversation.delete()
     return False
 
 
-def get_conversation_with_messages(conversation_id, user_id, message_limit=20):
+def get_conversation_with_messages(conversation_id, user_id, message_limit=20, before=None):
     """Get conversation with its messages (for API responses)
     
+    The latest messages come first; older ones are fetched page by page by passing
+    the returned next_cursor back as before.
+    
     Args:
         conversation_id: Conversation ID
         user_id: User ID (for permission check)
         message_limit: Maximum number of messages to include
+        before: next_cursor of the previous page (None for the latest messages)
     
     Returns:
-        dict: Conversation data with messages, or None
+        dict: Conversation data, messages (chronological) and next_cursor, or None
+    
+    Raises:
+        ValueError: The cursor is malformed
     """
+    before = decode_cursor(before) if before else None
     conversation = Conversation.get_by_id(conversation_id)
     if not conversation or conversation.user_id != user_id:
         return None
     
-    messages = get_conversation_history(conversation_id, limit=message_limit)
+    if before:
+        messages = Message.get_recent_messages(conversation_id, message_limit + 1, before=before)
+    else:
+        messages = get_conversation_history(conversation_id, limit=message_limit + 1)
+    next_cursor = None
+    if len(messages) > message_limit:
+        messages = messages[-message_limit:] if message_limit > 0 else []
+        if messages and messages[0].id is not None:
+            next_cursor = encode_cursor(messages[0].created_at, messages[0].id)
     
     return {
         'conversation': conversation.to_dict(),
-        'messages': [msg.to_dict() for msg in messages]
+        'messages': [msg.to_dict() for msg in messages],
+        'next_cursor': next_cursor
     }
 
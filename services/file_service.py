@@ -3,8 +3,6 @@ import os
 from datetime import datetime
 from werkzeug.utils import secure_filename
 from utils.helpers import allowed_file
-from langchain_community.document_loaders import PyPDFLoader, TextLoader, CSVLoader, Docx2txtLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 
 
 def save_uploaded_file(user_id, file, category):
@@ -57,6 +55,7 @@ def delete_user_file(user_id, filename, category):
 
 def extract_text_from_file(filepath, filename):
     """Extract text from file for preview (does not ingest)"""
+    from langchain_community.document_loaders import PyPDFLoader, TextLoader, CSVLoader, Docx2txtLoader
     try:
         file_ext = filename.lower().split('.')[-1]
         print(f"📄 Extracting text from {file_ext} file: {filename}")
@@ -233,9 +232,11 @@ def extract_text_from_file(filepath, filename):
 def process_file_for_user(filepath, filename, category, user_id):
     """Process file for specific user's knowledge base"""
     try:
-        from services.knowledge_service import get_user_vectorstore, embeddings
+        from services.knowledge_service import user_vectorstore_in_use, add_documents_to_vectorstore, bump_knowledge_version, load_embeddings
+        from langchain_community.document_loaders import PyPDFLoader, TextLoader, CSVLoader, Docx2txtLoader
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
         
-        if not embeddings:
+        if not load_embeddings():
             print("❌ Embeddings not available")
             return False
         
@@ -325,14 +326,15 @@ def process_file_for_user(filepath, filename, category, user_id):
         
         # Add to user-specific vectorstore
         try:
-            user_vectorstore = get_user_vectorstore(user_id)
-            if user_vectorstore is None:
-                print("❌ Failed to create/get user vectorstore")
-                return False
-            
-            # Add documents to vectorstore
-            print(f"📤 Adding {len(chunks)} chunks to vectorstore...")
-            user_vectorstore.add_documents(chunks)
+            with user_vectorstore_in_use(user_id) as user_vectorstore:
+                if user_vectorstore is None:
+                    print("❌ Failed to create/get user vectorstore")
+                    return False
+                
+                # Add documents to vectorstore
+                print(f"📤 Adding {len(chunks)} chunks to vectorstore...")
+                add_documents_to_vectorstore(user_id, user_vectorstore, chunks)
+            bump_knowledge_version(user_id)
             print(f"✅ Added {len(chunks)} chunks from {filename} to user {user_id} knowledge base")
             
             return True
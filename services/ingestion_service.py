@@ -0,0 +1,480 @@
+"""Background ingestion service - job handlers and the local worker pool
+
+Ingest endpoints only validate the request and enqueue a job; splitting, embedding
+and writing to Chroma happen here, on worker threads, so web workers stay free for
+chat traffic. Jobs live in the ingestion_jobs table, which makes them survive
+restarts and lets several processes share the queue.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from models.ingestion_job import IngestionJob
+
+
+# Worker pool settings
+INGESTION_WORKERS = int(os.getenv('INGESTION_WORKERS', 2))
+INGESTION_MAX_PER_TENANT = int(os.getenv('INGESTION_MAX_PER_TENANT', 1))
+INGESTION_MAX_ATTEMPTS = int(os.getenv('INGESTION_MAX_ATTEMPTS', 3))
+INGESTION_RETRY_BACKOFF = float(os.getenv('INGESTION_RETRY_BACKOFF', 10))   # seconds, doubled per attempt
+INGESTION_POLL_INTERVAL = float(os.getenv('INGESTION_POLL_INTERVAL', 2))
+INGESTION_STALE_AFTER = int(os.getenv('INGESTION_STALE_AFTER', 900))        # seconds without progress
+INGESTION_BATCH_SIZE = int(os.getenv('INGESTION_BATCH_SIZE', 64))           # chunks per vectorstore write
+
+JOB_TYPES = ('file', 'crawled_url', 'faq', 'faq_bulk')
+
+
+class IngestionError(Exception):
+    """Permanent ingestion failure - the job is failed without retrying"""
+
+
+def _get_splitter(chunk_size):
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=200,
+        length_function=len
+    )
+
+
+def _make_document(page_content, metadata):
+    try:
+        from langchain_core.documents import Document
+    except ImportError:
+        from langchain.schema import Document
+    return Document(page_content=page_content, metadata=metadata)
+
+
+@contextmanager
+def _vectorstore_in_use(user_id):
+    """The user's vectorstore, held for the with block (see knowledge_service.user_vectorstore_in_use)"""
+    from services.knowledge_service import user_vectorstore_in_use
+    with user_vectorstore_in_use(user_id) as user_vectorstore:
+        if user_vectorstore is None:
+            # Usually transient (embeddings still loading, chroma locked) - let it retry
+            raise RuntimeError("Failed to access knowledge base. Please check embeddings and vectorstore initialization.")
+        yield user_vectorstore
+
+
+def _ensure_kb_writable(user_id):
+    """Fix permissions on the user's chroma directory to avoid readonly database errors"""
+    from services.knowledge_service import get_user_knowledge_base_path
+    kb_path = get_user_knowledge_base_path(user_id)
+    if not os.path.exists(kb_path):
+        return
+    try:
+        os.chmod(kb_path, 0o777)
+    except OSError:
+        pass
+    for root, dirs, files in os.walk(kb_path):
+        for d in dirs:
+            try:
+                os.chmod(os.path.join(root, d), 0o777)
+            except OSError:
+                pass
+        for f in files:
+            try:
+                os.chmod(os.path.join(root, f), 0o666)
+            except OSError:
+                pass
+
+
+def _add_chunks(user_id, user_vectorstore, chunks, id_prefix, report, start=20, end=90):
+    """Write chunks in batches, reporting progress between start and end percent
+
+    Chunk ids are deterministic (id_prefix + index) so a retried job overwrites the
+    chunks a failed attempt already wrote instead of duplicating them.
+    """
+    from services.knowledge_service import add_documents_to_vectorstore
+    total = len(chunks)
+    for offset in range(0, total, INGESTION_BATCH_SIZE):
+        batch = chunks[offset:offset + INGESTION_BATCH_SIZE]
+        ids = [f"{id_prefix}_{offset + i}" for i in range(len(batch))]
+        add_documents_to_vectorstore(user_id, user_vectorstore, batch, ids=ids)
+        done = offset + len(batch)
+        report(start + int((end - start) * done / total), f"Embedded {done}/{total} chunks")
+
+
+def _verify_chunks(user_vectorstore, test_query, k, matches):
+    """Best-effort check that freshly written chunks are retrievable"""
+    try:
+        retriever = user_vectorstore.as_retriever(search_kwargs={"k": k})
+        if hasattr(retriever, 'invoke'):
+            verify_docs = retriever.invoke(test_query)
+        else:
+            verify_docs = retriever.get_relevant_documents(test_query)
+        verified_count = sum(1 for doc in verify_docs if matches(doc))
+        if verified_count == 0:
+            print(f"⚠️ WARNING: Verification found 0 chunks - ingestion may have failed!")
+        return verified_count
+    except Exception as verify_error:
+        print(f"⚠️ Verification check failed (but ingestion may have succeeded): {verify_error}")
+        return None
+
+
+def _ingest_file(user_id, file_id, payload, report):
+    """Ingest an uploaded file's (possibly edited) text"""
+    from models.uploaded_file import UploadedFile
+
+    uploaded_file = UploadedFile.get_by_id(user_id, file_id)
+    if not uploaded_file:
+        raise IngestionError("File not found")
+    if uploaded_file['status'] == 'ingested':
+        return {"message": f"File '{uploaded_file['filename']}' already ingested.", "chunks_added": 0, "status": "ingested"}
+
+    text = uploaded_file.get('extracted_text')
+    if not text:
+        raise IngestionError("No text to ingest")
+
+    doc = _make_document(text, {
+        'source_file': uploaded_file['filename'],
+        'upload_time': datetime.now().isoformat(),
+        'category': uploaded_file['category'],
+        'user_id': str(user_id),
+        'source_type': 'file_upload',
+        'file_id': file_id
+    })
+    chunks = _get_splitter(1000).split_documents([doc])
+    report(10, f"Split into {len(chunks)} chunks")
+
+    with _vectorstore_in_use(user_id) as user_vectorstore:
+        _ensure_kb_writable(user_id)
+        print(f"📝 Adding {len(chunks)} chunks to vectorstore...")
+        _add_chunks(user_id, user_vectorstore, chunks, f"file_{file_id}", report)
+        print(f"✅ Successfully added chunks to vectorstore")
+
+        report(95, "Verifying")
+        verified_count = _verify_chunks(
+            user_vectorstore,
+            uploaded_file['filename'] + " " + (text[:100] or ''),
+            len(chunks) + 5,
+            lambda d: d.metadata.get('source_file') == uploaded_file['filename']
+        )
+
+    UploadedFile.update_status(file_id, 'ingested')
+    return {
+        "message": f"File '{uploaded_file['filename']}' ingested successfully. Added {len(chunks)} chunks.",
+        "chunks_added": len(chunks),
+        "status": "ingested",
+        "verified": verified_count > 0 if verified_count is not None else None
+    }
+
+
+def _ingest_crawled_url(user_id, crawled_id, payload, report):
+    """Ingest a crawled URL's (possibly edited) text"""
+    from models.crawled_url import CrawledUrl
+
+    crawled = CrawledUrl.get_by_id(user_id, crawled_id)
+    if not crawled:
+        raise IngestionError("Crawled URL not found")
+    if crawled['status'] == 'ingested':
+        return {"message": f"URL {crawled['url']} already ingested.", "chunks_added": 0, "status": "ingested"}
+
+    text = crawled['extracted_text']
+    if not text:
+        raise IngestionError("No text to ingest")
+
+    doc = _make_document(text, {
+        'source_file': crawled['url'],
+        'upload_time': datetime.now().isoformat(),
+        'category': crawled['category'],
+        'user_id': str(user_id),
+        'source_type': 'web_crawl',
+        'crawled_id': crawled_id
+    })
+    chunks = _get_splitter(1000).split_documents([doc])
+    report(10, f"Split into {len(chunks)} chunks")
+
+    with _vectorstore_in_use(user_id) as user_vectorstore:
+        print(f"📝 Adding {len(chunks)} chunks to vectorstore...")
+        _add_chunks(user_id, user_vectorstore, chunks, f"crawl_{crawled_id}", report)
+        print(f"✅ Successfully added chunks to vectorstore")
+
+    CrawledUrl.update_status(crawled_id, 'ingested')
+    return {
+        "message": f"URL {crawled['url']} ingested successfully. Added {len(chunks)} chunks.",
+        "chunks_added": len(chunks),
+        "status": "ingested"
+    }
+
+
+def _faq_chunks(user_id, faq):
+    # Format: "Q: {question}\nA: {answer}" - larger chunks keep the Q&A together
+    doc = _make_document(f"Q: {faq['question']}\nA: {faq['answer']}", {
+        'source_file': f"FAQ_{faq['id']}",
+        'upload_time': datetime.now().isoformat(),
+        'category': faq['category'],
+        'user_id': str(user_id),
+        'source_type': 'faq',
+        'faq_id': faq['id'],
+        'question': faq['question']
+    })
+    return _get_splitter(2000).split_documents([doc])
+
+
+def _ingest_faq(user_id, faq_id, payload, report):
+    """Ingest a single FAQ"""
+    from models.faq import FAQ
+
+    faq = FAQ.get_by_id(user_id, faq_id)
+    if not faq:
+        raise IngestionError("FAQ not found")
+    if faq['status'] == 'active':
+        return {"message": "FAQ already ingested.", "chunks_added": 0, "status": "active"}
+
+    chunks = _faq_chunks(user_id, faq)
+    with _vectorstore_in_use(user_id) as user_vectorstore:
+        _ensure_kb_writable(user_id)
+        print(f"📝 Adding {len(chunks)} FAQ chunks to vectorstore...")
+        _add_chunks(user_id, user_vectorstore, chunks, f"faq_{faq_id}", report)
+        print(f"✅ Successfully added FAQ chunks to vectorstore")
+
+        report(95, "Verifying")
+        verified_count = _verify_chunks(
+            user_vectorstore,
+            faq['question'] + " " + faq['answer'][:100],
+            len(chunks) + 5,
+            lambda d: d.metadata.get('faq_id') == faq_id
+        )
+
+    FAQ.update_status(faq_id, 'active')
+    return {
+        "message": f"FAQ ingested successfully. Added {len(chunks)} chunk(s).",
+        "chunks_added": len(chunks),
+        "status": "active",
+        "verified": bool(verified_count)
+    }
+
+
+def _ingest_faqs_bulk(user_id, target_id, payload, report):
+    """Ingest several FAQs; per-FAQ problems are reported, not retried"""
+    from models.faq import FAQ
+
+    faq_ids = (payload or {}).get('faq_ids') or []
+    if not faq_ids:
+        raise IngestionError("No FAQ IDs provided")
+    from services.knowledge_service import add_documents_to_vectorstore
+    total_chunks = 0
+    ingested_count = 0
+    errors = []
+
+    with _vectorstore_in_use(user_id) as user_vectorstore:
+        for index, faq_id in enumerate(faq_ids):
+            try:
+                faq = FAQ.get_by_id(user_id, faq_id)
+                if not faq:
+                    errors.append(f"FAQ {faq_id} not found")
+                    continue
+                if faq['status'] == 'active':
+                    errors.append(f"FAQ {faq_id} already ingested")
+                    continue
+
+                chunks = _faq_chunks(user_id, faq)
+                ids = [f"faq_{faq_id}_{i}" for i in range(len(chunks))]
+                add_documents_to_vectorstore(user_id, user_vectorstore, chunks, ids=ids)
+                FAQ.update_status(faq_id, 'active')
+
+                total_chunks += len(chunks)
+                ingested_count += 1
+            except Exception as e:
+                errors.append(f"FAQ {faq_id}: {str(e)}")
+            finally:
+                report(int(100 * (index + 1) / len(faq_ids)) - 1, f"Processed {index + 1}/{len(faq_ids)} FAQs")
+
+    return {
+        "message": f"Bulk ingest completed. {ingested_count} FAQ(s) ingested, {total_chunks} chunk(s) added.",
+        "ingested_count": ingested_count,
+        "total_chunks": total_chunks,
+        "errors": errors if errors else None
+    }
+
+
+JOB_HANDLERS = {
+    'file': _ingest_file,
+    'crawled_url': _ingest_crawled_url,
+    'faq': _ingest_faq,
+    'faq_bulk': _ingest_faqs_bulk
+}
+
+
+class IngestionWorkerPool:
+    """Local pool of worker threads that drain the ingestion_jobs table"""
+
+    def __init__(self, num_workers=2, max_per_tenant=1):
+        self.num_workers = num_workers
+        self.max_per_tenant = max_per_tenant
+        self._threads = []
+        self._pid = None
+        self._lock = threading.Lock()
+        self._claim_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._last_stale_check = 0.0
+        self._stats = {'processed': 0, 'succeeded': 0, 'failed': 0, 'retried': 0, 'busy': 0}
+
+    def start(self):
+        """Start the worker threads (idempotent; restarts them in a forked child)"""
+        with self._lock:
+            if self._pid == os.getpid() and any(t.is_alive() for t in self._threads):
+                return
+            self._pid = os.getpid()
+            self._stopping.clear()
+            self._threads = []
+            for i in range(self.num_workers):
+                thread = threading.Thread(target=self._run, name=f"ingestion-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            print(f"✅ Started {self.num_workers} ingestion worker(s) (max {self.max_per_tenant} per tenant)")
+
+    def stop(self, timeout=5):
+        """Ask the workers to stop after their current job"""
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def notify(self):
+        """Wake idle workers (a job was just enqueued)"""
+        self._wakeup.set()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update({
+            'workers': self.num_workers,
+            'alive': sum(1 for t in self._threads if t.is_alive()),
+            'max_per_tenant': self.max_per_tenant
+        })
+        return stats
+
+    def _bump(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def _claim_next(self):
+        """Claim the oldest runnable job whose tenant is under its concurrency limit"""
+        with self._claim_lock:
+            now = time.monotonic()
+            if now - self._last_stale_check > 60:
+                self._last_stale_check = now
+                requeued = IngestionJob.requeue_stale(INGESTION_STALE_AFTER)
+                if requeued:
+                    print(f"🔄 Requeued {requeued} stale ingestion job(s)")
+
+            running = IngestionJob.get_running_counts()
+            for job in IngestionJob.get_runnable():
+                if running.get(job['user_id'], 0) >= self.max_per_tenant:
+                    continue
+                if IngestionJob.claim(job['id']):
+                    job['attempts'] = (job.get('attempts') or 0) + 1
+                    return job
+            return None
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                job = self._claim_next()
+            except Exception as e:
+                print(f"⚠️ Ingestion worker could not poll the queue: {e}")
+                job = None
+
+            if job is None:
+                self._wakeup.wait(INGESTION_POLL_INTERVAL)
+                self._wakeup.clear()
+                continue
+
+            self._bump('busy')
+            try:
+                self._execute(job)
+            finally:
+                self._bump('busy', -1)
+
+    def _execute(self, job):
+        job_id = job['id']
+        handler = JOB_HANDLERS.get(job['job_type'])
+
+        def report(progress, message=None):
+            IngestionJob.update_progress(job_id, max(0, min(99, progress)), (message or '')[:255] or None)
+
+        print(f"⚙️ Ingestion job {job_id} ({job['job_type']}) started for user {job['user_id']} (attempt {job['attempts']})")
+        try:
+            if handler is None:
+                raise IngestionError(f"Unknown job type: {job['job_type']}")
+            result = handler(job['user_id'], job.get('target_id'), job.get('payload'), report)
+            IngestionJob.mark_succeeded(job_id, result)
+            self._bump('succeeded')
+            print(f"✅ Ingestion job {job_id} finished")
+        except IngestionError as e:
+            IngestionJob.mark_failed(job_id, str(e))
+            self._bump('failed')
+            print(f"❌ Ingestion job {job_id} failed: {e}")
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            if job['attempts'] < (job.get('max_attempts') or INGESTION_MAX_ATTEMPTS):
+                delay = INGESTION_RETRY_BACKOFF * (2 ** (job['attempts'] - 1))
+                IngestionJob.requeue(job_id, str(e), delay)
+                self._bump('retried')
+                print(f"🔄 Ingestion job {job_id} failed, retrying in {delay:.0f}s: {e}")
+            else:
+                IngestionJob.mark_failed(job_id, f"Failed to add documents to knowledge base: {str(e)}")
+                self._bump('failed')
+                print(f"❌ Ingestion job {job_id} failed after {job['attempts']} attempt(s): {e}")
+        finally:
+            # Chunks may have been written even if the job failed part-way
+            from services.knowledge_service import bump_knowledge_version
+            bump_knowledge_version(job['user_id'])
+            self._bump('processed')
+
+
+worker_pool = IngestionWorkerPool(
+    num_workers=INGESTION_WORKERS,
+    max_per_tenant=INGESTION_MAX_PER_TENANT
+)
+
+
+def start_ingestion_workers():
+    """Start the local worker pool (no-op when INGESTION_WORKERS=0)"""
+    if worker_pool.num_workers > 0:
+        worker_pool.start()
+
+
+def enqueue_ingestion_job(user_id, job_type, target_id=None, payload=None):
+    """Queue an ingestion job and return it
+
+    If the same target already has a queued or running job, that job is returned
+    instead of queueing a duplicate.
+
+    Args:
+        user_id: Owner of the knowledge base
+        job_type: One of JOB_TYPES
+        target_id: File / crawled URL / FAQ id (None for bulk jobs)
+        payload: Optional JSON-serializable job arguments
+
+    Returns:
+        dict: The job row, or None if it could not be created
+    """
+    if job_type not in JOB_TYPES:
+        raise ValueError(f"Unknown ingestion job type: {job_type}")
+
+    if target_id is not None:
+        existing = IngestionJob.find_active(user_id, job_type, target_id)
+        if existing:
+            return existing
+
+    job_id = IngestionJob.create(user_id, job_type, target_id, payload, max_attempts=INGESTION_MAX_ATTEMPTS)
+    if not job_id:
+        return None
+
+    start_ingestion_workers()
+    worker_pool.notify()
+    return IngestionJob.get_by_id(user_id, job_id)
+
+
+def get_ingestion_stats():
+    """Get worker pool and queue statistics for monitoring"""
+    stats = worker_pool.stats()
+    stats['jobs'] = IngestionJob.get_status_counts()
+    return stats
@@ -0,0 +1,301 @@
+"""Per-user keyword (BM25) index for hybrid retrieval
+
+Dense similarity search misses exact tokens such as phone numbers, SKUs, street
+addresses and product names. Every chunk written to a user's vectorstore is
+therefore also indexed in an SQLite FTS5 table kept inside the user's chroma
+directory, so reset, restore and corruption recovery replace it together with the
+vectorstore. Chat retrieval queries both indexes concurrently and fuses the two
+rankings with reciprocal rank fusion (RRF).
+
+Chunk ids are the vectorstore ids, which keeps adds and deletes in step with Chroma.
+Knowledge bases that predate the index are indexed once, in the background, the
+first time they are searched; until then retrieval is dense-only.
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+HYBRID_RETRIEVAL = os.getenv('HYBRID_RETRIEVAL', 'true').lower() == 'true'
+HYBRID_RRF_K = int(os.getenv('HYBRID_RRF_K', 60))  # RRF damping constant
+HYBRID_SEARCH_WORKERS = int(os.getenv('HYBRID_SEARCH_WORKERS', 8))
+
+KEYWORD_INDEX_FILENAME = 'keyword_index.sqlite3'
+_MAX_QUERY_TERMS = 32
+_BUILD_PAGE_SIZE = 1000
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS chunks (
+        id INTEGER PRIMARY KEY,
+        chunk_id TEXT UNIQUE NOT NULL,
+        content TEXT NOT NULL,
+        metadata TEXT
+    )
+    """,
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
+        content, content='chunks', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS chunks_ai AFTER INSERT ON chunks BEGIN
+        INSERT INTO chunks_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS chunks_ad AFTER DELETE ON chunks BEGIN
+        INSERT INTO chunks_fts(chunks_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS chunks_au AFTER UPDATE ON chunks BEGIN
+        INSERT INTO chunks_fts(chunks_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        INSERT INTO chunks_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+    "CREATE TABLE IF NOT EXISTS index_meta (key TEXT PRIMARY KEY, value TEXT)"
+)
+
+_search_executor = ThreadPoolExecutor(max_workers=HYBRID_SEARCH_WORKERS, thread_name_prefix="keyword-search")
+_build_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="keyword-index-build")
+_building = set()
+_lock = threading.Lock()
+_stats = {
+    'searches': 0,
+    'keyword_hits': 0,
+    'dense_only': 0,
+    'errors': 0,
+    'builds': 0,
+    'build_failures': 0
+}
+
+
+def _bump(name, amount=1):
+    with _lock:
+        _stats[name] += amount
+
+
+def _index_path(user_id):
+    from services.knowledge_service import get_user_knowledge_base_path
+    return os.path.join(get_user_knowledge_base_path(user_id), KEYWORD_INDEX_FILENAME)
+
+
+def _connect(user_id, create=False):
+    """Open the user's index (None if it does not exist and create is False)"""
+    path = _index_path(user_id)
+    if not create and not os.path.exists(path):
+        return None
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=10)
+    if create:
+        for statement in _SCHEMA:
+            conn.execute(statement)
+        conn.commit()
+    return conn
+
+
+def _upsert_rows(conn, rows):
+    conn.executemany("""
+        INSERT INTO chunks (chunk_id, content, metadata) VALUES (?, ?, ?)
+        ON CONFLICT (chunk_id) DO UPDATE SET content = excluded.content, metadata = excluded.metadata
+    """, rows)
+
+
+def index_documents(user_id, ids, documents):
+    """Add or replace chunks in the user's keyword index
+
+    Args:
+        user_id: User ID
+        ids: Vectorstore ids of the chunks
+        documents: LangChain Documents, in the same order as ids
+    """
+    if not ids:
+        return
+    conn = _connect(user_id, create=True)
+    try:
+        _upsert_rows(conn, [
+            (str(chunk_id), doc.page_content or '', json.dumps(doc.metadata or {}, default=str))
+            for chunk_id, doc in zip(ids, documents)
+        ])
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def remove_documents(user_id, ids):
+    """Remove chunks from the user's keyword index"""
+    if not ids:
+        return
+    conn = _connect(user_id)
+    if conn is None:
+        return
+    try:
+        conn.executemany("DELETE FROM chunks WHERE chunk_id = ?", [(str(chunk_id),) for chunk_id in ids])
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def drop_index(user_id):
+    """Delete the user's keyword index (its vectorstore was deleted or replaced)"""
+    path = _index_path(user_id)
+    for candidate in (path, f"{path}-journal"):
+        try:
+            os.remove(candidate)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"⚠️ Could not delete keyword index {candidate}: {e}")
+
+
+def _is_built(conn):
+    row = conn.execute("SELECT value FROM index_meta WHERE key = 'built'").fetchone()
+    return row is not None
+
+
+def _build_index(user_id):
+    """Index every chunk already in the user's vectorstore (one-time backfill)"""
+    try:
+        from services.knowledge_service import user_vectorstore_in_use
+        with user_vectorstore_in_use(user_id) as user_vectorstore:
+            if user_vectorstore is None:
+                return
+            collection = user_vectorstore._collection
+            conn = _connect(user_id, create=True)
+            try:
+                indexed = 0
+                offset = 0
+                while True:
+                    page = collection.get(include=['documents', 'metadatas'], limit=_BUILD_PAGE_SIZE, offset=offset)
+                    ids = page.get('ids') or []
+                    documents = page.get('documents') or [''] * len(ids)
+                    metadatas = page.get('metadatas') or [{}] * len(ids)
+                    _upsert_rows(conn, [
+                        (str(chunk_id), text or '', json.dumps(metadata or {}, default=str))
+                        for chunk_id, text, metadata in zip(ids, documents, metadatas)
+                    ])
+                    conn.commit()
+                    indexed += len(ids)
+                    if len(ids) < _BUILD_PAGE_SIZE:
+                        break
+                    offset += _BUILD_PAGE_SIZE
+                conn.execute("INSERT OR REPLACE INTO index_meta (key, value) VALUES ('built', '1')")
+                conn.commit()
+            finally:
+                conn.close()
+        _bump('builds')
+        print(f"✅ Built keyword index for user {user_id} ({indexed} chunks)")
+    except Exception as e:
+        _bump('build_failures')
+        print(f"⚠️ Failed to build keyword index for user {user_id}: {e}")
+    finally:
+        with _lock:
+            _building.discard(user_id)
+
+
+def _schedule_build(user_id):
+    with _lock:
+        if user_id in _building:
+            return
+        _building.add(user_id)
+    _build_executor.submit(_build_index, user_id)
+
+
+def _match_expression(query):
+    """Turn free text into an FTS5 OR-query of quoted terms"""
+    terms = list(dict.fromkeys(t.lower() for t in _TOKEN_RE.findall(query or '')))[:_MAX_QUERY_TERMS]
+    return ' OR '.join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+def keyword_search(user_id, query, k):
+    """BM25-ranked chunks for query
+
+    Returns:
+        list: Documents, best first - or None if the user's index is not built yet
+    """
+    from langchain_core.documents import Document
+
+    conn = _connect(user_id)
+    if conn is None or not _is_built(conn):
+        if conn is not None:
+            conn.close()
+        _schedule_build(user_id)
+        return None
+    try:
+        expression = _match_expression(query)
+        if not expression:
+            return []
+        rows = conn.execute("""
+            SELECT c.chunk_id, c.content, c.metadata
+            FROM chunks_fts
+            JOIN chunks c ON c.id = chunks_fts.rowid
+            WHERE chunks_fts MATCH ?
+            ORDER BY bm25(chunks_fts)
+            LIMIT ?
+        """, (expression, k)).fetchall()
+    finally:
+        conn.close()
+
+    documents = []
+    for chunk_id, content, metadata in rows:
+        try:
+            metadata = json.loads(metadata) if metadata else {}
+        except ValueError:
+            metadata = {}
+        documents.append(Document(page_content=content, metadata=metadata, id=chunk_id))
+    return documents
+
+
+def _fusion_key(doc):
+    return (doc.metadata.get('source_file'), doc.page_content)
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """Fuse ranked Document lists: score(d) = sum of 1 / (k + rank) over the lists"""
+    scores = {}
+    documents = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            key = _fusion_key(doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            documents.setdefault(key, doc)
+    return [documents[key] for key in sorted(scores, key=scores.get, reverse=True)]
+
+
+def hybrid_search(user_id, user_vectorstore, query, k):
+    """Dense + keyword retrieval fused with RRF (dense-only when the keyword side is unavailable)
+
+    The keyword query runs on a worker thread while the dense search runs here.
+    """
+    _bump('searches')
+    keyword_future = _search_executor.submit(keyword_search, user_id, query, k) if HYBRID_RETRIEVAL else None
+    dense_docs = user_vectorstore.similarity_search(query, k=k)
+
+    keyword_docs = None
+    if keyword_future is not None:
+        try:
+            keyword_docs = keyword_future.result()
+        except Exception as e:
+            _bump('errors')
+            print(f"⚠️ Keyword search failed, using dense results only: {e}")
+    if not keyword_docs:
+        _bump('dense_only')
+        return dense_docs
+
+    _bump('keyword_hits')
+    return reciprocal_rank_fusion([dense_docs, keyword_docs], k=HYBRID_RRF_K)[:k]
+
+
+def get_keyword_index_stats():
+    """Get hybrid retrieval statistics for monitoring"""
+    with _lock:
+        stats = dict(_stats)
+        stats['building'] = len(_building)
+    stats['enabled'] = HYBRID_RETRIEVAL
+    return stats
@@ -1,22 +1,452 @@
 """Knowledge base and vectorstore service"""
 import os
-from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import HuggingFaceEmbeddings
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from langchain_core.embeddings import Embeddings
+from services.vectorstore_registry import registry as vectorstore_registry, close_chroma_client
+from services.config_service import get_user_chatbot_config_path
+from models.knowledge_stat import KnowledgeStat
+from services import keyword_index
 
 
-# Global embeddings - initialized in app.py
+# Global embeddings - loaded by load_embeddings() (in the background at startup)
 embeddings = None
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+_embeddings_load_lock = threading.Lock()
+
+# Embedding micro-batching settings
+EMBEDDING_BATCHING = os.getenv('EMBEDDING_BATCHING', 'true').lower() == 'true'
+EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', 32))      # max texts per forward pass
+EMBEDDING_BATCH_WAIT_MS = float(os.getenv('EMBEDDING_BATCH_WAIT_MS', 10))  # max time to wait for more texts
+
+# Query embedding cache settings (shared across tenants - embeddings don't depend on the tenant)
+QUERY_EMBEDDING_CACHE = os.getenv('QUERY_EMBEDDING_CACHE', 'true').lower() == 'true'
+QUERY_EMBEDDING_CACHE_MB = int(os.getenv('QUERY_EMBEDDING_CACHE_MB', 32))
+QUERY_EMBEDDING_CACHE_TTL = int(os.getenv('QUERY_EMBEDDING_CACHE_TTL', 86400))
+
+# Knowledge base stats: counters live in the knowledge_stats table, this caches the read
+KNOWLEDGE_STATS_CACHE_SIZE = int(os.getenv('KNOWLEDGE_STATS_CACHE_SIZE', 256))
+_knowledge_stats_cache = OrderedDict()  # user_id -> (knowledge version, counters)
+_knowledge_stats_cache_lock = threading.Lock()
 
 # Export embeddings for use in other modules
-__all__ = ['embeddings', 'set_embeddings', 'get_user_vectorstore', 'get_knowledge_stats', 'remove_file_from_vectorstore']
+__all__ = ['embeddings', 'set_embeddings', 'load_embeddings', 'user_vectorstore_in_use',
+           'invalidate_user_vectorstore', 'get_vectorstore_registry_stats', 'get_embedding_stats', 'warm_query_embeddings',
+           'get_knowledge_version', 'bump_knowledge_version', 'add_documents_to_vectorstore',
+           'get_knowledge_stats', 'remove_file_from_vectorstore', 'reset_after_fork']
+
+
+class _Histogram:
+    """Fixed-bucket histogram (counts per upper bound, plus count and sum)"""
+
+    def __init__(self, bounds):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.bounds):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.count += 1
+        self.total += value
+
+    def snapshot(self):
+        buckets = {f"le_{bound}": n for bound, n in zip(self.bounds, self.counts)}
+        buckets['le_inf'] = self.counts[-1]
+        return {
+            'count': self.count,
+            'sum': round(self.total, 3),
+            'avg': round(self.total / self.count, 3) if self.count else 0,
+            'buckets': buckets
+        }
+
+
+class _EmbeddingRequest:
+    __slots__ = ('texts', 'kind', 'future', 'enqueued_at')
+
+    def __init__(self, texts, kind):
+        self.texts = texts
+        self.kind = kind
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+
+
+class BatchedEmbeddings(Embeddings):
+    """Embeddings wrapper that micro-batches concurrent requests into one forward pass
+
+    Query and document embedding calls from any thread are queued; a single dispatcher
+    thread collects up to batch_size texts (waiting at most max_wait_ms after the first
+    one) and embeds them with one embed_documents() call on the wrapped model. Callers
+    block until their slice of the batch is ready.
+
+    Queries are served before documents, and a document request larger than
+    batch_size is queued as batch_size slices, so a chat turn's query waits for at
+    most one forward pass of an ingestion job rather than for the whole upload.
+
+    Query texts are only batched through embed_documents() when batch_queries is True,
+    i.e. when the model embeds queries and documents the same way (all-MiniLM does);
+    otherwise embed_query() is passed straight through.
+    """
+
+    def __init__(self, base, batch_size=32, max_wait_ms=10, batch_queries=True):
+        self.base = base
+        self.batch_size = max(1, batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.batch_queries = batch_queries
+        self._cond = threading.Condition()
+        self._queries = deque()     # _EmbeddingRequest of one query text each
+        self._documents = deque()   # _EmbeddingRequest of at most batch_size texts each
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._batch_sizes = _Histogram([1, 2, 4, 8, 16, 32, 64, 128])
+        self._queue_wait_ms = _Histogram([1, 2, 5, 10, 20, 50, 100, 250, 500, 1000])
+        self._texts = 0
+        self._errors = 0
+
+    def __getattr__(self, name):
+        # Expose the wrapped model's attributes (e.g. model_name)
+        if name == 'base':
+            raise AttributeError(name)
+        return getattr(self.base, name)
+
+    def embed_documents(self, texts):
+        if not texts:
+            return []
+        texts = list(texts)
+        requests = [_EmbeddingRequest(texts[offset:offset + self.batch_size], 'documents')
+                    for offset in range(0, len(texts), self.batch_size)]
+        self._submit(requests)
+        vectors = []
+        for request in requests:
+            vectors.extend(request.future.result())
+        return vectors
+
+    def embed_query(self, text):
+        if not self.batch_queries:
+            return self.base.embed_query(text)
+        request = _EmbeddingRequest([text], 'query')
+        self._submit([request])
+        return request.future.result()[0]
+
+    def stats(self):
+        with self._cond:
+            queued = len(self._queries) + len(self._documents)
+        with self._stats_lock:
+            return {
+                'enabled': True,
+                'batch_size': self.batch_size,
+                'max_wait_ms': self.max_wait * 1000,
+                'queued': queued,
+                'texts_embedded': self._texts,
+                'errors': self._errors,
+                'batch_size_histogram': self._batch_sizes.snapshot(),
+                'queue_wait_ms_histogram': self._queue_wait_ms.snapshot()
+            }
+
+    def _submit(self, requests):
+        self._ensure_dispatcher()
+        with self._cond:
+            for request in requests:
+                (self._queries if request.kind == 'query' else self._documents).append(request)
+            self._cond.notify()
+
+    def _ensure_dispatcher(self):
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                # Forked child: requests queued in the parent belong to the parent
+                self._cond = threading.Condition()
+                self._queries = deque()
+                self._documents = deque()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._dispatch_loop, name="embedding-batcher", daemon=True)
+            self._thread.start()
+
+    def _dispatch_loop(self):
+        while True:
+            self._run_batch(self._next_batch())
+
+    def _next_batch(self):
+        """Wait for work, then take queries first and document slices after, up to batch_size texts"""
+        with self._cond:
+            while not self._queries and not self._documents:
+                self._cond.wait()
+            batch = []
+            size = 0
+            deadline = time.monotonic() + self.max_wait
+            while True:
+                for pending in (self._queries, self._documents):
+                    while pending and (not batch or size + len(pending[0].texts) <= self.batch_size):
+                        request = pending.popleft()
+                        batch.append(request)
+                        size += len(request.texts)
+                full = size >= self.batch_size or any(
+                    pending and size + len(pending[0].texts) > self.batch_size
+                    for pending in (self._queries, self._documents))
+                remaining = deadline - time.monotonic()
+                if full or remaining <= 0:
+                    return batch
+                self._cond.wait(remaining)
+
+    def _run_batch(self, batch):
+        started = time.monotonic()
+        texts = [text for request in batch for text in request.texts]
+        try:
+            vectors = self.base.embed_documents(texts)
+        except Exception as e:
+            with self._stats_lock:
+                self._errors += 1
+            for request in batch:
+                request.future.set_exception(e)
+            return
+
+        with self._stats_lock:
+            self._texts += len(texts)
+            self._batch_sizes.observe(len(texts))
+            for request in batch:
+                self._queue_wait_ms.observe((started - request.enqueued_at) * 1000)
+
+        offset = 0
+        for request in batch:
+            request.future.set_result(vectors[offset:offset + len(request.texts)])
+            offset += len(request.texts)
+
+
+def normalize_query_text(text):
+    """Normalize a chat message for query-embedding cache lookups
+
+    Unicode NFKC, collapsed whitespace and lowercase. all-MiniLM-L6-v2 is an uncased
+    model, so lowercasing does not change the embedding it produces.
+    """
+    text = unicodedata.normalize('NFKC', str(text))
+    return ' '.join(text.split()).lower()
+
+
+class QueryEmbeddingCache:
+    """LRU + TTL cache of query vectors keyed by (model name, normalized text)
+
+    Vectors are stored as float32 arrays; the memory cap counts vector bytes plus
+    the key text.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, ttl=86400):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    @staticmethod
+    def _entry_bytes(key, vector):
+        return vector.itemsize * len(vector) + len(key[0]) + len(key[1]) + 64
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, vector = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return vector.tolist()
+                self._remove_locked(key)
+            self._misses += 1
+            return None
+
+    def contains(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry[0] > time.monotonic()
+
+    def put(self, key, vector):
+        vector = array('f', vector)
+        with self._lock:
+            if key in self._entries:
+                self._remove_locked(key)
+            self._entries[key] = (time.monotonic() + self.ttl, vector)
+            self._bytes += self._entry_bytes(key, vector)
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                oldest = next(iter(self._entries))
+                self._remove_locked(oldest)
+                self._evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'enabled': True,
+                'entries': len(self._entries),
+                'approx_bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': round(self._hits / lookups, 3) if lookups else 0,
+                'evictions': self._evictions
+            }
+
+    def _remove_locked(self, key):
+        _, vector = self._entries.pop(key)
+        self._bytes -= self._entry_bytes(key, vector)
+
+
+query_embedding_cache = QueryEmbeddingCache(
+    max_bytes=QUERY_EMBEDDING_CACHE_MB * 1024 * 1024,
+    ttl=QUERY_EMBEDDING_CACHE_TTL
+)
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """Embeddings wrapper that serves repeated queries from query_embedding_cache
+
+    Document embeddings (ingestion) pass straight through.
+    """
+
+    def __init__(self, base, cache):
+        self.base = base
+        self.cache = cache
+        self.model_key = str(getattr(base, 'model_name', None) or type(base).__name__)
+
+    def __getattr__(self, name):
+        if name == 'base':
+            raise AttributeError(name)
+        return getattr(self.base, name)
+
+    def embed_documents(self, texts):
+        return self.base.embed_documents(texts)
+
+    def embed_query(self, text):
+        normalized = normalize_query_text(text)
+        key = (self.model_key, normalized)
+        vector = self.cache.get(key)
+        if vector is None:
+            vector = self.base.embed_query(normalized)
+            self.cache.put(key, vector)
+        return vector
+
+    def is_cached(self, text):
+        return self.cache.contains((self.model_key, normalize_query_text(text)))
+
+
+# Single background thread for cache warm-up so it never competes with itself
+_warmup_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="query-embedding-warmup")
+
+
+def warm_query_embeddings(texts):
+    """Embed texts into the query cache in the background (e.g. suggested messages)
+
+    Already-cached texts are skipped, so this is cheap to call on every widget load.
+    """
+    layer = embeddings
+    if not isinstance(layer, CachedQueryEmbeddings):
+        return 0
+    missing = [t for t in dict.fromkeys(texts or []) if isinstance(t, str) and t.strip() and not layer.is_cached(t)]
+    if not missing:
+        return 0
+
+    def warm():
+        for text in missing:
+            try:
+                layer.embed_query(text)
+            except Exception as e:
+                print(f"⚠️ Failed to warm query embedding: {e}")
+                return
+
+    _warmup_executor.submit(warm)
+    return len(missing)
 
 
 def set_embeddings(embeddings_instance):
-    """Set the global embeddings instance"""
+    """Set the global embeddings instance
+
+    The model is wrapped for micro-batching and query caching unless disabled
+    (EMBEDDING_BATCHING / QUERY_EMBEDDING_CACHE).
+    """
+    from langchain_community.embeddings import HuggingFaceEmbeddings
     global embeddings
+    if embeddings_instance is not None and not isinstance(embeddings_instance, (BatchedEmbeddings, CachedQueryEmbeddings)):
+        if EMBEDDING_BATCHING:
+            embeddings_instance = BatchedEmbeddings(
+                embeddings_instance,
+                batch_size=EMBEDDING_BATCH_SIZE,
+                max_wait_ms=EMBEDDING_BATCH_WAIT_MS,
+                # all-MiniLM embeds queries exactly like documents, so queries can share batches
+                batch_queries=isinstance(embeddings_instance, HuggingFaceEmbeddings)
+            )
+        if QUERY_EMBEDDING_CACHE:
+            embeddings_instance = CachedQueryEmbeddings(embeddings_instance, query_embedding_cache)
     embeddings = embeddings_instance
 
 
+def load_embeddings():
+    """Load the embedding model once; concurrent callers wait for the same load
+
+    Returns:
+        The embeddings instance, or None if the model could not be loaded
+    """
+    if embeddings is not None:
+        return embeddings
+    with _embeddings_load_lock:
+        if embeddings is None:
+            from langchain_community.embeddings import HuggingFaceEmbeddings
+            set_embeddings(HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME))
+    return embeddings
+
+
+def reset_after_fork():
+    """Forget the Chroma clients inherited from the parent process (call in a forked worker)
+
+    Open vectorstores hold SQLite handles and chromadb's per-path System cache, neither
+    of which may be shared with the parent; the child reopens stores on first use.
+    """
+    vectorstore_registry.clear(close=False)
+    try:
+        from chromadb.api.shared_system_client import SharedSystemClient
+        SharedSystemClient._identifier_to_system.clear()
+    except Exception as e:
+        print(f"⚠️ Could not reset chroma client cache after fork: {e}")
+
+
+def get_embedding_stats():
+    """Get micro-batching and query-cache statistics for the embedding model"""
+    stats = {
+        'loaded': embeddings is not None,
+        'batching': {'enabled': False},
+        'query_cache': {'enabled': False}
+    }
+    layer = embeddings
+    while isinstance(layer, (BatchedEmbeddings, CachedQueryEmbeddings)):
+        if isinstance(layer, BatchedEmbeddings):
+            stats['batching'] = layer.stats()
+        else:
+            stats['query_cache'] = layer.cache.stats()
+        layer = layer.base
+    return stats
+
+
 def get_user_knowledge_base_path(user_id):
     """Get the knowledge base path for a specific user"""
     # Use absolute path to ensure it works regardless of working directory
@@ -24,23 +454,179 @@ def get_user_knowledge_base_path(user_id):
     return os.path.join(chroma_base, f"user_{user_id}")
 
 
-def get_user_vectorstore(user_id):
-    """Get or create vectorstore for specific user"""
-    global embeddings
+@contextmanager
+def user_vectorstore_in_use(user_id):
+    """Get or create the user's vectorstore (None if unavailable) for the duration of a with block
+
+    Warm tenants are served from the process-wide registry; only a cold open pays
+    for client construction, the permission walk and the collection probe. The
+    registry does not close the store before the block exits.
+    """
+    user_vectorstore = _acquire_user_vectorstore(user_id)
+    try:
+        yield user_vectorstore
+    finally:
+        if user_vectorstore is not None:
+            vectorstore_registry.release(user_id, user_vectorstore)
+
+
+def _acquire_user_vectorstore(user_id):
     if not embeddings:
-        print("❌ Embeddings not available for vectorstore - trying to initialize...")
-        # Try to initialize embeddings if not set
+        # Still loading at startup (waits for it) or failed earlier (retries)
         try:
-            from langchain_community.embeddings import HuggingFaceEmbeddings
-            embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-            set_embeddings(embeddings)
-            print("✅ Embeddings initialized on-demand")
+            load_embeddings()
         except Exception as e:
             print(f"❌ Failed to initialize embeddings: {e}")
             import traceback
             traceback.print_exc()
             return None
     
+    user_vectorstore = vectorstore_registry.acquire(user_id)
+    if user_vectorstore is not None:
+        return user_vectorstore
+    
+    with vectorstore_registry.open_lock(user_id):
+        # Another request may have opened it while we waited
+        user_vectorstore = vectorstore_registry.acquire(user_id)
+        if user_vectorstore is not None:
+            return user_vectorstore
+        
+        user_vectorstore, client, size_bytes = _open_user_vectorstore(user_id)
+        if user_vectorstore is not None:
+            vectorstore_registry.put(user_id, user_vectorstore, client=client, size_bytes=size_bytes, acquire=True)
+        return user_vectorstore
+
+
+def invalidate_user_vectorstore(user_id):
+    """Close the user's cached vectorstore so the next access reopens it from disk
+    
+    Must be called whenever the user's chroma directory is deleted or replaced
+    (reset, restore, corruption recovery).
+    """
+    _knowledge_base_replaced(user_id)
+    return vectorstore_registry.invalidate(user_id)
+
+
+def _knowledge_version_path(user_id):
+    # Kept next to the chatbot config rather than inside the chroma directory,
+    # which reset/restore delete wholesale
+    return os.path.join(os.path.dirname(get_user_chatbot_config_path(user_id)), 'knowledge_version')
+
+
+def get_knowledge_version(user_id):
+    """Get a token that changes whenever the user's knowledge base content changes
+
+    Stored on disk so every worker process sees the same version.
+    """
+    try:
+        with open(_knowledge_version_path(user_id), 'r') as f:
+            return f.read().strip() or '0'
+    except OSError:
+        return '0'
+
+
+def bump_knowledge_version(user_id):
+    """Mark the user's knowledge base as changed (ingest, delete, reset, restore)
+
+    Anything cached against the previous version (e.g. answer cache entries) stops
+    matching.
+    """
+    version = f"{time.time_ns()}-{os.getpid()}"
+    try:
+        path = _knowledge_version_path(user_id)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(version)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"⚠️ Could not update knowledge version for user {user_id}: {e}")
+    return version
+
+
+def _chunk_counter_keys(metadata):
+    """Counter keys a chunk contributes to: total, source_type, category, source_file"""
+    metadata = metadata or {}
+    max_len = KnowledgeStat.MAX_NAME_LENGTH
+    keys = [
+        ('total', ''),
+        ('source_type', str(metadata.get('source_type') or 'unknown')[:max_len]),
+        ('category', str(metadata.get('category') or 'uncategorized')[:max_len])
+    ]
+    if metadata.get('source_file'):
+        keys.append(('source_file', str(metadata['source_file'])[:max_len]))
+    return keys
+
+
+def _chunk_deltas(metadatas, sign=1, deltas=None):
+    deltas = {} if deltas is None else deltas
+    for metadata in metadatas:
+        for key in _chunk_counter_keys(metadata):
+            deltas[key] = deltas.get(key, 0) + sign
+    return deltas
+
+
+def _forget_cached_knowledge_stats(user_id):
+    with _knowledge_stats_cache_lock:
+        _knowledge_stats_cache.pop(user_id, None)
+
+
+def _record_chunk_changes(user_id, metadatas, sign):
+    if not metadatas:
+        return
+    if KnowledgeStat.apply_deltas(user_id, _chunk_deltas(metadatas, sign)) is None:
+        # Not initialized yet, so a first stats read may be counting the collection
+        # right now without these chunks. The new version makes it discard a count it
+        # has not stored yet; a count it already stored is dropped here.
+        bump_knowledge_version(user_id)
+        if KnowledgeStat.get_by_user(user_id):
+            KnowledgeStat.reset(user_id)
+    _forget_cached_knowledge_stats(user_id)
+
+
+def _knowledge_base_replaced(user_id):
+    """The user's chroma directory was deleted or replaced: recount stats lazily"""
+    KnowledgeStat.reset(user_id)
+    _forget_cached_knowledge_stats(user_id)
+    keyword_index.drop_index(user_id)
+    bump_knowledge_version(user_id)
+
+
+def add_documents_to_vectorstore(user_id, user_vectorstore, documents, ids=None):
+    """Add documents to the user's vectorstore and update the chunk counters
+
+    With explicit ids, Chroma overwrites chunks that already exist (e.g. a retried
+    ingestion job), so only ids that were not stored yet are counted.
+    """
+    existing = set()
+    if ids:
+        try:
+            existing = set(user_vectorstore._collection.get(ids=list(ids), include=[]).get('ids') or [])
+        except Exception as e:
+            print(f"⚠️ Could not check existing chunk ids, counting all as new: {e}")
+        user_vectorstore.add_documents(documents, ids=ids)
+        added = [doc.metadata for doc, doc_id in zip(documents, ids) if doc_id not in existing]
+    else:
+        ids = user_vectorstore.add_documents(documents)
+        added = [doc.metadata for doc in documents]
+    _record_chunk_changes(user_id, added, 1)
+    try:
+        keyword_index.index_documents(user_id, ids, documents)
+    except Exception as e:
+        # Dense retrieval still works; the index is rebuilt if it gets dropped
+        print(f"⚠️ Could not update keyword index for user {user_id}: {e}")
+
+
+def get_vectorstore_registry_stats():
+    """Get open-handle statistics for the vectorstore registry"""
+    return vectorstore_registry.stats()
+
+
+def _open_user_vectorstore(user_id):
+    """Open the user's vectorstore from disk
+    
+    Returns:
+        tuple: (vectorstore or None, chromadb client or None, approximate size in bytes)
+    """
     kb_path = get_user_knowledge_base_path(user_id)
     print(f"📁 Creating vectorstore for user {user_id} at: {kb_path}")
     
@@ -64,6 +650,7 @@ def get_user_vectorstore(user_id):
         
         # Step 1: Check if database exists and test if it's accessible
         if os.path.exists(kb_path):
+            test_client = None
             try:
                 # Try to create client and test access
                 test_client = chromadb.PersistentClient(path=kb_path)
@@ -73,11 +660,14 @@ def get_user_vectorstore(user_id):
             except Exception as test_error:
                 # Database exists but is corrupted or inaccessible
                 error_str = str(test_error)
+                # Drop chromadb's cached System for this path before deleting its files
+                close_chroma_client(test_client)
                 if "PanicException" in error_str or "panic" in error_str.lower() or "range" in error_str.lower() or "tenant" in error_str.lower():
                     print(f"⚠️ Database corrupted or inaccessible: {error_str[:150]}")
                     print(f"🔄 Deleting corrupted database...")
                     shutil.rmtree(kb_path, ignore_errors=True)
                     os.makedirs(kb_path, exist_ok=True)
+                    _knowledge_base_replaced(user_id)
                     client = None  # Will create fresh below
                 else:
                     # Unknown error, try to reset anyway
@@ -85,6 +675,7 @@ def get_user_vectorstore(user_id):
                     print(f"🔄 Attempting to reset database...")
                     shutil.rmtree(kb_path, ignore_errors=True)
                     os.makedirs(kb_path, exist_ok=True)
+                    _knowledge_base_replaced(user_id)
                     client = None
         
         # Step 2: Create client (fresh database or existing good one)
@@ -101,6 +692,7 @@ def get_user_vectorstore(user_id):
                     print(f"🔄 Last attempt: deleting and recreating...")
                     shutil.rmtree(kb_path, ignore_errors=True)
                     os.makedirs(kb_path, exist_ok=True)
+                    _knowledge_base_replaced(user_id)
                 try:
                     client = chromadb.PersistentClient(path=kb_path)
                     print(f"✅ PersistentClient created after reset")
@@ -108,13 +700,15 @@ def get_user_vectorstore(user_id):
                     print(f"❌ Failed to create PersistentClient even after reset: {final_error}")
                     import traceback
                     traceback.print_exc()
-                    return None
+                    return None, None, 0
         
         # Step 3: Create Chroma vectorstore (ALWAYS runs if client exists)
         if client:
             try:
                 # Ensure all subdirectories and files are writable before creating vectorstore
                 # Use more permissive permissions to avoid readonly database errors
+                # The same walk sizes the store for the registry's memory budget
+                size_bytes = 0
                 for root, dirs, files in os.walk(kb_path):
                     for d in dirs:
                         dir_path = os.path.join(root, d)
@@ -126,9 +720,11 @@ def get_user_vectorstore(user_id):
                         file_path = os.path.join(root, f)
                         try:
                             os.chmod(file_path, 0o666)
+                            size_bytes += os.path.getsize(file_path)
                         except:
                             pass
                 
+                from langchain_community.vectorstores import Chroma
                 user_vectorstore = Chroma(
                     client=client,
                     collection_name=collection_name,
@@ -142,64 +738,68 @@ def get_user_vectorstore(user_id):
                     test_collection = user_vectorstore._collection
                     if test_collection is None:
                         print(f"⚠️ Warning: Collection is None after creation")
-                        return None
+                        return None, None, 0
                     # Try a simple operation to verify it works (but don't fail if it errors)
                     try:
                         _ = test_collection.count()
                     except:
                         pass  # Count might fail on empty collection, that's OK
                     print(f"✅ Vectorstore verified and ready")
-                    return user_vectorstore
+                    return user_vectorstore, client, size_bytes
                 except Exception as verify_error:
                     print(f"⚠️ Warning: Vectorstore verification error (but returning anyway): {verify_error}")
                     # Return it anyway - it might still work
-                    return user_vectorstore
+                    return user_vectorstore, client, size_bytes
             except Exception as chroma_error:
                 print(f"❌ Error creating Chroma vectorstore: {chroma_error}")
                 import traceback
                 traceback.print_exc()
-                return None
+                return None, None, 0
         else:
             print(f"❌ No client available to create vectorstore")
-            return None
+            return None, None, 0
             
     except Exception as e:
         print(f"❌ Error creating vectorstore for user {user_id}: {e}")
         import traceback
         traceback.print_exc()
-        return None
+        return None, None, 0
 
 
 def remove_file_from_vectorstore(user_id, filename):
     """Remove all chunks related to a specific file from user's vectorstore"""
     try:
-        user_vectorstore = get_user_vectorstore(user_id)
-        if user_vectorstore is None:
-            print(f"⚠️ Vectorstore not available for user {user_id}")
-            return False
-        
-        collection = user_vectorstore._collection
-        
-        # Delete documents by metadata filter
-        try:
-            # Get all documents with this source file
-            results = collection.get(
-                where={"source_file": filename}
-            )
+        with user_vectorstore_in_use(user_id) as user_vectorstore:
+            if user_vectorstore is None:
+                print(f"⚠️ Vectorstore not available for user {user_id}")
+                return False
             
-            if results and 'ids' in results and len(results['ids']) > 0:
-                # Delete the documents
-                collection.delete(ids=results['ids'])
-                print(f"✅ Deleted {len(results['ids'])} chunks from vectorstore for file: {filename}")
-                return True
-            else:
-                print(f"ℹ️ No chunks found in vectorstore for file: {filename}")
-                return True  # File not in vectorstore is okay
+            collection = user_vectorstore._collection
+            
+            # Delete documents by metadata filter
+            try:
+                # Get all documents with this source file
+                results = collection.get(
+                    where={"source_file": filename},
+                    include=['metadatas']
+                )
                 
-        except Exception as e:
-            print(f"⚠️ Error removing file from vectorstore (may not be in vectorstore): {e}")
-            # Don't fail if file isn't in vectorstore
-            return True
+                if results and 'ids' in results and len(results['ids']) > 0:
+                    # Delete the documents
+                    collection.delete(ids=results['ids'])
+                    _record_chunk_changes(user_id, results.get('metadatas') or [], -1)
+                    keyword_index.remove_documents(user_id, results['ids'])
+                    bump_knowledge_version(user_id)
+                    print(f"✅ Deleted {len(results['ids'])} chunks from vectorstore for file: {filename}")
+                    return True
+                else:
+                    print(f"ℹ️ No chunks found in vectorstore for file: {filename}")
+                    return True  # File not in vectorstore is okay
+                    
+            except Exception as e:
+                print(f"⚠️ Error removing file from vectorstore (may not be in vectorstore): {e}")
+                # Don't fail if file isn't in vectorstore
+                return True
             
     except Exception as e:
         print(f"❌ Error removing file from vectorstore: {e}")
@@ -208,47 +808,78 @@ def remove_file_from_vectorstore(user_id, filename):
         return False
 
 
+def _count_collection_chunks(user_vectorstore, page_size=5000):
+    """Count chunks per counter key by paging through the collection's metadata"""
+    collection = user_vectorstore._collection
+    counts = {('total', ''): 0}
+    offset = 0
+    while True:
+        page = collection.get(include=['metadatas'], limit=page_size, offset=offset)
+        ids = page.get('ids') or []
+        _chunk_deltas(page.get('metadatas') or [], 1, counts)
+        if len(ids) < page_size:
+            return counts
+        offset += page_size
+
+
+def _load_chunk_counters(user_id):
+    """Get the user's chunk counters, initializing them from the collection once
+
+    Returns:
+        dict: {dimension: {name: chunk_count}}, or None if the knowledge base is unavailable
+    """
+    version = get_knowledge_version(user_id)
+    with _knowledge_stats_cache_lock:
+        cached = _knowledge_stats_cache.get(user_id)
+        if cached is not None and cached[0] == version:
+            _knowledge_stats_cache.move_to_end(user_id)
+            return cached[1]
+
+    counters = KnowledgeStat.get_by_user(user_id)
+    if counters is None:
+        return None
+    if not counters:
+        # First read for this user (or after a reset/restore): count once, then keep counters updated
+        with user_vectorstore_in_use(user_id) as user_vectorstore:
+            if user_vectorstore is None:
+                return None
+            counts = _count_collection_chunks(user_vectorstore)
+        KnowledgeStat.replace(user_id, counts)
+        if get_knowledge_version(user_id) != version:
+            # The knowledge base changed while we were counting; count again next time
+            KnowledgeStat.reset(user_id)
+        print(f"✅ Initialized knowledge stats for user {user_id}: {counts[('total', '')]} chunks")
+        counters = {}
+        for (dimension, name), count in counts.items():
+            counters.setdefault(dimension, {})[name] = count
+
+    with _knowledge_stats_cache_lock:
+        _knowledge_stats_cache[user_id] = (version, counters)
+        _knowledge_stats_cache.move_to_end(user_id)
+        while len(_knowledge_stats_cache) > KNOWLEDGE_STATS_CACHE_SIZE:
+            _knowledge_stats_cache.popitem(last=False)
+    return counters
+
+
 def get_knowledge_stats(user_id):
-    """Get knowledge base statistics for a user"""
+    """Get knowledge base statistics for a user
+
+    Chunk counts come from the knowledge_stats counters maintained on ingest and
+    delete, so the vector collection is never loaded to answer this.
+    """
     try:
-        user_vectorstore = get_user_vectorstore(user_id)
-        doc_count = 0
-        db_status = "unknown"
-        
-        if user_vectorstore:
-            try:
-                # Method 1: Try to get count directly from ChromaDB collection (most reliable)
-                if hasattr(user_vectorstore, '_collection'):
-                    try:
-                        collection = user_vectorstore._collection
-                        # Get all document IDs to count
-                        results = collection.get()
-                        doc_count = len(results.get('ids', [])) if results and 'ids' in results else 0
-                        db_status = "active"
-                        print(f"✅ Got document count from collection: {doc_count}")
-                    except Exception as coll_error:
-                        print(f"⚠️ Error getting count from collection: {coll_error}")
-                        # Fallback to retriever method
-                        raise coll_error
-                else:
-                    # Method 2: Fallback to retriever method if collection not accessible
-                    retriever = user_vectorstore.as_retriever(search_kwargs={"k": 10000})
-                    # Use a generic query to retrieve all documents (k=10000 should get all)
-                    # Use invoke() instead of get_relevant_documents() for LangChain 0.3.x
-                    if hasattr(retriever, 'invoke'):
-                        test_docs = retriever.invoke("document")
-                    else:
-                        # Fallback for older LangChain versions
-                        test_docs = retriever.get_relevant_documents("document")
-                    doc_count = len(test_docs) if test_docs else 0
-                    db_status = "active"
-                    print(f"✅ Got document count from retriever: {doc_count}")
-            except Exception as e:
-                print(f"⚠️ Error checking vectorstore: {e}")
-                import traceback
-                traceback.print_exc()
-                db_status = "error"
-                doc_count = 0
+        db_status = "active"
+        try:
+            counters = _load_chunk_counters(user_id)
+            if counters is None:
+                db_status = "unknown"
+                counters = {}
+        except Exception as e:
+            print(f"⚠️ Error loading knowledge stats: {e}")
+            import traceback
+            traceback.print_exc()
+            db_status = "error"
+            counters = {}
         
         # Get file count
         from services.file_service import list_user_files
@@ -256,15 +887,17 @@ def get_knowledge_stats(user_id):
         
         # Get FAQ count
         from models.faq import FAQ
-        faqs = FAQ.get_all_by_user(user_id, status=None)  # Get all non-deleted FAQs
-        ingested_faqs = [f for f in faqs if f.get('ingested_at')]
+        faq_count, ingested_faq_count = FAQ.count_by_user(user_id)
         
         return {
-            "total_documents": max(0, doc_count),
+            "total_documents": max(0, counters.get('total', {}).get('', 0)),
             "vector_store_status": db_status,
             "uploaded_files": files,
-            "faq_count": len(faqs),
-            "ingested_faq_count": len(ingested_faqs)
+            "faq_count": faq_count,
+            "ingested_faq_count": ingested_faq_count,
+            "chunks_by_source_type": counters.get('source_type', {}),
+            "chunks_by_category": counters.get('category', {}),
+            "chunks_by_file": counters.get('source_file', {})
         }
     except Exception as e:
         print(f"❌ Stats error: {e}")
@@ -273,4 +906,3 @@ def get_knowledge_stats(user_id):
             "vector_store_status": "error",
             "uploaded_files": []
         }
-
@@ -0,0 +1,152 @@
+"""Process lifecycle - startup, fork safety and readiness
+
+Importing the app builds the Flask app and runs pending migrations - every route
+that touches the database relies on the schema, so those run before the process
+takes traffic (the model checks no longer create tables per call). The slow parts
+of startup then run as background tasks, in parallel: loading and warming the
+embedding model and creating the system LLM. The process reports ready (/health)
+once they are done, and chat requests that need the model before then wait for it.
+
+A pre-forking server (gunicorn.conf.py) imports the app once in its master so
+every worker shares the embedding model's memory copy-on-write. The master then
+loads the model up front and stays free of threads and open connections
+(FORKING_SERVER=1); each worker resets what it inherited after the fork and runs
+its own warm-up.
+"""
+import os
+import threading
+
+from utils.timing import StageTimings
+
+
+# Set by gunicorn.conf.py before the app is preloaded in the master
+FORKING_SERVER = os.getenv('FORKING_SERVER') == '1'
+
+startup_timings = StageTimings('startup')
+_ready = threading.Event()
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def _load_embedding_model():
+    from services.knowledge_service import load_embeddings
+    load_embeddings()
+
+
+def _warm_embedding_model():
+    """First inference (lazy init, page faults) and the suggested-message query cache"""
+    from services import knowledge_service
+    layer = knowledge_service.load_embeddings()
+    if layer is None:
+        return
+    layer.embed_documents(["warm up"])
+    # Default suggested messages are the most repeated queries - embed them once up front
+    from config.constants import SUGGESTED_MESSAGES
+    knowledge_service.warm_query_embeddings(SUGGESTED_MESSAGES)
+
+
+def _run_migrations():
+    from migrations import run_migrations
+    run_migrations()
+
+
+def _create_system_llm(app):
+    """Default system LLM (system-level features and fallback when a user's LLM fails)"""
+    from services.llm_service import LLMProvider
+    try:
+        app.config['LLM'] = LLMProvider.get_default_llm(temperature=0.3, max_tokens=2000)
+        print(f"🤖 Using OpenAI model: gpt-4o-mini (unified LLM service)")
+    except ValueError as e:
+        # API key not available - LLM will be created lazily when needed
+        print(f"⚠️ System LLM not initialized at startup: {e}")
+
+
+def _startup_complete():
+    startup_timings.finish()
+    _ready.set()
+    report = ", ".join(f"{stage} {ms:.0f}ms" for stage, ms in startup_timings.as_dict().items())
+    print(f"🚀 Ready (pid {os.getpid()}): {report}")
+
+
+def _run_task(name, fn, *args):
+    try:
+        startup_timings.timed(name, fn, *args)
+    except Exception as e:
+        print(f"⚠️ Startup task {name} failed: {e}")
+    finally:
+        with _pending_lock:
+            _pending.discard(name)
+            done = not _pending
+        if done:
+            _startup_complete()
+
+
+def _start_tasks(tasks):
+    """Run (name, fn, *args) startup tasks concurrently; ready once all have finished"""
+    with _pending_lock:
+        _pending.update(task[0] for task in tasks)
+    for task in tasks:
+        threading.Thread(target=_run_task, args=task, name=f"startup-{task[0]}", daemon=True).start()
+
+
+def begin_startup(started):
+    """Time the startup report from started (perf_counter taken before the app's imports)"""
+    global startup_timings
+    startup_timings = StageTimings('startup', started=started)
+
+
+def preload_embedding_model():
+    """Load the embedding model now, in a pre-fork master, so workers share it"""
+    startup_timings.timed('embedding_model', _load_embedding_model)
+
+
+def start_background_work(app, migrate=True):
+    """Run pending migrations, then start this process's ingestion workers and its parallel startup tasks
+
+    Args:
+        app: Flask app (receives the system LLM)
+        migrate: Run migrations first, before returning (a pre-fork master already did)
+    """
+    from services.ingestion_service import start_ingestion_workers
+    from services.transcript_buffer import start_transcript_flusher
+    if migrate:
+        # Not a background task: requests must not reach tables or indexes that do not exist yet
+        try:
+            startup_timings.timed('migrations', _run_migrations)
+        except Exception as e:
+            print(f"⚠️ Startup task migrations failed: {e}")
+    # 📥 INGESTION_WORKERS=0 disables the workers in this process
+    start_ingestion_workers()
+    # 💬 Only with TRANSCRIPT_WRITE_BEHIND=true (also replays spill files of dead processes)
+    start_transcript_flusher()
+
+    _start_tasks([('embedding_model', _warm_embedding_model), ('system_llm', _create_system_llm, app)])
+
+
+def after_fork(app):
+    """Reset state inherited from the master in a forked worker, then start its background work"""
+    global startup_timings
+    import db_pool
+    from services import knowledge_service
+    db_pool.reset_after_fork()
+    knowledge_service.reset_after_fork()
+    startup_timings = StageTimings('startup')
+    start_background_work(app, migrate=False)
+
+
+def before_exit():
+    """Let the ingestion workers finish their current job and flush queued chat messages before the process exits"""
+    from services.ingestion_service import worker_pool
+    from services.transcript_buffer import stop_transcript_flusher
+    worker_pool.stop()
+    stop_transcript_flusher()
+
+
+def is_ready():
+    """Whether this process has finished its startup tasks"""
+    return _ready.is_set()
+
+
+def get_startup_report():
+    """Startup stage durations in ms (complete once the process is ready)"""
+    return startup_timings.as_dict()
@@ -1,11 +1,115 @@
 """Unified LLM Service - Factory pattern for multiple providers"""
-from langchain_openai import ChatOpenAI
+from collections import OrderedDict
+import hashlib
 import os
+import threading
+import time
+
+
+# Environment variable holding each provider's API key
+PROVIDER_API_KEY_ENV = {
+    'openai': 'OPENAI_API_KEY',
+    'claude': 'ANTHROPIC_API_KEY',
+    'gemini': 'GOOGLE_API_KEY',
+    'deepseek': 'DEEPSEEK_API_KEY',
+    'groq': 'GROQ_API_KEY',
+    'together': 'TOGETHER_API_KEY'
+}
+
+# Base URLs of OpenAI-compatible providers (None = OpenAI default)
+OPENAI_COMPATIBLE_BASE_URLS = {
+    'openai': None,
+    'deepseek': 'https://api.deepseek.com/v1'
+}
+
+# Client cache - LLM objects are reused across requests so their HTTP
+# connection pools (and TLS sessions) stay warm
+LLM_CACHE_MAX_SIZE = int(os.getenv('LLM_CACHE_MAX_SIZE', 64))
+# invalidate_cache() only reaches this process: other workers pick up a rotated
+# system key when their entry expires, so keep this short (a refresh is two
+# indexed SELECTs)
+SYSTEM_KEY_CACHE_TTL = int(os.getenv('SYSTEM_KEY_CACHE_TTL', 15))
+
+_llm_cache = OrderedDict()  # cache key -> (llm, provider, api_key_hash)
+_system_key_cache = {}  # provider -> (api_key, expires_at)
+_http_clients = {}  # base_url -> shared httpx.Client
+_cache_lock = threading.Lock()
+_cache_stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+
+
+def _hash_api_key(api_key):
+    """Hash an API key for use in cache keys (never keep raw keys in keys/stats)"""
+    return hashlib.sha256((api_key or '').encode()).hexdigest()[:16]
+
+
+def _get_shared_http_client(base_url):
+    """Get a keep-alive httpx client shared by all OpenAI-compatible LLMs on base_url"""
+    with _cache_lock:
+        client = _http_clients.get(base_url)
+        if client is None:
+            try:
+                import httpx
+                client = httpx.Client(
+                    timeout=httpx.Timeout(float(os.getenv('LLM_HTTP_TIMEOUT', 60)), connect=10.0),
+                    limits=httpx.Limits(
+                        max_connections=int(os.getenv('LLM_HTTP_MAX_CONNECTIONS', 100)),
+                        max_keepalive_connections=int(os.getenv('LLM_HTTP_MAX_KEEPALIVE', 20)),
+                        keepalive_expiry=float(os.getenv('LLM_HTTP_KEEPALIVE_EXPIRY', 120))
+                    )
+                )
+            except Exception as e:
+                print(f"⚠️ Shared HTTP client unavailable, using per-LLM client: {e}")
+                return None
+            _http_clients[base_url] = client
+        return client
 
 
 class LLMProvider:
     """Unified interface for all LLM providers"""
     
+    @staticmethod
+    def resolve_api_key(provider="openai"):
+        """
+        Resolve the system API key for a provider
+        
+        OpenAI keys come from the database (default, then fallback) and then .env;
+        other providers read their environment variable. Database lookups are cached
+        for SYSTEM_KEY_CACHE_TTL seconds and dropped by invalidate_cache() (in this
+        process; other workers see a new key once their entry expires).
+        
+        Args:
+            provider: Provider name
+        
+        Returns:
+            str: API key, or "" if none is configured
+        """
+        if provider != "openai":
+            env_var = PROVIDER_API_KEY_ENV.get(provider, f"{provider.upper()}_API_KEY")
+            return os.getenv(env_var, "")
+        
+        with _cache_lock:
+            cached = _system_key_cache.get(provider)
+        if cached and cached[1] > time.monotonic():
+            return cached[0]
+        
+        api_key = None
+        # Try database first (default, then fallback), then .env
+        try:
+            from models.api_key import AdminAPIKey
+            api_key = AdminAPIKey.get_system_api_key(key_type='default', provider='openai')
+            if not api_key:
+                api_key = AdminAPIKey.get_system_api_key(key_type='fallback', provider='openai')
+        except Exception as e:
+            print(f"Error getting API key from database: {e}")
+        
+        # Fallback to .env if not in database
+        if not api_key:
+            api_key = os.getenv("OPENAI_API_KEY", "")
+        
+        with _cache_lock:
+            _system_key_cache[provider] = (api_key, time.monotonic() + SYSTEM_KEY_CACHE_TTL)
+        return api_key
+    
     @staticmethod
     def get_llm(provider="openai", model=None, api_key=None, temperature=0.3, max_tokens=2000, **kwargs):
         """
@@ -28,31 +132,7 @@ class LLMProvider:
         
         # Get API key from parameter or environment (provider-specific)
         if not api_key:
-            if provider == "openai":
-                # Try database first (default, then fallback), then .env
-                try:
-                    from models.api_key import AdminAPIKey
-                    api_key = AdminAPIKey.get_system_api_key(key_type='default', provider='openai')
-                    if not api_key:
-                        api_key = AdminAPIKey.get_system_api_key(key_type='fallback', provider='openai')
-                except Exception as e:
-                    print(f"Error getting API key from database: {e}")
-                
-                # Fallback to .env if not in database
-                if not api_key:
-                    api_key = os.getenv("OPENAI_API_KEY", "")
-            elif provider == "claude":
-                api_key = os.getenv("ANTHROPIC_API_KEY", "")
-            elif provider == "gemini":
-                api_key = os.getenv("GOOGLE_API_KEY", "")
-            elif provider == "deepseek":
-                api_key = os.getenv("DEEPSEEK_API_KEY", "")
-            elif provider == "groq":
-                api_key = os.getenv("GROQ_API_KEY", "")
-            elif provider == "together":
-                api_key = os.getenv("TOGETHER_API_KEY", "")
-            else:
-                api_key = os.getenv(f"{provider.upper()}_API_KEY", "")
+            api_key = LLMProvider.resolve_api_key(provider)
         
         if not api_key:
             raise ValueError(f"API key required for {provider}. Set {provider.upper()}_API_KEY environment variable or pass api_key parameter.")
@@ -66,6 +146,11 @@ class LLMProvider:
         
         # Initialize provider-specific LLM
         if provider == "openai":
+            from langchain_openai import ChatOpenAI
+            if 'http_client' not in kwargs:
+                http_client = _get_shared_http_client(OPENAI_COMPATIBLE_BASE_URLS['openai'])
+                if http_client is not None:
+                    kwargs['http_client'] = http_client
             return ChatOpenAI(
                 model=model,
                 api_key=api_key,
@@ -129,10 +214,15 @@ class LLMProvider:
         
         elif provider == "deepseek":
             # Uses OpenAI-compatible API
+            from langchain_openai import ChatOpenAI
+            if 'http_client' not in kwargs:
+                http_client = _get_shared_http_client(OPENAI_COMPATIBLE_BASE_URLS['deepseek'])
+                if http_client is not None:
+                    kwargs['http_client'] = http_client
             return ChatOpenAI(
                 model=model,
                 api_key=api_key,
-                base_url="https://api.deepseek.com/v1",
+                base_url=OPENAI_COMPATIBLE_BASE_URLS['deepseek'],
                 temperature=temperature,
                 max_tokens=max_tokens,
                 **kwargs
@@ -184,4 +274,90 @@ class LLMProvider:
             max_tokens=max_tokens,
             **kwargs
         )
-
+    
+    @staticmethod
+    def get_cached_llm(provider="openai", model=None, api_key=None, temperature=0.3, max_tokens=2000, **kwargs):
+        """
+        Get a reusable LLM instance, building it only on first use
+        
+        Instances are cached by (provider, model, API key hash, sampling params) so
+        repeated chat turns skip key lookups, object construction and TLS handshakes.
+        Takes the same arguments as get_llm().
+        
+        Returns:
+            LangChain LLM instance
+        """
+        if not provider:
+            provider = "openai"
+        if not model and provider == "openai":
+            model = "gpt-4o-mini"
+        if not api_key:
+            api_key = LLMProvider.resolve_api_key(provider)
+        
+        key_hash = _hash_api_key(api_key)
+        cache_key = (provider, model, key_hash, temperature, max_tokens, tuple(sorted(kwargs.items())))
+        
+        with _cache_lock:
+            entry = _llm_cache.get(cache_key)
+            if entry is not None:
+                _llm_cache.move_to_end(cache_key)
+                _cache_stats['hits'] += 1
+                return entry[0]
+            _cache_stats['misses'] += 1
+        
+        llm = LLMProvider.get_llm(
+            provider=provider,
+            model=model,
+            api_key=api_key,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            **kwargs
+        )
+        
+        with _cache_lock:
+            _llm_cache[cache_key] = (llm, provider, key_hash)
+            _llm_cache.move_to_end(cache_key)
+            while len(_llm_cache) > LLM_CACHE_MAX_SIZE:
+                _llm_cache.popitem(last=False)
+                _cache_stats['evictions'] += 1
+        return llm
+    
+    @staticmethod
+    def invalidate_cache(provider=None, api_key=None):
+        """
+        Drop cached LLM instances (and cached system keys) after a key change
+        
+        Args:
+            provider: Only drop entries for this provider (None = all providers)
+            api_key: Only drop entries built with this key (None = any key)
+        
+        Returns:
+            int: Number of cached LLM instances dropped
+        """
+        key_hash = _hash_api_key(api_key) if api_key else None
+        with _cache_lock:
+            if provider:
+                _system_key_cache.pop(provider, None)
+            else:
+                _system_key_cache.clear()
+            
+            stale = [
+                k for k, (_, entry_provider, entry_key_hash) in _llm_cache.items()
+                if (provider is None or entry_provider == provider)
+                and (key_hash is None or entry_key_hash == key_hash)
+            ]
+            for k in stale:
+                del _llm_cache[k]
+            _cache_stats['invalidations'] += len(stale)
+        return len(stale)
+    
+    @staticmethod
+    def get_cache_stats():
+        """Get LLM client cache statistics"""
+        with _cache_lock:
+            return {
+                'size': len(_llm_cache),
+                'max_size': LLM_CACHE_MAX_SIZE,
+                'http_clients': len(_http_clients),
+                **_cache_stats
+            }
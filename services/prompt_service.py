@@ -0,0 +1,224 @@
+"""Precompiled per-tenant chat prompts
+
+Everything in a chat prompt that depends only on the tenant's chatbot config (bot
+name, prompt template, system instructions, response style) is built once and
+cached. A chat turn only fills in the retrieved context, conversation history,
+visitor name and question.
+
+The compiled prompt keeps its static text up front: for knowledge-base answers the
+prompt starts with the system block followed by the template up to its {context}
+placeholder. That prefix is byte-identical for every turn of a tenant without a
+visitor name, so provider side prompt caching can reuse it. Conversation history
+goes right before the question instead of before the template; the name
+instruction stays where it always was, between the system block and the template.
+"""
+import os
+import re
+import string
+import threading
+from collections import OrderedDict
+
+from utils.prompts import get_default_prompt_with_name
+
+
+PROMPT_CACHE_SIZE = int(os.getenv('PROMPT_CACHE_SIZE', 1024))
+
+STYLE_INSTRUCTIONS = {
+    'concise': "Be brief and to the point. Keep responses under 100 words.",
+    'balanced': "Provide balanced, informative responses. Be helpful and clear.",
+    'detailed': "Provide comprehensive, detailed responses. Include examples when helpful.",
+    'creative': "Be creative and engaging. Use storytelling when appropriate."
+}
+
+CONVERSATION_BLOCK = (
+    "\n\n--- CONVERSATION CONTEXT ---"
+    "\nYou are having an ongoing conversation with the user. Below is the previous conversation history."
+    "\nIMPORTANT: Use this context to understand references like 'their', 'it', 'that', 'they', etc."
+    "\nIf the user says 'their phone number' and the previous conversation was about Person 1, they are referring to Person 1's phone number."
+    "\n\nPrevious Conversation History:\n{history}"
+    "\n--- END CONVERSATION CONTEXT ---\n"
+)
+
+NAME_INSTRUCTION = (
+    "\n\nIMPORTANT: The user's name is {name}. When appropriate, address them by name "
+    "at the beginning of your response (e.g., '{name}, I can assist you...')."
+)
+
+CRITICAL_INSTRUCTIONS = (
+    "\n\nCRITICAL INSTRUCTIONS:"
+    "\n- Respond in plain text ONLY. NO HTML, NO code blocks."
+    "\n- Be helpful and friendly."
+    "\n- When the knowledge base contains contact information (phone numbers, email addresses, physical addresses, website URLs, booking links), ALWAYS include them in your response."
+    "\n- If the user asks about reservations, bookings, or how to contact, provide the exact contact information from the knowledge base."
+    "\n- Include website links, phone numbers, and email addresses when available in the context."
+    "\n- Format contact information clearly (e.g., 'Phone: +1-555-1234', 'Email: info@example.com', 'Website: https://example.com')."
+)
+
+_CONTEXT, _QUESTION = 'context', 'question'
+
+_prompt_cache = OrderedDict()  # (user_id, prompt config) -> CompiledPrompt
+_prompt_cache_lock = threading.Lock()
+_prompt_cache_stats = {'hits': 0, 'compiles': 0}
+
+
+def _replace_bot_name(prompt_text: str, bot_name: str) -> str:
+    """Replace any hardcoded 'Cortex' tokens with the current bot name."""
+    if not prompt_text or not bot_name:
+        return prompt_text
+
+    # Replace possessive first to avoid partial overlaps
+    prompt_text = re.sub(r"\bCortex's\b", f"{bot_name}'s", prompt_text)
+    # Replace any remaining standalone occurrences (case-sensitive, boundary-aware)
+    prompt_text = re.sub(r"\bCortex\b", bot_name, prompt_text)
+    # Replace placeholder tokens
+    prompt_text = prompt_text.replace('{bot_name}', bot_name)
+    # Fallback: replace any remaining case-insensitive occurrences (safety net)
+    if bot_name.lower() != 'cortex':
+        prompt_text = re.sub(r"cortex", bot_name, prompt_text, flags=re.IGNORECASE)
+    return prompt_text
+
+
+def _parse_template(template_text):
+    """Split a str.format template into literal text and {context}/{question} slots
+
+    Raises KeyError/ValueError where str.format(context=..., question=...) would fail.
+    """
+    parts = []
+    for literal, field, spec, conversion in string.Formatter().parse(template_text):
+        if literal:
+            parts.append(literal)
+        if field is None:
+            continue
+        if field not in (_CONTEXT, _QUESTION):
+            raise KeyError(field)
+        if spec or conversion:
+            raise ValueError(f"Unsupported format for {{{field}}} in prompt template")
+        parts.append((field,))
+    return parts
+
+
+class CompiledPrompt:
+    """A tenant's chat prompt with only the per-turn slots left open"""
+
+    __slots__ = ('system', 'rag_head', 'rag_parts', 'question_at', 'template_error')
+
+    def __init__(self, bot_name, template_text, system_instructions, response_style):
+        system = f"You are {bot_name}, an intelligent AI assistant."
+        if system_instructions:
+            system += f"\n\nAdditional Instructions: {system_instructions}"
+        if response_style in STYLE_INSTRUCTIONS:
+            system += f"\n\nResponse Style: {STYLE_INSTRUCTIONS[response_style]}"
+        self.system = system
+
+        # A broken template only fails turns that use it (those with knowledge base context)
+        self.template_error = None
+        try:
+            parts = _parse_template(template_text)
+        except (KeyError, ValueError) as e:
+            self.template_error = e
+            parts = []
+        # Static prefix: the system block (then the name instruction, if any) and the
+        # template up to its first slot
+        head = []
+        while parts and isinstance(parts[0], str):
+            head.append(parts.pop(0))
+        self.rag_head = "\n" + "".join(head)
+        self.rag_parts = parts
+        # History goes before the text that introduces the question
+        self.question_at = len(parts)
+        for i, part in enumerate(parts):
+            if part == (_QUESTION,):
+                self.question_at = i - 1 if i > 0 and isinstance(parts[i - 1], str) else i
+                break
+
+    def render(self, question, context="", history="", name=None):
+        """Fill in one turn
+
+        Args:
+            question: The user's message
+            context: Knowledge base context ("" answers without the template)
+            history: Formatted conversation history ("" for none)
+            name: Visitor name (None or "User" for none)
+
+        Returns:
+            str: Full prompt
+        """
+        conversation = CONVERSATION_BLOCK.format(history=history) if history else ""
+        name_instruction = NAME_INSTRUCTION.format(name=name) if name and name != "User" else ""
+
+        if not context:
+            # No knowledge base context - ask the LLM directly
+            return (f"{self.system}{conversation}{name_instruction}\nUser ({name}) asks: {question}"
+                    f"{CRITICAL_INSTRUCTIONS}")
+
+        if self.template_error is not None:
+            raise self.template_error
+        out = [self.system, name_instruction, self.rag_head]
+        for i, part in enumerate(self.rag_parts):
+            if i == self.question_at:
+                out.append(conversation)
+            if isinstance(part, str):
+                out.append(part)
+            else:
+                out.append(context if part[0] == _CONTEXT else question)
+        if self.question_at >= len(self.rag_parts):
+            out.append(conversation)
+        out.append(CRITICAL_INSTRUCTIONS)
+        return "".join(out)
+
+
+def get_compiled_prompt(user_id, user_config):
+    """Get the user's compiled prompt, compiling it on the first use of this config
+
+    Args:
+        user_id: User ID
+        user_config: The user's chatbot config (load_user_chatbot_config())
+
+    Returns:
+        CompiledPrompt
+    """
+    bot_name = user_config.get('bot_name', 'Cortex')
+    key = (
+        user_id,
+        bot_name,
+        user_config.get('prompt'),
+        user_config.get('system_instructions', ''),
+        user_config.get('response_style', 'balanced')
+    )
+    with _prompt_cache_lock:
+        compiled = _prompt_cache.get(key)
+        if compiled is not None:
+            _prompt_cache.move_to_end(key)
+            _prompt_cache_stats['hits'] += 1
+            return compiled
+
+    user_prompt_template = key[2]
+    if user_prompt_template:
+        print(f" Compiling custom prompt for user {user_id} (length: {len(user_prompt_template)})")
+        template_text = user_prompt_template
+    else:
+        print(f" Compiling default prompt for user {user_id}")
+        template_text = get_default_prompt_with_name(bot_name)
+    # Normalize bot name usage in the prompt (handles placeholders and hardcoded names)
+    template_text = _replace_bot_name(template_text, bot_name)
+    compiled = CompiledPrompt(bot_name, template_text, key[3], key[4])
+
+    with _prompt_cache_lock:
+        _prompt_cache_stats['compiles'] += 1
+        # One compiled prompt per tenant: drop the one built for their previous config
+        for stale in [k for k in _prompt_cache if k[0] == user_id]:
+            del _prompt_cache[stale]
+        _prompt_cache[key] = compiled
+        while len(_prompt_cache) > PROMPT_CACHE_SIZE:
+            _prompt_cache.popitem(last=False)
+    return compiled
+
+
+def get_prompt_cache_stats():
+    """Get compiled prompt cache statistics"""
+    with _prompt_cache_lock:
+        return {
+            'size': len(_prompt_cache),
+            'max_size': PROMPT_CACHE_SIZE,
+            **_prompt_cache_stats
+        }
@@ -0,0 +1,421 @@
+"""Write-behind buffer for chat transcripts
+
+With TRANSCRIPT_WRITE_BEHIND=true a chat turn's messages are not written to the
+database on the request path. They are appended to this process's spill file (an
+append-only JSON lines file in TRANSCRIPT_SPILL_DIR) and queued in memory; a
+flusher thread writes the queue every TRANSCRIPT_FLUSH_INTERVAL seconds, or as
+soon as TRANSCRIPT_FLUSH_BATCH messages are waiting, with one multi-row INSERT
+per batch and one counter update per conversation.
+
+conversation_service.get_conversation_history() merges in this process's queued
+messages, so the next turn's history (and build_conversation_context()) sees
+them. Other processes see them once they are flushed, so a conversation whose
+turns land on different workers can miss the latest turn for up to one flush
+interval. Queued messages have no id yet.
+
+Durability: a message is in the spill file before it is queued. A marker line is
+appended after each committed batch, and the file is emptied whenever the queue
+drains. Each process holds a lock on its own spill file; on startup a process
+replays the spill files nobody holds a lock on (processes that died with
+messages queued). A crash right after a commit can replay that batch, so
+messages are written at least once.
+
+The queue is bounded (TRANSCRIPT_BUFFER_SIZE messages): when it is full, writers
+wait for the flusher, so a slow database slows chats down instead of growing
+memory without bound.
+"""
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from datetime import datetime
+
+from models.message import Message
+
+try:
+    import fcntl
+except ImportError:  # Windows: spill files of dead processes are not replayed
+    fcntl = None
+
+
+TRANSCRIPT_WRITE_BEHIND = os.getenv('TRANSCRIPT_WRITE_BEHIND', 'false').lower() == 'true'
+TRANSCRIPT_BUFFER_SIZE = int(os.getenv('TRANSCRIPT_BUFFER_SIZE', 10000))        # queued messages per process
+TRANSCRIPT_FLUSH_INTERVAL = float(os.getenv('TRANSCRIPT_FLUSH_INTERVAL', 0.2))  # seconds
+TRANSCRIPT_FLUSH_BATCH = int(os.getenv('TRANSCRIPT_FLUSH_BATCH', 100))          # messages per INSERT
+TRANSCRIPT_SPILL_DIR = os.getenv('TRANSCRIPT_SPILL_DIR', './data/transcripts')
+TRANSCRIPT_SPILL_FSYNC = os.getenv('TRANSCRIPT_SPILL_FSYNC', 'false').lower() == 'true'
+TRANSCRIPT_MAX_ATTEMPTS = int(os.getenv('TRANSCRIPT_MAX_ATTEMPTS', 5))          # before a batch is written row by row
+TRANSCRIPT_RETRY_BACKOFF = float(os.getenv('TRANSCRIPT_RETRY_BACKOFF', 1))      # seconds, doubled per failure
+
+
+class _Pending:
+    """One queued message"""
+
+    __slots__ = ('seq', 'message', 'title')
+
+    def __init__(self, seq, message, title):
+        self.seq = seq
+        self.message = message
+        self.title = title
+
+    def to_json(self):
+        message = self.message
+        return json.dumps({
+            'seq': self.seq,
+            'conversation_id': message.conversation_id,
+            'role': message.role,
+            'content': message.content,
+            'metadata': message.metadata or None,
+            'created_at': message.created_at.isoformat(),
+            'title': self.title
+        })
+
+
+class TranscriptBuffer:
+    """Bounded in-process queue of chat messages, flushed to the database in batches"""
+
+    def __init__(self, spill_dir, max_messages=10000, flush_interval=0.2, batch_size=100):
+        self.spill_dir = spill_dir
+        self.max_messages = max_messages
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._cond = threading.Condition()
+        self._queue = deque()           # _Pending not yet taken by the flusher
+        self._inflight = []             # _Pending being written
+        self._by_conversation = {}      # conversation_id -> deque of its _Pending (queued and in flight)
+        self._generation = 0            # bumped when a batch is committed
+        self._seq = 0
+        self._pid = None
+        self._thread = None
+        self._spill = None
+        self._spill_path = None
+        self._stopping = False
+        self._atexit_registered = False
+        self._stats = {'queued': 0, 'flushed': 0, 'batches': 0, 'failures': 0, 'dropped': 0,
+                       'replayed': 0, 'waits': 0, 'spill_errors': 0}
+
+    def start(self):
+        """Open this process's spill file and start the flusher (idempotent; restarts it in a forked child)"""
+        with self._cond:
+            self._start_locked()
+
+    def _start_locked(self):
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        if self._pid != os.getpid():
+            # Forked child: the queue and the spill file belong to the parent
+            self._queue.clear()
+            self._inflight = []
+            self._by_conversation = {}
+            self._spill = None
+        self._pid = os.getpid()
+        self._stopping = False
+        if self._spill is None:
+            self._open_spill()
+        self._thread = threading.Thread(target=self._run, name="transcript-flusher", daemon=True)
+        self._thread.start()
+        if not self._atexit_registered:
+            self._atexit_registered = True
+            atexit.register(self.stop)
+        print(f"✅ Transcript write-behind enabled (flush every {self.flush_interval}s, spill file {self._spill_path})")
+
+    def _open_spill(self):
+        try:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            self._spill_path = os.path.join(self.spill_dir, f"transcripts-{os.getpid()}-{uuid.uuid4().hex[:8]}.jsonl")
+            self._spill = open(self._spill_path, 'a', encoding='utf-8')
+            if fcntl is not None:
+                # Held until this process exits: marks the file as in use for replay_orphans()
+                fcntl.flock(self._spill.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError as e:
+            self._stats['spill_errors'] += 1
+            self._spill = None
+            print(f"⚠️ Transcript spill file unavailable, queued messages are memory-only: {e}")
+
+    def _spill_write(self, lines):
+        if self._spill is None:
+            return
+        try:
+            self._spill.write("".join(line + "\n" for line in lines))
+            self._spill.flush()
+            if TRANSCRIPT_SPILL_FSYNC:
+                os.fsync(self._spill.fileno())
+        except OSError as e:
+            self._stats['spill_errors'] += 1
+            print(f"⚠️ Could not write transcript spill file: {e}")
+
+    def append(self, conversation_id, entries, title=None):
+        """Queue messages of one conversation
+
+        Args:
+            conversation_id: Conversation ID
+            entries: List of (role, content, metadata) tuples, in order
+            title: Title to set if the conversation has none yet
+
+        Returns:
+            list: The queued Message objects (id is None until flushed)
+        """
+        now = Message.new_timestamp()
+        return self._enqueue([(conversation_id, role, content, metadata, now, title)
+                              for role, content, metadata in entries])
+
+    def _enqueue(self, items, wait=True):
+        with self._cond:
+            self._start_locked()
+            # Backpressure: wait for the flusher rather than grow past the bound
+            while wait and (self._queue or self._inflight) and not self._stopping and \
+                    len(self._queue) + len(self._inflight) + len(items) > self.max_messages:
+                self._stats['waits'] += 1
+                self._cond.notify_all()
+                self._cond.wait(1)
+
+            pending = []
+            for conversation_id, role, content, metadata, created_at, title in items:
+                self._seq += 1
+                message = Message(None, conversation_id, role, content, created_at=created_at, metadata=metadata)
+                pending.append(_Pending(self._seq, message, title))
+            # Spill file first: a message is durable before anyone can read it back
+            self._spill_write([p.to_json() for p in pending])
+            for p in pending:
+                self._queue.append(p)
+                self._by_conversation.setdefault(p.message.conversation_id, deque()).append(p)
+            self._stats['queued'] += len(pending)
+            if len(self._queue) == len(pending) or len(self._queue) >= self.batch_size:
+                self._cond.notify_all()
+            return [p.message for p in pending]
+
+    def read_through(self, conversation_id, limit, read_fn):
+        """Recent messages of a conversation: stored ones (read_fn(limit)) followed by queued ones
+
+        Args:
+            conversation_id: Conversation ID
+            limit: Maximum number of messages
+            read_fn: Reads the latest stored messages, chronological
+
+        Returns:
+            list: Message objects, chronological
+        """
+        stored = []
+        for _ in range(3):
+            with self._cond:
+                generation = self._generation
+                pending = [p.message for p in self._by_conversation.get(conversation_id, ())]
+            if len(pending) >= limit:
+                return pending[-limit:]
+            stored = read_fn(limit - len(pending)) if pending else read_fn(limit)
+            # A batch committed during the read may be in both lists: read again
+            if not pending or self._generation == generation:
+                break
+        return (stored + pending)[-limit:]
+
+    def pending_count(self, conversation_id):
+        """Number of a conversation's messages not written to the database yet"""
+        with self._cond:
+            return len(self._by_conversation.get(conversation_id, ()))
+
+    def discard(self, conversation_id):
+        """Drop a conversation's queued messages (it is being deleted)"""
+        with self._cond:
+            queued = self._by_conversation.get(conversation_id)
+            if not queued:
+                return
+            inflight = [p for p in queued if p in self._inflight]
+            self._queue = deque(p for p in self._queue if p.message.conversation_id != conversation_id)
+            if inflight:
+                self._by_conversation[conversation_id] = deque(inflight)
+            else:
+                del self._by_conversation[conversation_id]
+
+    def _run(self):
+        self.replay_orphans()
+        failures = 0
+        while True:
+            with self._cond:
+                if not self._queue:
+                    if self._stopping:
+                        return
+                    self._cond.wait()
+                elif len(self._queue) < self.batch_size and not self._stopping:
+                    self._cond.wait(self.flush_interval)
+                if not self._queue:
+                    continue
+                batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+                self._inflight = batch
+
+            try:
+                written = self._write(batch, failures + 1 >= TRANSCRIPT_MAX_ATTEMPTS)
+            except Exception:
+                import traceback
+                traceback.print_exc()
+                written = False
+            with self._cond:
+                if written:
+                    failures = 0
+                    self._committed(batch)
+                else:
+                    failures += 1
+                    self._stats['failures'] += 1
+                    # Put the batch back in front, in order
+                    self._queue.extendleft(reversed(batch))
+                self._inflight = []
+                self._cond.notify_all()
+                stopping = self._stopping
+            if not written:
+                if stopping:
+                    print(f"⚠️ Transcript flush failed while stopping: {len(self._queue)} message(s) left in {self._spill_path}")
+                    return
+                time.sleep(min(TRANSCRIPT_RETRY_BACKOFF * (2 ** (failures - 1)), 60))
+
+    def _write(self, batch, row_by_row):
+        """Write a batch; after repeated failures, per conversation, dropping what still fails"""
+        rows = []
+        conversations = OrderedDict()
+        for p in batch:
+            message = p.message
+            rows.append((message.conversation_id, message.role, message.content, message.metadata, message.created_at))
+            count, title = conversations.get(message.conversation_id, (0, None))
+            conversations[message.conversation_id] = (count + 1, title or p.title)
+        if Message.insert_batch(rows, conversations):
+            return True
+        if not row_by_row:
+            return False
+
+        # e.g. a conversation deleted while its messages were queued
+        for conversation_id, (count, title) in conversations.items():
+            entries = [(p.message.role, p.message.content, p.message.metadata)
+                       for p in batch if p.message.conversation_id == conversation_id]
+            if not Message.append_to_conversation(conversation_id, entries, title=title):
+                with self._cond:
+                    self._stats['dropped'] += count
+                print(f"❌ Dropped {count} queued message(s) of conversation {conversation_id}")
+        return True
+
+    def _committed(self, batch):
+        """Forget a written batch (called with the lock held)"""
+        for p in batch:
+            queued = self._by_conversation.get(p.message.conversation_id)
+            if queued:
+                queued.popleft()
+                if not queued:
+                    del self._by_conversation[p.message.conversation_id]
+        self._generation += 1
+        self._stats['flushed'] += len(batch)
+        self._stats['batches'] += 1
+        if self._spill is None:
+            return
+        try:
+            if self._queue:
+                self._spill_write([json.dumps({'flushed': batch[-1].seq})])
+            else:
+                # Everything is in the database
+                self._spill.truncate(0)
+        except OSError as e:
+            self._stats['spill_errors'] += 1
+            print(f"⚠️ Could not update transcript spill file: {e}")
+
+    def replay_orphans(self):
+        """Queue the unflushed messages of spill files left behind by dead processes"""
+        if fcntl is None:
+            return
+        for path in sorted(glob.glob(os.path.join(self.spill_dir, 'transcripts-*.jsonl'))):
+            if path == self._spill_path:
+                continue
+            try:
+                with open(path, 'r+', encoding='utf-8') as f:
+                    try:
+                        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except OSError:
+                        continue  # Its process is alive (or another process is replaying it)
+                    items = _read_spill(f)
+                    if items:
+                        # Runs on the flusher thread, which must not wait for itself
+                        self._enqueue(items, wait=False)
+                        with self._cond:
+                            self._stats['replayed'] += len(items)
+                        print(f"🔄 Replaying {len(items)} unflushed message(s) from {path}")
+                    # Emptied before it is removed, for a process that opened it before the unlink
+                    f.truncate(0)
+                os.remove(path)
+            except OSError as e:
+                print(f"⚠️ Could not replay transcript spill file {path}: {e}")
+
+    def stop(self, timeout=10):
+        """Flush what is queued and stop the flusher"""
+        with self._cond:
+            if self._pid != os.getpid() or self._thread is None:
+                return
+            self._stopping = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        with self._cond:
+            if self._spill is not None and not self._queue and not self._inflight and not self._thread.is_alive():
+                # Clean exit: nothing left to replay
+                self._spill.close()
+                self._spill = None
+                try:
+                    os.remove(self._spill_path)
+                except OSError:
+                    pass
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                'pending': len(self._queue) + len(self._inflight),
+                'conversations': len(self._by_conversation),
+                'max_size': self.max_messages,
+                'flush_interval_s': self.flush_interval,
+                'alive': self._thread is not None and self._thread.is_alive()
+            })
+        return stats
+
+
+def _read_spill(f):
+    """Unflushed entries of a spill file, as _enqueue() items"""
+    entries = []
+    flushed = 0
+    for line in f:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue  # Torn last line
+        if 'flushed' in record:
+            flushed = max(flushed, record['flushed'])
+        else:
+            entries.append(record)
+    return [
+        (e['conversation_id'], e['role'], e['content'], e.get('metadata'),
+         datetime.fromisoformat(e['created_at']), e.get('title'))
+        for e in entries if e['seq'] > flushed
+    ]
+
+
+transcript_buffer = TranscriptBuffer(
+    TRANSCRIPT_SPILL_DIR,
+    max_messages=TRANSCRIPT_BUFFER_SIZE,
+    flush_interval=TRANSCRIPT_FLUSH_INTERVAL,
+    batch_size=TRANSCRIPT_FLUSH_BATCH
+)
+
+
+def start_transcript_flusher():
+    """Start the write-behind flusher (no-op unless TRANSCRIPT_WRITE_BEHIND=true)"""
+    if TRANSCRIPT_WRITE_BEHIND:
+        transcript_buffer.start()
+
+
+def stop_transcript_flusher():
+    """Flush queued messages before the process exits"""
+    if TRANSCRIPT_WRITE_BEHIND:
+        transcript_buffer.stop()
+
+
+def get_transcript_buffer_stats():
+    """Get write-behind queue statistics for monitoring"""
+    if not TRANSCRIPT_WRITE_BEHIND:
+        return {'enabled': False}
+    return {'enabled': True, **transcript_buffer.stats()}
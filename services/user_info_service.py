@@ -27,19 +27,13 @@ def store_user_info(conversation_id, name, email=None, phone=None):
     if len(name) > 0:
         name = name[0].upper() + name[1:].lower()
     
-    conversation = Conversation.get_by_id(conversation_id)
-    if not conversation:
-        return False
-    
-    metadata = conversation.metadata or {}
-    metadata['user_info'] = {
+    # Only this key is written, so a memory summary stored meanwhile is kept
+    return Conversation.merge_metadata(conversation_id, 'user_info', {
         'name': name,
         'email': email.strip() if email and isinstance(email, str) else None,
         'phone': phone.strip() if phone and isinstance(phone, str) else None,
         'collected_at': datetime.now().isoformat()
-    }
-    
-    return conversation.update_metadata(metadata)
+    })
 
 
 def get_user_info(conversation_id):
@@ -0,0 +1,268 @@
+"""Process-wide registry of open per-user Chroma vectorstores
+
+Opening a tenant's vectorstore means constructing a chromadb PersistentClient,
+probing it with list_collections(), fixing file permissions and wrapping the
+collection in a LangChain Chroma object. The registry keeps those handles open
+between requests so a warm tenant's chat turn reuses them directly.
+
+Entries are evicted least-recently-used when either the open-handle budget or the
+approximate on-disk size budget is exceeded, closed after an idle timeout, and
+invalidated explicitly whenever the tenant's chroma directory is reset or restored.
+
+Callers hold a handle with acquire()/release() while they use it. An entry that is
+evicted or expires while held stays open until its last holder releases it (and is
+handed back out if the same tenant asks for it meanwhile), so one tenant's load
+never closes the store under another tenant's in-flight search.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+def close_chroma_client(client):
+    """Release the shared chromadb System behind a PersistentClient
+
+    chromadb caches one System per persist path for the life of the process. If the
+    directory is deleted or replaced (reset/restore) that cached System keeps pointing
+    at stale files, so it has to be stopped and dropped from the cache explicitly.
+    """
+    _stop_chroma_system(_detach_chroma_system(client))
+
+
+def _detach_chroma_system(client):
+    """Drop the client's System from chromadb's cache (the next client for the path gets a new one)"""
+    if client is None:
+        return None
+    try:
+        from chromadb.api.shared_system_client import SharedSystemClient
+        identifier = getattr(client, '_identifier', None)
+        if identifier:
+            return SharedSystemClient._identifier_to_system.pop(identifier, None)
+    except Exception as e:
+        print(f"⚠️ Error closing chroma client: {e}")
+    return None
+
+
+def _stop_chroma_system(system):
+    if system is None:
+        return
+    try:
+        system.stop()
+    except Exception as e:
+        print(f"⚠️ Error closing chroma client: {e}")
+
+
+class _RegistryEntry:
+    """An open vectorstore plus the bookkeeping needed for eviction"""
+
+    __slots__ = ('vectorstore', 'client', 'size_bytes', 'opened_at', 'last_used', 'users', 'system')
+
+    def __init__(self, vectorstore, client, size_bytes):
+        now = time.monotonic()
+        self.vectorstore = vectorstore
+        self.client = client
+        self.size_bytes = size_bytes
+        self.opened_at = now
+        self.last_used = now
+        self.users = 0       # acquire() calls not released yet
+        self.system = None   # System already detached from chromadb's cache (invalidated while in use)
+
+
+class VectorstoreRegistry:
+    """LRU registry of open vectorstores keyed by user_id"""
+
+    def __init__(self, max_open=32, max_bytes=512 * 1024 * 1024, idle_timeout=1800):
+        self.max_open = max_open
+        self.max_bytes = max_bytes
+        self.idle_timeout = idle_timeout
+        self._entries = OrderedDict()
+        self._retiring = {}    # user_id -> entry evicted while in use; closed on its last release
+        self._detached = []    # entries invalidated while in use; closed on their last release
+        self._lock = threading.Lock()
+        self._open_locks = {}
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._deferred_closes = 0
+
+    def open_lock(self, user_id):
+        """Per-user lock so concurrent cold requests open the store only once"""
+        with self._lock:
+            lock = self._open_locks.get(user_id)
+            if lock is None:
+                lock = threading.Lock()
+                self._open_locks[user_id] = lock
+            return lock
+
+    def acquire(self, user_id):
+        """Return the open vectorstore for user_id and hold it, or None on a miss
+
+        Every vectorstore returned must be given back with release().
+        """
+        to_close = []
+        with self._lock:
+            to_close.extend(self._expire_idle_locked())
+            entry = self._entries.get(user_id)
+            if entry is None:
+                entry = self._retiring.pop(user_id, None)
+                if entry is not None:
+                    # Evicted but still in use: hand out the same store instead of opening a second one
+                    self._entries[user_id] = entry
+                    to_close.extend(self._evict_over_budget_locked(keep=user_id))
+            if entry is None:
+                self._misses += 1
+                vectorstore = None
+            else:
+                entry.last_used = time.monotonic()
+                entry.users += 1
+                self._entries.move_to_end(user_id)
+                self._hits += 1
+                vectorstore = entry.vectorstore
+        self._close_entries(to_close)
+        return vectorstore
+
+    def release(self, user_id, vectorstore):
+        """Give back a vectorstore returned by acquire() or put(acquire=True)"""
+        to_close = []
+        with self._lock:
+            entry = self._find_held_locked(user_id, vectorstore)
+            if entry is None:
+                return
+            entry.users -= 1
+            if entry.users == 0:
+                if self._retiring.get(user_id) is entry:
+                    del self._retiring[user_id]
+                    to_close.append(entry)
+                elif entry in self._detached:
+                    self._detached.remove(entry)
+                    to_close.append(entry)
+        self._close_entries(to_close)
+
+    def put(self, user_id, vectorstore, client=None, size_bytes=0, acquire=False):
+        """Register a freshly opened vectorstore and enforce the budgets
+
+        With acquire=True the caller holds it, as if it had come from acquire().
+        """
+        to_close = []
+        with self._lock:
+            previous = self._entries.pop(user_id, None) or self._retiring.pop(user_id, None)
+            if previous is not None and previous.client is not client:
+                to_close.extend(self._retire_locked(previous, detach=True))
+            entry = _RegistryEntry(vectorstore, client, size_bytes)
+            if acquire:
+                entry.users = 1
+            self._entries[user_id] = entry
+            to_close.extend(self._evict_over_budget_locked(keep=user_id))
+        self._close_entries(to_close)
+
+    def invalidate(self, user_id):
+        """Close and forget the vectorstore for user_id (after reset/restore)
+
+        A store that is still in use is dropped from chromadb's cache right away, so
+        the next access opens the new files, and stopped when its last holder is done.
+        """
+        with self._lock:
+            entries = [e for e in (self._entries.pop(user_id, None), self._retiring.pop(user_id, None)) if e]
+            to_close = []
+            for entry in entries:
+                to_close.extend(self._retire_locked(entry, detach=True))
+        self._close_entries(to_close)
+        return bool(entries)
+
+    def clear(self, close=True):
+        """Drop every entry; close=False only forgets handles (e.g. in a forked child)"""
+        with self._lock:
+            entries = list(self._entries.values()) + list(self._retiring.values()) + self._detached
+            self._entries.clear()
+            self._retiring.clear()
+            self._detached = []
+            self._open_locks.clear()
+        if close:
+            self._close_entries(entries)
+
+    def stats(self):
+        """Registry counters for monitoring"""
+        with self._lock:
+            return {
+                'open': len(self._entries),
+                'in_use': sum(1 for e in self._entries.values() if e.users),
+                'closing': len(self._retiring) + len(self._detached),
+                'max_open': self.max_open,
+                'approx_bytes': sum(e.size_bytes for e in self._entries.values()),
+                'max_bytes': self.max_bytes,
+                'idle_timeout': self.idle_timeout,
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'deferred_closes': self._deferred_closes,
+                'users': list(self._entries.keys())
+            }
+
+    def _find_held_locked(self, user_id, vectorstore):
+        candidates = [self._entries.get(user_id), self._retiring.get(user_id)] + self._detached
+        for entry in candidates:
+            if entry is not None and entry.vectorstore is vectorstore and entry.users > 0:
+                return entry
+        return None
+
+    def _retire_locked(self, entry, user_id=None, detach=False):
+        """Take a removed entry out of service: close it now, or on its last release if in use
+
+        Returns:
+            list: The entries to close now
+        """
+        if entry.users == 0:
+            return [entry]
+        self._deferred_closes += 1
+        if detach:
+            entry.system = _detach_chroma_system(entry.client)
+            self._detached.append(entry)
+        else:
+            self._retiring[user_id] = entry
+        return []
+
+    def _expire_idle_locked(self):
+        if not self.idle_timeout:
+            return []
+        cutoff = time.monotonic() - self.idle_timeout
+        expired = [uid for uid, e in self._entries.items() if e.last_used < cutoff and not e.users]
+        closed = []
+        for uid in expired:
+            closed.append(self._entries.pop(uid))
+            self._evictions += 1
+        return closed
+
+    def _evict_over_budget_locked(self, keep=None):
+        closed = []
+        while self._entries:
+            total_bytes = sum(e.size_bytes for e in self._entries.values())
+            over_count = self.max_open and len(self._entries) > self.max_open
+            over_bytes = self.max_bytes and total_bytes > self.max_bytes
+            if not (over_count or over_bytes):
+                break
+            victim = next(iter(self._entries))
+            if victim == keep:
+                # Never evict the entry that was just opened for the caller
+                if len(self._entries) == 1:
+                    break
+                self._entries.move_to_end(victim)
+                victim = next(iter(self._entries))
+            closed.extend(self._retire_locked(self._entries.pop(victim), user_id=victim))
+            self._evictions += 1
+        return closed
+
+    @staticmethod
+    def _close_entries(entries):
+        for entry in entries:
+            if entry.system is not None:
+                _stop_chroma_system(entry.system)
+            else:
+                close_chroma_client(entry.client)
+
+
+registry = VectorstoreRegistry(
+    max_open=int(os.getenv('VECTORSTORE_MAX_OPEN', 32)),
+    max_bytes=int(os.getenv('VECTORSTORE_MAX_MB', 512)) * 1024 * 1024,
+    idle_timeout=int(os.getenv('VECTORSTORE_IDLE_TIMEOUT', 1800))
+)
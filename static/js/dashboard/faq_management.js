@@ -473,9 +473,13 @@ async function ingestFAQ(faqId) {
             }
         });
         
-        const data = await checkJSONResponse(response);
+        let data = await checkJSONResponse(response);
         
         if (response.ok) {
+            // Ingestion runs in the background - wait for the job to finish
+            if (data.job_id && typeof waitForIngestionJob === 'function') {
+                data = await waitForIngestionJob(data.job_id);
+            }
             // Show success
             const message = data.message || 'FAQ ingested successfully!';
             if (successAlert) {
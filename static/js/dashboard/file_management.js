@@ -700,6 +700,24 @@ function closeCrawlPreview() {
     crawledPreviewData = null;
 }
 
+// Ingestion runs as a background job: poll its status until it finishes
+async function waitForIngestionJob(jobId, onProgress) {
+    while (true) {
+        await new Promise(resolve => setTimeout(resolve, 1500));
+        const response = await fetch(`/api/ingestion-jobs/${jobId}`, {
+            credentials: 'same-origin',
+            headers: { 'Accept': 'application/json' }
+        });
+        const job = await response.json();
+        if (!response.ok) {
+            throw new Error(job.error || 'Failed to get ingestion status');
+        }
+        if (onProgress) onProgress(job);
+        if (job.status === 'succeeded') return job.result || {};
+        if (job.status === 'failed') throw new Error(job.error || 'Ingestion failed');
+    }
+}
+
 async function ingestCrawledContent() {
     const textArea = document.getElementById('previewText');
     if (!textArea || !crawledPreviewData) return;
@@ -730,9 +748,20 @@ async function ingestCrawledContent() {
             })
         });
         
-        const result = await response.json();
+        let result = await response.json();
         
         if (response.ok) {
+            if (result.job_id) {
+                if (crawlSuccess) {
+                    crawlSuccess.textContent = result.message || 'Ingesting...';
+                    crawlSuccess.style.display = 'block';
+                }
+                result = await waitForIngestionJob(result.job_id, job => {
+                    if (crawlSuccess && job.progress_message) {
+                        crawlSuccess.textContent = `Ingesting... ${job.progress || 0}% (${job.progress_message})`;
+                    }
+                });
+            }
             const message = result.message || 'URL content ingested successfully!';
             if (crawlSuccess) {
                 crawlSuccess.textContent = message;
@@ -1053,9 +1082,20 @@ async function ingestFileContent() {
             throw new Error(`Server returned ${response.status}: ${response.statusText}`);
         }
         
-        const result = await response.json();
+        let result = await response.json();
         
         if (response.ok) {
+            if (result.job_id) {
+                if (uploadSuccess) {
+                    uploadSuccess.textContent = result.message || 'Ingesting...';
+                    uploadSuccess.style.display = 'block';
+                }
+                result = await waitForIngestionJob(result.job_id, job => {
+                    if (uploadSuccess && job.progress_message) {
+                        uploadSuccess.textContent = `Ingesting... ${job.progress || 0}% (${job.progress_message})`;
+                    }
+                });
+            }
             const message = result.message || 'File ingested successfully to knowledge base';
             
             // Show toast notification
@@ -147,6 +147,7 @@ async function loadAdvancedSettings() {
         const freqPenaltyField = document.getElementById('chatbotFrequencyPenalty');
         const presPenaltyField = document.getElementById('chatbotPresencePenalty');
         const systemInstructionsField = document.getElementById('chatbotSystemInstructions');
+        const answerCacheField = document.getElementById('chatbotAnswerCache');
         
         if (tempField) tempField.value = config.temperature ?? 0.3;
         if (maxTokensField) maxTokensField.value = config.max_tokens ?? 2000;
@@ -155,6 +156,7 @@ async function loadAdvancedSettings() {
         if (freqPenaltyField) freqPenaltyField.value = config.frequency_penalty ?? 0.0;
         if (presPenaltyField) presPenaltyField.value = config.presence_penalty ?? 0.0;
         if (systemInstructionsField) systemInstructionsField.value = config.system_instructions ?? '';
+        if (answerCacheField) answerCacheField.checked = !!config.answer_cache_enabled;
     } catch (error) {
         // Use defaults if load fails
     }
@@ -183,6 +185,7 @@ async function saveAdvancedSettings() {
         const presencePenalty = parseFloat(document.getElementById('chatbotPresencePenalty')?.value);
         const responseStyle = document.getElementById('chatbotResponseStyle')?.value || 'balanced';
         const systemInstructions = document.getElementById('chatbotSystemInstructions')?.value || '';
+        const answerCacheEnabled = !!document.getElementById('chatbotAnswerCache')?.checked;
         
         // Validate parameter ranges
         const errors = [];
@@ -226,7 +229,8 @@ async function saveAdvancedSettings() {
             frequency_penalty: frequencyPenalty || 0.0,
             presence_penalty: presencePenalty || 0.0,
             response_style: responseStyle,
-            system_instructions: systemInstructions
+            system_instructions: systemInstructions,
+            answer_cache_enabled: answerCacheEnabled
         };
         
         const response = await fetch('/api/user/chatbot-config', {
@@ -294,6 +298,7 @@ function resetAdvancedSettings() {
     document.getElementById('chatbotFrequencyPenalty').value = 0.0;
     document.getElementById('chatbotPresencePenalty').value = 0.0;
     document.getElementById('chatbotSystemInstructions').value = '';
+    document.getElementById('chatbotAnswerCache').checked = false;
     
     showAlert('llmSuccess', 'Settings reset to defaults. Click "Save Advanced Settings" to apply.');
 }
@@ -0,0 +1,77 @@
+"""Answer cache on the widget chat path (/chat with an API key)"""
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from flask_login import LoginManager
+
+import blueprints.chat as chat
+import services.chatbot_service as chatbot_service
+from services import knowledge_service
+from services.answer_cache import answer_cache
+
+USER_ID = 42
+
+
+class FakeLLM:
+    def __init__(self):
+        self.prompts = []
+
+    def invoke(self, prompt):
+        self.prompts.append(prompt)
+        return SimpleNamespace(content="We are open from 9 to 5.")
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    llm = FakeLLM()
+    conversations = iter(range(1, 100))
+
+    def new_conversation(user_id, session_id=None, conversation_id=None):
+        return SimpleNamespace(id=next(conversations), session_id="s", message_count=0, metadata={}), True
+
+    monkeypatch.setattr(chat, 'validate_api_key', lambda api_key: USER_ID)
+    monkeypatch.setattr(chat, 'get_or_create_conversation', new_conversation)
+    monkeypatch.setattr(chat, 'save_chat_turn', lambda *args, **kwargs: None)
+    monkeypatch.setattr(chatbot_service, 'recall', lambda conversation, limit=20: [])
+    monkeypatch.setattr(chatbot_service, 'load_user_chatbot_config',
+                        lambda user_id: {'answer_cache_enabled': True, 'bot_name': 'Cortex'})
+    monkeypatch.setattr(chatbot_service, '_retrieve', lambda user_id, message: [])
+    monkeypatch.setattr(chatbot_service, 'get_user_name_for_chat', lambda conversation_id, default: default)
+    monkeypatch.setattr(chatbot_service, 'get_knowledge_version', lambda user_id: '1')
+    monkeypatch.setattr(chatbot_service.LLMProvider, 'get_cached_llm', staticmethod(lambda **kwargs: llm))
+    monkeypatch.setattr(knowledge_service, 'embeddings', None)
+    answer_cache.invalidate(USER_ID)
+    yield llm
+    answer_cache.invalidate(USER_ID)
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    app.secret_key = "test"
+    login_manager = LoginManager()
+    login_manager.init_app(app)
+    login_manager.user_loader(lambda user_id: None)
+    app.register_blueprint(chat.chat_bp)
+    return app.test_client()
+
+
+def test_repeated_widget_question_is_answered_from_cache(client, llm):
+    question = {"message": "What are your opening hours?", "api_key": "widget-key"}
+
+    first = client.post("/chat", json=question)
+    second = client.post("/chat", json=question)
+
+    assert first.status_code == 200 and second.status_code == 200
+    assert first.get_json()["response"] == "We are open from 9 to 5."
+    assert second.get_json()["response"] == first.get_json()["response"]
+    # The second visitor's turn never reached the LLM
+    assert len(llm.prompts) == 1
+    # The cached answer is not addressed to anyone by name
+    assert "Visitor" not in llm.prompts[0]
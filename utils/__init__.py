@@ -1,15 +1,18 @@
 """Utilities package"""
-from .api_key import generate_user_api_key, get_user_api_key, validate_api_key
+from .api_key import generate_user_api_key, get_user_api_key, validate_api_key, invalidate_api_key_cache
 from .prompts import get_default_prompt, get_default_prompt_with_name
-from .helpers import allowed_file, format_file_size
+from .helpers import allowed_file, format_file_size, encode_cursor, decode_cursor
 
 __all__ = [
     'generate_user_api_key',
     'get_user_api_key',
     'validate_api_key',
+    'invalidate_api_key_cache',
     'get_default_prompt',
     'get_default_prompt_with_name',
     'allowed_file',
-    'format_file_size'
+    'format_file_size',
+    'encode_cursor',
+    'decode_cursor'
 ]
 
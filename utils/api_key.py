@@ -3,6 +3,75 @@ import os
 import json
 import secrets
 import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+# In-process cache of key hash -> user_id (None = known invalid key)
+API_KEY_CACHE_TTL = int(os.getenv('API_KEY_CACHE_TTL', 300))
+API_KEY_NEGATIVE_CACHE_TTL = int(os.getenv('API_KEY_NEGATIVE_CACHE_TTL', 60))
+# Admin keys can be deactivated or deleted, and invalidate_api_key_cache() only
+# reaches this process: other workers stop accepting a revoked key after this long
+API_KEY_ADMIN_CACHE_TTL = int(os.getenv('API_KEY_ADMIN_CACHE_TTL', 5))
+API_KEY_CACHE_MAX_SIZE = int(os.getenv('API_KEY_CACHE_MAX_SIZE', 10000))
+
+_key_cache = OrderedDict()  # key_hash -> (user_id, expires_at)
+_key_cache_lock = threading.Lock()
+_key_cache_stats = {'hits': 0, 'negative_hits': 0, 'misses': 0}
+_CACHE_MISS = object()
+_LOOKUP_FAILED = object()  # the database could not be asked - never cached
+
+
+def _hash_key(api_key):
+    return hashlib.sha256(api_key.encode()).hexdigest()
+
+
+def _cache_get(key_hash):
+    with _key_cache_lock:
+        entry = _key_cache.get(key_hash)
+        if entry is None or entry[1] <= time.monotonic():
+            if entry is not None:
+                del _key_cache[key_hash]
+            _key_cache_stats['misses'] += 1
+            return _CACHE_MISS
+        _key_cache.move_to_end(key_hash)
+        if entry[0] is None:
+            _key_cache_stats['negative_hits'] += 1
+        else:
+            _key_cache_stats['hits'] += 1
+        return entry[0]
+
+
+def _cache_put(key_hash, user_id, ttl=None):
+    if ttl is None:
+        ttl = API_KEY_CACHE_TTL if user_id else API_KEY_NEGATIVE_CACHE_TTL
+    with _key_cache_lock:
+        _key_cache[key_hash] = (user_id, time.monotonic() + ttl)
+        _key_cache.move_to_end(key_hash)
+        while len(_key_cache) > API_KEY_CACHE_MAX_SIZE:
+            _key_cache.popitem(last=False)
+
+
+def invalidate_api_key_cache(api_key=None, key_hash=None):
+    """Forget cached validation results (one key, or everything if none given)"""
+    if api_key:
+        key_hash = _hash_key(api_key)
+    with _key_cache_lock:
+        if key_hash:
+            _key_cache.pop(key_hash, None)
+        else:
+            _key_cache.clear()
+
+
+def get_api_key_cache_stats():
+    """Get API key validation cache statistics"""
+    with _key_cache_lock:
+        return {
+            'size': len(_key_cache),
+            'max_size': API_KEY_CACHE_MAX_SIZE,
+            **_key_cache_stats
+        }
 
 
 def generate_user_api_key(user_id):
@@ -19,6 +88,8 @@ def get_user_api_key(user_id):
     # Import here to avoid circular dependency
     from services.config_service import load_user_chatbot_config, save_user_chatbot_config_file
     
+    from models.user_api_key import UserAPIKey
+    
     config = load_user_chatbot_config(user_id)
     api_key = config.get('api_key')
     
@@ -28,8 +99,21 @@ def get_user_api_key(user_id):
         config['api_key'] = token
         config['api_key_hash'] = key_hash
         save_user_chatbot_config_file(user_id, config)
+        UserAPIKey.set_key_hash(user_id, key_hash)
+        # The new key may have been negatively cached by an earlier lookup
+        invalidate_api_key_cache(key_hash=key_hash)
         return token
     
+    # Index keys created before the user_api_keys table existed (a cached validation
+    # of this key for this user means it is indexed already)
+    key_hash = _hash_key(api_key)
+    if _cache_get(key_hash) != user_id:
+        if UserAPIKey.get_key_hash(user_id) != key_hash:
+            UserAPIKey.set_key_hash(user_id, key_hash)
+            invalidate_api_key_cache(key_hash=key_hash)
+        else:
+            _cache_put(key_hash, user_id)
+    
     return api_key
 
 
@@ -37,11 +121,15 @@ def validate_api_key(api_key):
     """
     Validate API key and return user_id if valid
     
-    Priority order:
+    Results (including invalid keys) are cached in-process by key hash, so repeated
+    widget loads cost a dictionary lookup. Admin keys are cached for only
+    API_KEY_ADMIN_CACHE_TTL seconds, so revoking one takes effect in every worker
+    process. A lookup that failed on a database error is rejected but not cached.
+    On a cache miss the priority order is:
     1. Database admin API keys (AdminAPIKey) - returns first admin user ID
     2. .env DEFAULT_API_KEY - returns first admin user ID
     3. .env FALLBACK_API_KEY - returns first admin user ID
-    4. User config files (existing user API keys) - returns specific user_id
+    4. Indexed user widget keys (user_api_keys) - returns specific user_id
     
     Returns:
         user_id (int) if valid, None otherwise
@@ -49,8 +137,30 @@ def validate_api_key(api_key):
     if not api_key:
         return None
     
+    key_hash = _hash_key(api_key)
+    cached = _cache_get(key_hash)
+    if cached is not _CACHE_MISS:
+        return cached
+    
+    user_id, ttl = _validate_api_key_uncached(api_key, key_hash)
+    if user_id is _LOOKUP_FAILED:
+        return None
+    _cache_put(key_hash, user_id, ttl)
+    return user_id
+
+
+def _validate_api_key_uncached(api_key, key_hash):
+    """Resolve an API key against the database and environment (no caching)
+
+    Returns:
+        tuple: (user_id, None for an unknown key, or _LOOKUP_FAILED if a database
+        error left the answer open; cache TTL override or None for the default)
+    """
+    lookup_failed = False
+    
     # Helper function to get first admin user ID
     def get_first_admin_user_id():
+        nonlocal lookup_failed
         try:
             from models.user import User
             conn = User._get_db_connection()
@@ -71,51 +181,43 @@ def validate_api_key(api_key):
                 conn.close()
         except Exception as e:
             print(f"Error getting admin user: {e}")
+            lookup_failed = True
         return None
     
     # 1. Check database admin API keys first
     try:
         from models.api_key import AdminAPIKey
-        admin_key = AdminAPIKey.validate_key(api_key)
+        admin_key = AdminAPIKey.validate_key(api_key, raise_errors=True)
         if admin_key and admin_key.get('is_active'):
             admin_user_id = get_first_admin_user_id()
             if admin_user_id:
-                return admin_user_id
+                return admin_user_id, API_KEY_ADMIN_CACHE_TTL
     except Exception as e:
         print(f"Error checking admin API keys: {e}")
+        lookup_failed = True
     
     # 2. Check .env DEFAULT_API_KEY
     default_key = os.getenv("DEFAULT_API_KEY", "")
     if default_key and default_key == api_key:
         admin_user_id = get_first_admin_user_id()
         if admin_user_id:
-            return admin_user_id
+            return admin_user_id, None
     
     # 3. Check .env FALLBACK_API_KEY
     fallback_key = os.getenv("FALLBACK_API_KEY", "")
     if fallback_key and fallback_key == api_key:
         admin_user_id = get_first_admin_user_id()
         if admin_user_id:
-            return admin_user_id
-    
-    # 4. Search through all user configs to find matching API key (existing behavior)
-    config_dir = "./config"
-    if not os.path.exists(config_dir):
-        return None
+            return admin_user_id, None
     
-    for user_dir in os.listdir(config_dir):
-        if user_dir.startswith('user_'):
-            try:
-                user_id = int(user_dir.replace('user_', ''))
-                # Import here to avoid circular dependency
-                from services.config_service import load_user_chatbot_config
-                config = load_user_chatbot_config(user_id)
-                stored_key = config.get('api_key')
-                
-                # Direct comparison (since we store the plain token)
-                if stored_key == api_key:
-                    return user_id
-            except (ValueError, Exception):
-                continue
+    # 4. Indexed lookup of user widget keys (hash -> user_id)
+    try:
+        from models.user_api_key import UserAPIKey
+        user_id = UserAPIKey.get_user_id_by_hash(key_hash)
+        if user_id:
+            return user_id, None
+    except Exception as e:
+        print(f"Error checking user API keys: {e}")
+        lookup_failed = True
     
-    return None
+    return (_LOOKUP_FAILED if lookup_failed else None), None
@@ -1,4 +1,7 @@
 """General helper utilities"""
+import base64
+import json
+
 from config.constants import ALLOWED_EXTENSIONS
 
 
@@ -17,3 +20,31 @@ def format_file_size(bytes):
     i = int(__import__('math').floor(__import__('math').log(bytes) / __import__('math').log(k)))
     return f"{round(bytes / (k ** i), 2)} {sizes[i]}"
 
+
+
+def encode_cursor(sort_value, row_id):
+    """Opaque keyset pagination cursor for the last row of a page (sort column value, id)"""
+    if hasattr(sort_value, 'strftime'):
+        # Compared against the column as the databases store it, not str(datetime)
+        sort_value = sort_value.strftime('%Y-%m-%d %H:%M:%S')
+    payload = json.dumps([str(sort_value) if sort_value is not None else None, row_id])
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor from encode_cursor()
+
+    Returns:
+        tuple: (sort column value as a string, id)
+
+    Raises:
+        ValueError: The cursor is malformed
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(sort_value, str) or not isinstance(row_id, int):
+        raise ValueError("Invalid cursor")
+    return sort_value, row_id
@@ -0,0 +1,89 @@
+"""Per-stage wall-clock timings for multi-step requests"""
+import threading
+import time
+from concurrent.futures import Future
+
+
+_aggregate_lock = threading.Lock()
+_aggregates = {}  # pipeline name -> {stage: {'count', 'total_ms', 'max_ms'}}
+
+
+class StageTimings:
+    """Collects how long each stage of one request took (milliseconds)
+
+    Stages may run on worker threads; submit() times a callable on an executor so
+    overlapping stages are measured individually while 'total' shows the critical path.
+    """
+
+    def __init__(self, pipeline, started=None):
+        self.pipeline = pipeline
+        self._started = started if started is not None else time.perf_counter()
+        self._stages = {}
+        self._lock = threading.Lock()
+        self._finished = False
+
+    def record(self, stage, seconds):
+        with self._lock:
+            self._stages[stage] = self._stages.get(stage, 0.0) + seconds * 1000
+
+    def timed(self, stage, fn, *args, **kwargs):
+        """Call fn now and record its duration under stage"""
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def submit(self, executor, stage, fn, *args, **kwargs):
+        """Run fn on executor, recording its duration under stage
+
+        Returns:
+            Future of fn's result
+        """
+        return executor.submit(self.timed, stage, fn, *args, **kwargs)
+
+    @staticmethod
+    def done(value):
+        """A completed future (for stages that need no work)"""
+        future = Future()
+        future.set_result(value)
+        return future
+
+    def finish(self):
+        """Record 'total' and add this request to the pipeline's aggregate stats (once)"""
+        with self._lock:
+            if self._finished:
+                return
+            self._finished = True
+            self._stages['total'] = (time.perf_counter() - self._started) * 1000
+            stages = dict(self._stages)
+        with _aggregate_lock:
+            pipeline = _aggregates.setdefault(self.pipeline, {})
+            for stage, ms in stages.items():
+                entry = pipeline.setdefault(stage, {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+                entry['count'] += 1
+                entry['total_ms'] += ms
+                entry['max_ms'] = max(entry['max_ms'], ms)
+
+    def as_dict(self):
+        """Stage durations in ms, rounded"""
+        with self._lock:
+            return {stage: round(ms, 1) for stage, ms in self._stages.items()}
+
+    def server_timing(self):
+        """Value for a Server-Timing response header"""
+        return ", ".join(f"{stage};dur={ms}" for stage, ms in self.as_dict().items())
+
+
+def get_stage_timing_stats(pipeline):
+    """Aggregate per-stage timings of a pipeline: count, avg_ms and max_ms per stage"""
+    with _aggregate_lock:
+        stages = {stage: dict(entry) for stage, entry in _aggregates.get(pipeline, {}).items()}
+    return {
+        stage: {
+            'count': entry['count'],
+            'avg_ms': round(entry['total_ms'] / entry['count'], 1) if entry['count'] else 0,
+            'max_ms': round(entry['max_ms'], 1)
+        }
+        for stage, entry in stages.items()
+    }